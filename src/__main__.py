@@ -1,30 +1,53 @@
-import asyncio
+import argparse
 import json
+from collections.abc import AsyncIterator
+from typing import Any
 
+import uvicorn
 from mcp.server.fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
 
-from src.clients import (
-    get_horse_profile_html,
-    get_jockey_profile_html,
-    get_race_result_html,
-    get_race_shutuba_html,
+from src import config
+from src.loaders import (
+    load_enriched_shutuba,
+    load_horse_profile,
+    load_jockey_leaderboard,
+    load_jockey_stats,
+    load_meeting_race_ids,
+    load_race_result,
+    load_shutuba,
+    load_shutubas,
+    refresh_horse_profile,
 )
-from src.parse.parse_horse import parse_horse_profile
-from src.parse.parse_jockey import parse_jockey
-from src.parse.parse_race import parse_race_result
-from src.parse.parse_shutuba import parse_shutuba
+from src.metrics import registry, timer, track_tool
+from src.models import RaceResult, RaceShutuba
+from src.odds import get_odds_store, odds_movement, steam_moves
+from src.pipeline import dump_json_array, stream_bulk
+from src.prefetch import prefetcher
+from src.profiling import profiled
+from src.search import get_name_index
+from src.similar import describe_vector, get_form_index
+from src.speed import compute_speed_figures
 
 # Initialize FastMCP server
 mcp = FastMCP("weather")
 
 
 @mcp.tool()
-async def get_shutuba(race_id: str) -> str:
+@track_tool
+@profiled
+async def get_shutuba(race_id: str, include_odds: bool = False, profile: bool = False) -> str:
     """競馬のレース出馬表情報を取得する関数
     https://race.netkeiba.com/race/shutuba.html から取得する
 
     Input:
         race_id: str - 取得したいレースのID
+        include_odds: bool - オッズ・人気が必要かどうか。
+            False (既定) の場合はブラウザを使わずに高速に取得し、odds・popは空またはプレースホルダーになる。
+            Trueの場合はブラウザで描画するため数秒かかる
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
 
     Output:
         str - 出馬表データをJSON形式にシリアライズした文字列
@@ -50,19 +73,103 @@ async def get_shutuba(race_id: str) -> str:
 
     レースIDを元にHTMLを取得し、パーサーで構造化された出馬表データに変換して返します。
     """
-    html = await get_race_shutuba_html(race_id)
-    shutuba = parse_shutuba(html)
+    shutuba = await load_shutuba(race_id, include_odds)
+    if config.PREFETCH_ENABLED:
+        # 次に出走馬・騎手のプロフィールが求められることが多いため、先読みしておく
+        prefetcher.enqueue_shutuba(shutuba)
 
-    return shutuba.model_dump_json()
+    with timer("serialize", tool="get_shutuba"):
+        return shutuba.model_dump_json()
 
 
 @mcp.tool()
-async def get_race_result(race_id: str) -> str:
+@track_tool
+@profiled
+async def bulk_get_shutuba(race_ids: list[str], include_odds: bool = False, profile: bool = False) -> str:
+    """複数レースの出馬表を一括取得する関数
+    1開催日の全レースなど、複数の出馬表をまとめて取得する場合は get_shutuba を繰り返し呼ぶより速い
+
+    Input:
+        race_ids: list[str] - 取得したいレースのID配列
+        include_odds: bool - オッズ・人気が必要かどうか。get_shutuba と同じ
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
+
+    Output:
+        str - 出馬表データの配列をJSON形式にシリアライズした文字列 (入力と同じ順序)
+        各要素は get_shutuba の出力と同じ形式です。
+        取得・パースに失敗したレースは以下の形式の要素になります：
+        - race_id: レースID
+        - error: エラー内容
+
+    ブラウザでの描画が必要なレースは、1つのブラウザセッションの複数のタブでまとめて描画します。
+    """
+    shutubas = await load_shutubas(race_ids, include_odds)
+    if config.PREFETCH_ENABLED:
+        for shutuba in shutubas:
+            if isinstance(shutuba, RaceShutuba):
+                prefetcher.enqueue_shutuba(shutuba)
+
+    async def results() -> AsyncIterator[tuple[str, RaceShutuba | Exception]]:
+        for race_id, shutuba in zip(race_ids, shutubas):
+            yield race_id, shutuba
+
+    return await dump_json_array(results(), "race_id", tool="bulk_get_shutuba")
+
+
+@mcp.tool()
+@track_tool
+@profiled
+async def get_enriched_shutuba(race_id: str, last_n: int = 5, include_odds: bool = False, profile: bool = False) -> str:
+    """出馬表に出走馬の近走成績と騎手の成績を結合して取得する関数
+    get_shutuba・bulk_get_horse_profile・bulk_get_jockey_profile を順に呼ぶ代わりに、
+    出走馬・騎手のページをサーバー側で並行して取得し、必要な項目だけに絞って返す
+    出走馬・騎手のページは bulk_get_horse_profile と同じく最大12時間キャッシュするため、近走成績に当日の結果は含まれないことがある
+
+    Input:
+        race_id: str - 取得したいレースのID
+        last_n: int - 出走馬ごとに含める近走の数 (1以上)
+        include_odds: bool - オッズ・人気が必要かどうか。get_shutuba と同じ
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
+
+    Output:
+        str - 出馬表データをJSON形式にシリアライズした文字列
+        出力されるJSONオブジェクトには以下の情報が含まれます：
+        - race_name, race_id, date, time, place, course, weather, condition: get_shutuba と同じ
+        - runners: 出走馬の情報のリスト。各要素には以下が含まれます：
+          - waku, num, horse, sex_age, impost_weight, horse_weight, odds, pop: get_shutuba と同じ
+          - total_record: 通算成績 (馬のページを取得できなかった場合はnull)
+          - recent_form: 近走成績のリスト (新しい順、最大last_n件)。各要素には以下が含まれます：
+            - race_date: レース日
+            - race_name: レース名
+            - place: 開催場所
+            - course: コース
+            - condition: 馬場状態
+            - horse_number: 頭数
+            - rank: 着順
+            - pop: 人気
+            - time: タイム
+            - margin: 着差
+            - jockey_name: 騎手名
+          - jockey: 騎手情報（jockey_name: 騎手名, jockey_id: 騎手ID, current_year_wins: 本年勝利数,
+            total_wins: 通算勝利数, g1_wins: GI勝利数, stakes_wins: 重賞勝利数）
+            騎手のページを取得できなかった場合、成績の項目はnull
+    """
+    enriched = await load_enriched_shutuba(race_id, last_n, include_odds)
+
+    with timer("serialize", tool="get_enriched_shutuba"):
+        return enriched.model_dump_json()
+
+
+@mcp.tool()
+@track_tool
+@profiled
+async def get_race_result(race_id: str, profile: bool = False) -> str:
     """競馬のレース結果情報を取得する関数
     https://db.netkeiba.com/race/{race_id}/ から取得する
 
     Input:
         race_id: str - 取得したいレースのID
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
 
     Output:
         str - レース結果データをJSON形式にシリアライズした文字列
@@ -91,20 +198,68 @@ async def get_race_result(race_id: str) -> str:
 
     レースIDを元にHTMLを取得し、パーサーで構造化されたレース結果データに変換して返します。
     """
-    html = await get_race_result_html(race_id)
-    result = parse_race_result(html)
+    result = await load_race_result(race_id)
 
-    return result.model_dump_json()
+    with timer("serialize", tool="get_race_result"):
+        return result.model_dump_json()
 
 
+@mcp.tool()
+@track_tool
+@profiled
+async def bulk_get_race_result(race_ids: list[str], profile: bool = False) -> str:
+    """競馬のレース結果情報を一括取得する関数
+    https://db.netkeiba.com/race/{race_id}/ から並行して取得する
+
+    Input:
+        race_ids: list[str] - 取得したいレースのID配列
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
+
+    Output:
+        str - レース結果データの配列をJSON形式にシリアライズした文字列
+        各要素は get_race_result の出力と同じ形式です。
+        取得・パースに失敗したレースは以下の形式の要素になります：
+        - race_id: レースID
+        - error: エラー内容
+
+    レースIDごとのHTMLを並行して取得し、パースも並列に実行して入力と同じ順序で返します。
+    同時に取得する件数は KEIBA_MCP_BULK_WINDOW 件までに抑え、パースしたものから順に書き出します。
+    """
+    return await dump_json_array(stream_bulk(race_ids, load_race_result), "race_id", tool="bulk_get_race_result")
+
 
 @mcp.tool()
-async def bulk_get_horse_profile(horse_ids: list[str]) -> str:
+@track_tool
+@profiled
+async def get_meeting_race_results(place: str, date: str, profile: bool = False) -> str:
+    """1開催日・1競馬場の全レースの結果を取得する関数
+    https://db.netkeiba.com/race/list/{yyyymmdd}/ からレースIDを調べ、各レース結果を並行して取得する
+
+    Input:
+        place: str - 競馬場名 (例: "阪神") または場コード (例: "09")
+        date: str - 開催日 (例: "2025-04-13", "20250413", "2025年4月13日")
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
+
+    Output:
+        str - レース結果データの配列をJSON形式にシリアライズした文字列 (レース番号順)
+        形式は bulk_get_race_result の出力と同じです。
+    """
+    race_ids = await load_meeting_race_ids(place, date)
+    return await dump_json_array(stream_bulk(race_ids, load_race_result), "race_id", tool="get_meeting_race_results")
+
+
+@mcp.tool()
+@track_tool
+@profiled
+async def bulk_get_horse_profile(horse_ids: list[str], profile: bool = False) -> str:
     """競馬の馬プロフィール情報を一括取得する関数
     https://db.netkeiba.com/horse/{horse_id}/ から取得する
+    馬のページは先読みしたものを使えるよう最大12時間 (KEIBA_MCP_PROFILE_CACHE_TTL) キャッシュするため、
+    当日のレース結果が反映されていないことがある。最新の戦績が必要な場合は refresh_horse_profiles を使う
 
     Input:
         horse_id: list[str] - 取得したい馬のID配列
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
 
     Output:
         str - 馬プロフィールデータをJSON形式にシリアライズした文字列
@@ -144,20 +299,23 @@ async def bulk_get_horse_profile(horse_ids: list[str]) -> str:
 
     馬IDを元にHTMLを取得し、パーサーで構造化された馬プロフィールデータに変換して返します。
     """
-    coroutines = [get_horse_profile_html(horse_id) for horse_id in horse_ids]
-    htmls = await asyncio.gather(*coroutines)
-
-    profiles = [parse_horse_profile(html).model_dump() for html in htmls]
-    return json.dumps(profiles, ensure_ascii=False)
+    return await dump_json_array(
+        stream_bulk(horse_ids, load_horse_profile), "horse_id", tool="bulk_get_horse_profile", raise_errors=True
+    )
 
 
 @mcp.tool()
-async def bulk_get_jockey_profile(jockey_ids: list[str]) -> str:
+@track_tool
+@profiled
+async def bulk_get_jockey_profile(jockey_ids: list[str], profile: bool = False) -> str:
     """騎手のプロフィール情報を一括取得する関数
     https://db.netkeiba.com/jockey/{jockey_id}/ から取得する
+    騎手のページは先読みしたものを使えるよう最大12時間 (KEIBA_MCP_PROFILE_CACHE_TTL) キャッシュするため、
+    当日の勝利数が反映されていないことがある
 
     Input:
         jockey_id: str - 取得したい騎手のID配列
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
 
     Output:
         str - 騎手プロフィールデータをJSON形式にシリアライズした文字列
@@ -176,14 +334,451 @@ async def bulk_get_jockey_profile(jockey_ids: list[str]) -> str:
         ]
 
     騎手IDを元にHTMLを取得し、パーサーで構造化された騎手プロフィールデータに変換して返します。
+    get_jockey_leaderboard で取り込んだ騎手など、最近保存した騎手情報がある騎手はページを取得せずに返します。
+    """
+    return await dump_json_array(
+        stream_bulk(jockey_ids, load_jockey_stats), "jockey_id", tool="bulk_get_jockey_profile", raise_errors=True
+    )
+
+
+@mcp.tool()
+@track_tool
+@profiled
+async def get_jockey_leaderboard(max_pages: int = 0, profile: bool = False) -> str:
+    """本年の騎手リーディングから、掲載されている全騎手の成績をまとめて取得する関数
+    https://db.netkeiba.com/?pid=jockey_leading から取得する
+
+    騎手ごとのページを1人ずつ取得する代わりに、リーディングの数ページで現役騎手の本年の成績をまとめて更新する。
+    リーディングに載らない項目 (身長・体重、デビュー年、通算成績、G1・重賞勝利数) は保存済みの騎手情報から補い、
+    騎手のページは取得しない。騎手のページを取得済みの騎手は、取り込んだ後 bulk_get_jockey_profile でページを
+    取得せずに返る。未取得の騎手は bulk_get_jockey_profile の初回に騎手のページを取得する。
+
+    Input:
+        max_pages: int - 取得するリーディングのページ数の上限。0の場合はサーバーの設定値
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
+
+    Output:
+        str - 騎手情報の配列 (リーディングの掲載順) をJSON形式にシリアライズした文字列
+        各要素には bulk_get_jockey_profile と同じ項目が含まれます
+    """
+    jockeys = await load_jockey_leaderboard(max_pages or None)
+    with timer("serialize", tool="get_jockey_leaderboard"):
+        return json.dumps([jockey.model_dump() for jockey in jockeys], ensure_ascii=False)
+
+
+@mcp.tool()
+@track_tool
+@profiled
+async def refresh_horse_profiles(horse_ids: list[str], profile: bool = False) -> str:
+    """保存済みの馬の戦績に、新しい出走だけを取り込む関数
+    https://db.netkeiba.com/horse/{horse_id}/ から取得し、サーバー側に蓄積した戦績を更新する
+
+    通算成績が変わっていない馬は戦績をパースせず、変わっている馬も保存済みより新しいレースだけをパースする。
+    初めて取得する馬は全戦績を保存する。同時に取得する件数は KEIBA_MCP_BULK_WINDOW 件までに抑える。
+
+    Input:
+        horse_ids: list[str] - 更新したい馬のID配列
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
+
+    Output:
+        str - 馬ごとの更新結果の配列をJSON形式にシリアライズした文字列
+        各要素には以下の情報が含まれます：
+        - horse_id: 馬ID
+        - status: "created" (新規保存) / "unchanged" (変更なし) / "updated" (新しい出走を追加) / "error" (取得失敗)
+        - total_record: 更新後の通算成績
+        - new_race_results: 新たに追加したレース結果のリスト (形式は bulk_get_horse_profile の race_result と同じ)
+        - error: 取得に失敗した場合のエラーメッセージ
+    """
+    dumped: list[dict[str, Any]] = []
+    async for horse_id, result in stream_bulk(horse_ids, refresh_horse_profile):
+        with timer("serialize", tool="refresh_horse_profiles"):
+            if isinstance(result, Exception):
+                dumped.append({"horse_id": horse_id, "status": "error", "error": str(result)})
+                continue
+            status, horse_profile, new_race_results = result
+            dumped.append(
+                {
+                    "horse_id": horse_id,
+                    "status": status,
+                    "total_record": horse_profile.total_record,
+                    "new_race_results": [item.model_dump() for item in new_race_results],
+                }
+            )
+    with timer("serialize", tool="refresh_horse_profiles"):
+        return json.dumps(dumped, ensure_ascii=False)
+
+
+@mcp.tool()
+@track_tool
+@profiled
+async def get_speed_figures(race_ids: list[str], profile: bool = False) -> str:
+    """レース結果からスピード指数を計算する関数
+    https://db.netkeiba.com/race/{race_id}/ から各レース結果を取得し、まとめて計算する
+
+    基準タイムは渡したレースの勝ち時計から、馬場 (芝/ダート/障害)・距離・馬場状態ごとに求めるため、
+    多くのレース (例えば数開催分) をまとめて渡すほど安定する。
+    同じ日・同じ競馬場・同じ馬場のレースが2つ以上あれば、馬場差で補正する。
+
+    Input:
+        race_ids: list[str] - 計算したいレースのID配列
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
+
+    Output:
+        str - 以下の情報を含むJSONオブジェクト
+        - runners: 出走馬ごとの計算結果の配列 (計算できない項目はnull)。各要素には以下が含まれます：
+          - race_id: レースID
+          - rank: 着順
+          - num: 馬番
+          - horse_name: 馬名
+          - horse_id: 馬ID
+          - surface: 馬場 ("芝" / "ダ" / "障")
+          - distance: 距離(m)
+          - condition: 馬場状態
+          - time_seconds: 走破タイム(秒)
+          - margin_lengths: 前の馬との着差(馬身)
+          - beaten_lengths: 勝ち馬との着差(馬身)
+          - par_time: 基準タイム(秒)
+          - track_variant: 馬場差 (1000mあたりの秒数。正は時計がかかる馬場)
+          - speed_figure: スピード指数 (基準タイムちょうどで100、1%速いごとに+10)
+        - errors: 取得に失敗したレースの配列（race_id: レースID, error: エラー内容）
+    """
+    results: list[RaceResult] = []
+    errors: list[dict[str, str]] = []
+    async for race_id, result in stream_bulk(race_ids, load_race_result):
+        if isinstance(result, Exception):
+            errors.append({"race_id": race_id, "error": str(result)})
+        else:
+            results.append(result)
+
+    with timer("speed_figures"):
+        figures = compute_speed_figures(results)
+    with timer("serialize", tool="get_speed_figures"):
+        return json.dumps({"runners": figures.rows(), "errors": errors}, ensure_ascii=False)
+
+
+@mcp.tool()
+@track_tool
+@profiled
+async def find_similar_horses(horse_id: str, limit: int = 10, refresh: bool = False, profile: bool = False) -> str:
+    """戦績の傾向が似た馬を探す関数
+    これまでに取得した馬情報の戦績から作った索引を、ネットワークを使わずに検索する
+
+    距離・馬場 (芝/ダート/障害) の適性、近走の着順・着差、斤量・馬体重、道悪の得手不得手を特徴量にして、
+    特徴量の近い順に返す。基準の馬が索引にない場合は、その馬の馬情報を取得して索引に加えてから検索する。
+    まだ一度も取得していない馬は候補に現れないため、多くの馬を比べたい場合は先に馬情報を取得しておく。
+
+    Input:
+        horse_id: str - 基準にする馬のID
+        limit: int - 返す件数の上限
+        refresh: bool - Trueの場合、基準の馬の馬情報を取得し直してから検索する
+        profile: bool - Trueの場合、この呼び出しをプロファイルしてサーバー側に結果を保存する
+
+    Output:
+        str - 以下の情報を含むJSONオブジェクト
+        - horse_id: 基準にした馬のID
+        - horse_name: 馬名
+        - features: 基準の馬の特徴量 (計算できなかった特徴量は平均的な値になる)
+        - indexed: 索引に登録されている馬の数
+        - similar: 似た馬の配列 (近い順)。各要素には以下が含まれます：
+          - horse_id: 馬ID
+          - horse_name: 馬名
+          - distance: 特徴量の距離 (0に近いほど似ている)
+          - features: 特徴量
+    """
+    index = get_form_index()
+    if refresh or horse_id not in index:
+        # 馬情報の取得時に索引へ登録される
+        await load_horse_profile(horse_id)
+    vector = index.vector(horse_id)
+    if vector is None:
+        raise Exception(f"No race results to compare: {horse_id}")
+
+    with timer("similarity_search"):
+        hits = index.search(vector, limit, exclude=[horse_id])
+    names = get_name_index("horse")
+    with timer("serialize", tool="find_similar_horses"):
+        return json.dumps(
+            {
+                "horse_id": horse_id,
+                "horse_name": names.name(horse_id),
+                "features": describe_vector(vector),
+                "indexed": len(index),
+                "similar": [
+                    {
+                        "horse_id": id,
+                        "horse_name": names.name(id),
+                        "distance": round(distance, 3),
+                        "features": describe_vector(neighbour),
+                    }
+                    for id, distance in hits
+                    # 検索の後に索引が読み直されて消えた馬は除く
+                    if (neighbour := index.vector(id)) is not None
+                ],
+            },
+            ensure_ascii=False,
+        )
+
+
+def _dump_search_hits(kind: str, query: str, limit: int) -> str:
+    id_field = f"{kind}_id"
+    name_field = f"{kind}_name"
+    hits = get_name_index(kind).search(query, limit)
+    return json.dumps(
+        [{id_field: hit.id, name_field: hit.name, "match": hit.match, "score": hit.score} for hit in hits],
+        ensure_ascii=False,
+    )
+
+
+@mcp.tool()
+@track_tool
+async def search_horse(name: str, limit: int = 10) -> str:
+    """馬名から馬IDを検索する関数
+    これまでに取得した出馬表・レース結果・馬情報に現れた馬から、ネットワークを使わずに検索する
+
+    カタカナ・ひらがな、全角・半角の違いは無視する。完全一致・前方一致・あいまい一致の順に返す。
+    まだ一度も取得していない馬は見つからないため、その場合は出馬表やレース結果を先に取得する。
+
+    Input:
+        name: str - 馬名 (一部でもよい)
+        limit: int - 返す件数の上限
+
+    Output:
+        str - 検索結果の配列をJSON形式にシリアライズした文字列
+        各要素には以下の情報が含まれます：
+        - horse_id: 馬ID
+        - horse_name: 馬名
+        - match: 一致の種類 ("exact" / "prefix" / "fuzzy")
+        - score: 類似度 (0-1)
     """
-    coroutines = [get_jockey_profile_html(jockey_id) for jockey_id in jockey_ids]
-    htmls = await asyncio.gather(*coroutines)
+    return _dump_search_hits("horse", name, limit)
+
+
+@mcp.tool()
+@track_tool
+async def search_jockey(name: str, limit: int = 10) -> str:
+    """騎手名から騎手IDを検索する関数
+    これまでに取得した出馬表・レース結果・馬情報・騎手情報に現れた騎手から、ネットワークを使わずに検索する
+
+    カタカナ・ひらがな、全角・半角の違いは無視する。完全一致・前方一致・あいまい一致の順に返す。
+
+    Input:
+        name: str - 騎手名 (一部でもよい)
+        limit: int - 返す件数の上限
+
+    Output:
+        str - 検索結果の配列をJSON形式にシリアライズした文字列
+        各要素には以下の情報が含まれます：
+        - jockey_id: 騎手ID
+        - jockey_name: 騎手名
+        - match: 一致の種類 ("exact" / "prefix" / "fuzzy")
+        - score: 類似度 (0-1)
+    """
+    return _dump_search_hits("jockey", name, limit)
+
+
+@mcp.tool()
+@track_tool
+async def get_odds_movement(race_id: str, include_history: bool = True) -> str:
+    """サーバーに記録済みのオッズの推移を取得する関数
+    get_shutuba などでオッズ付きの出馬表を取得するたびに記録したオッズ・人気から集計する。ネットワークは使わない
+
+    Input:
+        race_id: str - レースID
+        include_history: bool - Trueの場合、記録した時点ごとのオッズも含める
+
+    Output:
+        str - 馬ごとのオッズの推移の配列をJSON形式にシリアライズした文字列 (記録がない場合は空の配列)
+        各要素には以下の情報が含まれます：
+        - num: 馬番
+        - horse_name: 馬名
+        - first_odds / last_odds: 最初・最新のオッズ
+        - min_odds / max_odds: 最小・最大のオッズ
+        - first_pop / last_pop: 最初・最新の人気
+        - change_ratio: 最初から最新までのオッズの変化率 (正は人気が落ちた、負は売れた)
+        - history: 記録した時点ごとのオッズ（timestamp: UNIX時刻, odds: オッズ, pop: 人気）
+    """
+    store = get_odds_store()
+    series = store.get(race_id)
+    if series is None:
+        return "[]"
+    movement = odds_movement(series, store.info(race_id).get("horses"))
+    if not include_history:
+        for item in movement:
+            del item["history"]
+    return json.dumps(movement, ensure_ascii=False)
+
+
+@mcp.tool()
+@track_tool
+async def get_odds_drifts(race_ids: list[str], limit: int = 10) -> str:
+    """サーバーに記録済みのオッズから、最初の記録から最も大きく変化した馬を探す関数
+    ネットワークは使わない
+
+    Input:
+        race_ids: list[str] - 対象のレースIDの配列。先頭10桁 (年・場・回・日) を指定すると、その開催日の全レースが対象になる
+        limit: int - 返す件数の上限。人気が落ちた馬 (drifts) と売れた馬 (shortenings) それぞれの件数
+
+    Output:
+        str - 以下の情報を含むJSONオブジェクト
+        - drifts: オッズが上がった (人気が落ちた) 馬の配列 (変化率の大きい順)
+        - shortenings: オッズが下がった (売れた) 馬の配列 (変化率の大きい順)
+        各要素には race_id, race_name, num, horse_name, first_odds, last_odds, change_ratio が含まれます
+    """
+    store = get_odds_store()
+    changes: list[dict[str, Any]] = []
+    for race_id in store.race_ids(race_ids):
+        series = store.get(race_id)
+        if series is None:
+            continue
+        info = store.info(race_id)
+        for item in odds_movement(series, info.get("horses")):
+            changes.append(
+                {
+                    "race_id": race_id,
+                    "race_name": info.get("race_name", ""),
+                    "num": item["num"],
+                    "horse_name": item["horse_name"],
+                    "first_odds": item["first_odds"],
+                    "last_odds": item["last_odds"],
+                    "change_ratio": item["change_ratio"],
+                }
+            )
+
+    changes.sort(key=lambda item: item["change_ratio"])
+    return json.dumps(
+        {
+            "drifts": [item for item in reversed(changes) if item["change_ratio"] > 0][:limit],
+            "shortenings": [item for item in changes if item["change_ratio"] < 0][:limit],
+        },
+        ensure_ascii=False,
+    )
+
+
+@mcp.tool()
+@track_tool
+async def get_steam_moves(race_ids: list[str], window_minutes: float = 15, threshold: float = 0.2) -> str:
+    """サーバーに記録済みのオッズから、短時間に大きく売れた馬 (steam move) を探す関数
+    ネットワークは使わない
+
+    Input:
+        race_ids: list[str] - 対象のレースIDの配列。先頭10桁 (年・場・回・日) を指定すると、その開催日の全レースが対象になる
+        window_minutes: float - オッズの下落を調べる時間幅(分)
+        threshold: float - steam move とみなすオッズの下落率 (0.2 は20%以上の下落)
+
+    Output:
+        str - steam move の配列をJSON形式にシリアライズした文字列 (下落率の大きい順)
+        各要素には以下の情報が含まれます：
+        - race_id: レースID
+        - race_name: レース名
+        - num: 馬番
+        - horse_name: 馬名
+        - from_odds / to_odds: 下落前・下落後のオッズ
+        - drop_ratio: 下落率
+        - from_timestamp / to_timestamp: 下落前・下落後の記録時刻 (UNIX時刻)
+    """
+    store = get_odds_store()
+    moves: list[dict[str, Any]] = []
+    for race_id in store.race_ids(race_ids):
+        series = store.get(race_id)
+        if series is None:
+            continue
+        info = store.info(race_id)
+        horses: dict[str, str] = info.get("horses", {})
+        for move in steam_moves(series, window_minutes * 60, threshold):
+            moves.append(
+                {
+                    "race_id": race_id,
+                    "race_name": info.get("race_name", ""),
+                    "horse_name": horses.get(str(move["num"]), ""),
+                }
+                | move
+            )
+
+    moves.sort(key=lambda move: -move["drop_ratio"])
+    return json.dumps(moves, ensure_ascii=False)
+
+
+@mcp.tool()
+async def cancel_prefetch(race_id: str = "") -> str:
+    """出馬表取得後に行っている出走馬・騎手ページの先読みを取り消す関数
+
+    Input:
+        race_id: str - 先読みを取り消すレースのID。空文字の場合はすべての先読みを取り消す
+
+    Output:
+        str - 取り消した件数と、残りの待機中の件数をJSON形式にシリアライズした文字列
+        - cancelled: 取り消した件数
+        - pending: 待機中の件数
+    """
+    cancelled = prefetcher.cancel(race_id or None)
+    return json.dumps({"cancelled": cancelled, "pending": prefetcher.pending()})
+
+
+@mcp.tool()
+async def get_server_stats(output_format: str = "summary") -> str:
+    """サーバーの稼働統計を取得する関数
+
+    Input:
+        output_format: str - "summary" の場合はJSON形式の要約、"prometheus" の場合はPrometheusのテキスト形式
+
+    Output:
+        str - 統計情報。以下のメトリクスが含まれます：
+        - keiba_tool_calls_total / keiba_tool_errors_total / keiba_tool_seconds: ツールごとの呼び出し回数・エラー数・所要時間
+        - keiba_stage_seconds: 処理段階ごとの所要時間
+          (download, browser_session_start, page_load, decode, slice, soup_build, parse, serialize)
+        - keiba_cache_requests_total: ページキャッシュのヒット・ミス数
+        - keiba_fetched_bytes_total: 取得したページのバイト数
+        - keiba_http_retries_total: HTTPリクエストのリトライ回数
+        summaryの各ヒストグラムには count, sum, mean と p50/p95/p99 (バケット上限による近似) が含まれます。
+        最大のバケットを超える分位点は null になります。
+    """
+    if output_format == "prometheus":
+        return registry.render_prometheus()
+    return json.dumps(registry.summary(), ensure_ascii=False)
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Prometheusのスクレイプ用エンドポイント"""
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="keiba-mcp サーバー")
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "sse"],
+        default=config.TRANSPORT,
+        help="MCPのトランスポート。sseを指定すると複数クライアントで1プロセスを共有できる",
+    )
+    parser.add_argument("--host", default=config.HOST, help="HTTPサーバーのホスト (sseのみ)")
+    parser.add_argument("--port", type=int, default=config.PORT, help="HTTPサーバーのポート (sseのみ)")
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=config.MAX_CONNECTIONS,
+        help="HTTPサーバーが同時に受け付ける接続数の上限。0は無制限 (sseのみ)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.transport == "stdio":
+        # Initialize and run the server
+        mcp.run(transport="stdio")
+        return
 
-    profiles = [parse_jockey(html).model_dump() for html in htmls]
-    return json.dumps(profiles, ensure_ascii=False)
+    # 長時間稼働するHTTPサーバーとして起動し、全クライアントでコネクションプールとキャッシュを共有する
+    app = mcp.sse_app()
+    app.router.routes.append(Route("/metrics", metrics_endpoint))
+    uvicorn.run(
+        app,
+        host=args.host,
+        port=args.port,
+        limit_concurrency=args.max_connections or None,
+    )
 
 
 if __name__ == "__main__":
-    # Initialize and run the server
-    mcp.run(transport="stdio")
+    main()
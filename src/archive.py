@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+
+class PageArchive:
+    """取得したページを記録・再生するためのアーカイブ
+
+    ディレクトリ内に、zlib圧縮したページ本体を連結した pages.bin と、
+    URLごとのオフセットを1行1件のJSONで記録した index.jsonl を持つ。
+    同じURLを複数回記録した場合は最後に記録したものが有効になる。
+
+    ブラウザで描画したページは "rendered:{URL}" のキーで記録され、パスでは引けない (find_by_path の対象外)。
+    """
+
+    DATA_FILE = "pages.bin"
+    INDEX_FILE = "index.jsonl"
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: dict[str, dict[str, Any]] = {}
+        self._paths: dict[str, str] = {}  # パスとクエリ -> URL
+
+        index_path = self.path / self.INDEX_FILE
+        if index_path.exists():
+            with index_path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._index[entry["url"]] = entry
+                        self._add_path(entry["url"])
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def urls(self) -> list[str]:
+        """記録されているURLの一覧を返す"""
+        return list(self._index)
+
+    def get(self, url: str) -> bytes | None:
+        """URLに対応するページを返す。記録されていない場合はNoneを返す"""
+        entry = self._index.get(url)
+        if entry is None:
+            return None
+        with (self.path / self.DATA_FILE).open("rb") as f:
+            f.seek(entry["offset"])
+            return zlib.decompress(f.read(entry["length"]))
+
+    def find_by_path(self, path_and_query: str) -> bytes | None:
+        """ホスト名を無視し、パスとクエリが一致するページを返す。複数のホストで一致する場合は最後に記録したもの"""
+        url = self._paths.get(path_and_query.rstrip("/"))
+        return self.get(url) if url is not None else None
+
+    def _add_path(self, url: str) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            # "rendered:" などのURL以外のキー
+            return
+        self._paths[(parts.path + (f"?{parts.query}" if parts.query else "")).rstrip("/")] = url
+
+    def put(self, url: str, content: bytes) -> None:
+        """ページを記録する"""
+        compressed = zlib.compress(content)
+        with self._lock:
+            with (self.path / self.DATA_FILE).open("ab") as f:
+                offset = f.tell()
+                f.write(compressed)
+
+            entry = {
+                "url": url,
+                "offset": offset,
+                "length": len(compressed),
+                "size": len(content),
+                "recorded_at": time.time(),
+            }
+            with (self.path / self.INDEX_FILE).open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._index[url] = entry
+            self._add_path(url)
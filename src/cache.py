@@ -0,0 +1,95 @@
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class PageCache:
+    """取得したページを保持するキャッシュ
+
+    メモリ上のLRUキャッシュに加え、cache_dir を指定するとディスクにも書き出す。
+    メモリ上のキャッシュは件数 (max_entries) と合計サイズ (max_bytes) の両方で上限を設ける。
+    ディスクキャッシュは同じディレクトリを参照する複数のプロセスで共有できる。
+    """
+
+    def __init__(self, ttl: float, max_entries: int, cache_dir: str | None = None, max_bytes: int = 0) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._size = 0
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str, ttl: float | None = None) -> bytes | None:
+        """キャッシュからページを取得する。期限切れ・未登録の場合はNoneを返す"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, content = entry
+            if now - stored_at <= ttl:
+                self._entries.move_to_end(key)
+                return content
+            self._forget(key)
+
+        # メモリになければディスクを確認する
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            stored_at = path.stat().st_mtime
+            if now - stored_at > ttl:
+                return None
+            content = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        self._remember(key, stored_at, content)
+        return content
+
+    def set(self, key: str, content: bytes) -> None:
+        """ページをキャッシュに登録する"""
+        now = time.time()
+        self._remember(key, now, content)
+
+        path = self._path(key)
+        if path is None:
+            return
+        # 他プロセスが書きかけのファイルを読まないよう、一時ファイル経由で置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self) -> None:
+        """メモリ上のキャッシュを破棄する"""
+        self._entries.clear()
+        self._size = 0
+
+    def _remember(self, key: str, stored_at: float, content: bytes) -> None:
+        self._forget(key)
+        self._entries[key] = (stored_at, content)
+        self._size += len(content)
+        while len(self._entries) > self.max_entries or (self.max_bytes > 0 and self._size > self.max_bytes):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _forget(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def _path(self, key: str) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / hashlib.sha1(key.encode()).hexdigest()
@@ -1,61 +1,451 @@
+import asyncio
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
 import httpx
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
 
+from src import config
+from src.archive import PageArchive
+from src.cache import PageCache
+from src.metrics import STAGE_SECONDS, STAGE_SECONDS_HELP, registry, timer
+from src.ratelimit import PriorityRateLimiter, background_fetch, fetch_promoted
 
-async def get_race_shutuba_html(race_id: str) -> str:
+# プロセス内で共有するページキャッシュ
+page_cache = PageCache(
+    ttl=config.CACHE_TTL,
+    max_entries=config.CACHE_MAX_ENTRIES,
+    max_bytes=config.CACHE_MAX_BYTES,
+    cache_dir=config.CACHE_DIR or None,
+)
+
+# netkeibaへのリクエストの流量を制限する。先読みなどのバックグラウンドのリクエストは後回しにする
+rate_limiter = PriorityRateLimiter(config.RATE_LIMIT, config.RATE_LIMIT_BURST)
+
+# 同時に起動するSeleniumセッション数を制限する
+_browser_semaphore = asyncio.Semaphore(config.MAX_BROWSER_SESSIONS)
+
+_http_client: httpx.AsyncClient | None = None
+_archive: PageArchive | None = None
+
+# 取得中のURL -> 取得タスク。同じURLへの同時のリクエストは1回の取得を共有する
+# 取得中のURL -> (取得タスク, 対話的なリクエストが待ち始めたときにセットするイベント)
+_inflight: dict[str, tuple["asyncio.Task[bytes]", asyncio.Event]] = {}
+
+
+def get_archive() -> PageArchive | None:
+    """記録・再生モードの場合にアーカイブを返す。通常モードの場合はNoneを返す"""
+    global _archive
+    if config.FETCH_MODE not in ("record", "replay"):
+        return None
+    if _archive is None:
+        _archive = PageArchive(config.ARCHIVE_DIR)
+    return _archive
+
+
+def _replay(key: str) -> bytes:
+    archive = get_archive()
+    content = archive.get(key) if archive is not None else None
+    if content is None:
+        raise Exception(f"Failed to fetch data: {key} is not recorded in the archive")
+    return content
+
+
+def _record(key: str, content: bytes) -> None:
+    archive = get_archive()
+    if config.FETCH_MODE == "record" and archive is not None:
+        archive.put(key, content)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """プロセス内で共有するHTTPクライアントを取得する
+
+    コネクションプールを使い回すため、初回呼び出し時に生成したクライアントを返し続ける。
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.MAX_HTTP_CONNECTIONS,
+                max_keepalive_connections=config.MAX_HTTP_CONNECTIONS,
+            ),
+            timeout=config.HTTP_TIMEOUT,
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """共有しているHTTPクライアントを閉じる"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def fetch(url: str, ttl: float | None = None) -> bytes:
+    """URLのページを取得する。キャッシュに存在する場合はキャッシュを返す
+
+    Args:
+        url: 取得するURL
+        ttl: キャッシュの有効期限(秒)。Noneの場合はキャッシュのデフォルト値を使う
+    """
+    cached = page_cache.get(url, ttl=ttl)
+    if cached is not None:
+        registry.inc("keiba_cache_requests_total", help="ページキャッシュの参照回数", result="hit")
+        return cached
+    registry.inc("keiba_cache_requests_total", help="ページキャッシュの参照回数", result="miss")
+
+    # 先読みが同じURLを取得中であれば、対話的なリクエストもその結果を待つ
+    entry = _inflight.get(url)
+    if entry is None:
+        promoted = asyncio.Event()
+        task = asyncio.ensure_future(_download(url, promoted))
+        _inflight[url] = (task, promoted)
+        task.add_done_callback(lambda _: _inflight.pop(url, None))
+    else:
+        task, promoted = entry
+        registry.inc("keiba_fetch_shared_total", help="取得中のリクエストを共有した回数")
+    # 対話的なリクエストが待つ取得は、先読みが始めたものでも対話的なリクエストの優先度で取得する
+    if not background_fetch.get():
+        promoted.set()
+    # 待っている側がキャンセルされても、取得は他の待ち手のために続ける
+    return await asyncio.shield(task)
+
+
+async def _download(url: str, promoted: asyncio.Event) -> bytes:
+    """URLのページを取得し、キャッシュに保存する"""
+    fetch_promoted.set(promoted)
+    if config.FETCH_MODE == "replay":
+        content = _replay(url)
+    else:
+        response = await _get_with_retry(url)
+        if response.status_code != httpx.codes.OK:
+            raise Exception(f"Failed to fetch data: {response.status_code}")
+        content = response.content
+        _record(url, content)
+
+    registry.inc("keiba_fetched_bytes_total", len(content), help="取得したページのバイト数")
+    page_cache.set(url, content)
+    return content
+
+
+async def _get_with_retry(url: str) -> httpx.Response:
+    """通信エラー・5xx応答の場合にリトライしながらGETする"""
+    for attempt in range(config.HTTP_RETRIES + 1):
+        if attempt > 0:
+            registry.inc("keiba_http_retries_total", help="HTTPリクエストのリトライ回数")
+            await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+        try:
+            async with rate_limiter.slot():
+                with timer("download"):
+                    response = await get_http_client().get(url)
+        except httpx.TransportError:
+            if attempt == config.HTTP_RETRIES:
+                raise
+            continue
+
+        registry.inc("keiba_http_responses_total", help="HTTPレスポンス数", status=str(response.status_code))
+        if response.status_code < 500 or attempt == config.HTTP_RETRIES:
+            return response
+
+    raise AssertionError("unreachable")
+
+
+# ブラウザで読み込まないリソース。出馬表の取り出しに必要なのはHTMLとオッズを描画するJavaScriptだけ
+_BLOCKED_URL_PATTERNS = [
+    "*.css",
+    "*.css?*",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.webp",
+    "*.svg",
+    "*.ico",
+    "*.mp4",
+]
+
+
+def _allowed_hosts() -> list[str]:
+    """ブラウザから名前解決を許すホスト。BROWSER_ALLOWED_HOSTS に加え、取得先のホストは常に許す"""
+    hosts = [host.strip() for host in config.BROWSER_ALLOWED_HOSTS.split(",") if host.strip()]
+    for base_url in (config.RACE_BASE_URL, config.DB_BASE_URL):
+        host = urlsplit(base_url).hostname
+        if host and host not in hosts:
+            hosts.append(host)
+    return hosts
+
+
+def _new_driver(page_load_strategy: str = "eager") -> webdriver.Remote:
+    """Selenium Grid にブラウザのセッションを作る
+
+    画像・CSS・フォントと、netkeiba以外のホスト (広告・計測タグ) は読み込まない。
+    """
     options = webdriver.ChromeOptions()
     options.add_argument("--headless")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
-    driver = webdriver.Remote(command_executor="http://selenium:4444/wd/hub", options=options)
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    hosts = _allowed_hosts()
+    if "*" not in hosts:
+        excludes = ", ".join(f"EXCLUDE {host}" for host in hosts)
+        options.add_argument(f"--host-resolver-rules=MAP * ~NOTFOUND, {excludes}")
+    options.page_load_strategy = page_load_strategy
+    # CDPのコマンド (リソースのブロック) を Grid 経由で送れるようにする
+    executor = ChromiumRemoteConnection(config.SELENIUM_URL, vendor_prefix="goog", browser_name="chrome")
+    with timer("browser_session_start"):
+        driver = webdriver.Remote(command_executor=executor, options=options)
+    _block_resources(driver)
+    return driver
+
 
+def _block_resources(driver: webdriver.Remote) -> None:
+    """現在のタブで、_BLOCKED_URL_PATTERNS に当たるリソースを読み込まないようにする
+
+    CDPのブロックはタブごとの設定のため、タブを開くたびに呼ぶ。
+    CDPを使えないブラウザでは何もしない (画像は起動オプションでブロックされる)。
+    """
     try:
-        url = f"https://race.netkeiba.com/race/shutuba.html?race_id={race_id}"
+        driver.execute("executeCdpCommand", {"cmd": "Network.enable", "params": {}})
+        driver.execute(
+            "executeCdpCommand", {"cmd": "Network.setBlockedURLs", "params": {"urls": _BLOCKED_URL_PATTERNS}}
+        )
+    except WebDriverException:
+        registry.inc("keiba_browser_block_errors_total", help="ブラウザのリソースのブロックに失敗した回数")
+
+
+def _page_html(driver: webdriver.Remote, state: int, started_at: float) -> str:
+    """描画の終わったページのHTMLを取り出し、描画時間を記録する"""
+    html_content = driver.page_source
+    registry.inc("keiba_rendered_bytes_total", len(html_content), help="ブラウザで描画したHTMLの文字数")
+    registry.observe(STAGE_SECONDS, time.monotonic() - started_at, help=STAGE_SECONDS_HELP, stage="page_load")
+    if state < RENDER_COMPLETE:
+        registry.inc("keiba_render_incomplete_total", help="描画の完了を待たずに取り出したページ数")
+    return html_content
+
+
+# ready のスクリプトが返す描画の状態
+# 0: 未描画 / RENDER_USABLE: 取り出せるが一部が未描画 / RENDER_COMPLETE: 描画が完了した
+RENDER_USABLE = 1
+RENDER_COMPLETE = 2
+
+
+def _render_page(url: str, ready: str) -> str:
+    """Seleniumでページをレンダリングし、HTMLを取得する
+
+    DOMの構築が終わった時点で読み込みを打ち切り (page_load_strategy="eager")、
+    ready のスクリプトが描画の完了を返すまで最大 RENDER_TIMEOUT 秒待つ。
+    時間内に完了しなくても、取り出せる状態であればそのHTMLを返す。
+
+    Args:
+        url: レンダリングするURL
+        ready: 描画の状態 (0 / RENDER_USABLE / RENDER_COMPLETE) を返すJavaScript
+    """
+    driver = _new_driver()
+
+    try:
+        started_at = time.monotonic()
         driver.get(url)
+        state = driver.execute_script(ready)
+        while state < RENDER_COMPLETE and time.monotonic() - started_at <= config.RENDER_TIMEOUT:
+            time.sleep(0.05)
+            state = driver.execute_script(ready)
+        if state < RENDER_USABLE:
+            raise Exception(f"Timed out rendering: {url}")
+        return _page_html(driver, state, started_at)
+    finally:
+        driver.quit()
+
 
-        # ページが完全に読み込まれるのを待つ
-        wait = WebDriverWait(driver, 10)
-        wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+def _render_pages(urls: list[str], ready: str, max_tabs: int) -> list[str | Exception]:
+    """1つのブラウザセッションで、最大 max_tabs 個のタブを使って複数のページを並行してレンダリングする
 
-        # HTMLコンテンツを取得
-        html_content = driver.page_source
+    ページの読み込みは待たずに各タブで開始し (page_load_strategy="none")、
+    ready のスクリプトが描画の完了を返したタブから順にHTMLを取り出して、そのタブで次のページを開く。
+    RENDER_TIMEOUT 秒以内に完了しなかったページは、取り出せる状態であればそのHTMLを、そうでなければ例外を返す。
+
+    Args:
+        urls: レンダリングするURLのリスト
+        ready: 描画の状態 (0 / RENDER_USABLE / RENDER_COMPLETE) を返すJavaScript
+        max_tabs: 同時に開くタブの数
+
+    Returns:
+        list[str | Exception]: URLと同じ順序のHTML、または失敗した場合の例外
+    """
+    results: list[str | Exception] = [Exception(f"Failed to render: {url}") for url in urls]
+    if not urls:
+        return results
+    pending = deque(enumerate(urls))
+    # タブ -> (URLの位置, 読み込みを始めた時刻)
+    loading: dict[str, tuple[int, float]] = {}
+    driver = _new_driver(page_load_strategy="none")
+
+    def start(handle: str) -> None:
+        index, url = pending.popleft()
+        driver.switch_to.window(handle)
+        driver.get(url)
+        loading[handle] = (index, time.monotonic())
+
+    try:
+        handles = [driver.current_window_handle]
+        for _ in range(min(max_tabs, len(urls)) - 1):
+            driver.switch_to.new_window("tab")
+            _block_resources(driver)
+            handles.append(driver.current_window_handle)
+        for handle in handles:
+            start(handle)
 
-        return html_content
+        while loading:
+            for handle, (index, started_at) in list(loading.items()):
+                driver.switch_to.window(handle)
+                state = driver.execute_script(ready)
+                timed_out = time.monotonic() - started_at > config.RENDER_TIMEOUT
+                if state >= RENDER_COMPLETE or (timed_out and state >= RENDER_USABLE):
+                    results[index] = _page_html(driver, state, started_at)
+                elif timed_out:
+                    results[index] = Exception(f"Timed out rendering: {urls[index]}")
+                else:
+                    continue
+                del loading[handle]
+                if pending:
+                    start(handle)
+            if loading:
+                time.sleep(0.05)
+        return results
     finally:
         driver.quit()
 
 
+# 出馬表の描画の状態を返す。出走馬の行があれば取り出せ、オッズが数値で埋まれば描画が完了している
+# (発売前のオッズは "---.-" のまま埋まらないため、時間切れの時点で出走馬の行があればそのまま取り出す)
+SHUTUBA_READY = """
+const rows = document.querySelectorAll("div.RaceTableArea table tr.HorseList");
+if (rows.length === 0) return 0;
+for (const odds of document.querySelectorAll("div.RaceTableArea tr.HorseList span[id^='odds-']")) {
+    if (/^\\d+(\\.\\d+)?$/.test(odds.textContent.trim())) return 2;
+}
+return 1;
+"""
+
+
+def _render_shutuba_pages(urls: list[str]) -> list[str | Exception]:
+    """出馬表を描画する。1件だけの場合はタブを使わずに描画する"""
+    if len(urls) == 1:
+        return [_render_page(urls[0], SHUTUBA_READY)]
+    return _render_pages(urls, SHUTUBA_READY, config.BROWSER_MAX_TABS)
+
+
+def shutuba_url(race_id: str) -> str:
+    return f"{config.RACE_BASE_URL}/race/shutuba.html?race_id={race_id}"
+
+
+async def get_race_shutuba_static_html(race_id: str) -> bytes:
+    """出馬表ページをブラウザを使わずに取得する
+
+    サーバーから配信されるHTMLには馬・騎手・枠・斤量などは含まれるが、
+    オッズと人気はJavaScriptで描画されるため含まれない。
+    """
+    return await fetch(shutuba_url(race_id), ttl=config.SHUTUBA_CACHE_TTL)
+
+
+async def get_race_shutuba_html(race_id: str) -> str:
+    """出馬表ページをSeleniumでレンダリングして取得する。オッズと人気を含む
+
+    描画結果は SHUTUBA_CACHE_TTL 秒の間キャッシュする (キャッシュの先読みで描画しておいた結果も使う)。
+    """
+    [html_content] = await get_race_shutuba_html_batch([race_id])
+    if isinstance(html_content, Exception):
+        raise html_content
+    return html_content
+
+
+async def get_race_shutuba_html_batch(race_ids: list[str]) -> list[str | Exception]:
+    """複数レースの出馬表を、1つのSeleniumセッションのタブで並行してレンダリングする
+
+    レースごとにセッションを作り直す get_race_shutuba_html より速く、Selenium Grid の負荷も小さい。
+    1セッションで同時に開くタブは KEIBA_MCP_BROWSER_MAX_TABS 個まで。
+    キャッシュにある (SHUTUBA_CACHE_TTL 秒以内に描画した) レースは描画しない。
+
+    Args:
+        race_ids: レースIDのリスト
+
+    Returns:
+        list[str | Exception]: race_ids と同じ順序のHTML、または失敗した場合の例外
+    """
+    # レンダリング結果は静的HTMLと区別してキャッシュ・アーカイブする
+    keys = [f"rendered:{shutuba_url(race_id)}" for race_id in race_ids]
+    results: list[str | Exception | None] = []
+    for key in keys:
+        if config.FETCH_MODE == "replay":
+            try:
+                results.append(_replay(key).decode("utf-8"))
+            except Exception as e:
+                results.append(e)
+            continue
+        cached = page_cache.get(key, ttl=config.SHUTUBA_CACHE_TTL)
+        results.append(cached.decode("utf-8") if cached is not None else None)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        urls = [shutuba_url(race_ids[i]) for i in missing]
+        # Seleniumはブロッキングなので、イベントループを止めないよう別スレッドで実行する
+        async with _browser_semaphore:
+            try:
+                rendered = await asyncio.to_thread(_render_shutuba_pages, urls)
+            except Exception as e:
+                rendered = [e] * len(urls)
+        for i, html_content in zip(missing, rendered):
+            results[i] = html_content
+            if isinstance(html_content, str):
+                content = html_content.encode("utf-8")
+                page_cache.set(keys[i], content)
+                _record(keys[i], content)
+
+    return [result if result is not None else Exception("Failed to render") for result in results]
+
+
 async def get_race_result_html(race_id: str) -> bytes:
-    with httpx.Client() as client:
-        response = client.get(
-            f"https://db.netkeiba.com/race/{race_id}",
-        )
-        if response.status_code != httpx.codes.OK:
-            raise Exception(f"Failed to fetch data: {response.status_code}")
+    return await fetch(f"{config.DB_BASE_URL}/race/{race_id}")
 
-        return response.content
 
+async def get_race_list_html(date: str) -> bytes:
+    """開催日別のレース一覧ページを取得する。date は yyyymmdd 形式"""
+    return await fetch(f"{config.DB_BASE_URL}/race/list/{date}/")
 
-async def get_horse_profile_html(horse_id: str) -> bytes:
-    with httpx.Client() as client:
-        response = client.get(
-            f"https://db.netkeiba.com/horse/{horse_id}",
-        )
-        if response.status_code != httpx.codes.OK:
-            raise Exception(f"Failed to fetch data: {response.status_code}")
 
-        return response.content
+def horse_profile_url(horse_id: str) -> str:
+    return f"{config.DB_BASE_URL}/horse/{horse_id}"
 
 
-async def get_jockey_profile_html(jockey_id: str) -> bytes:
-    with httpx.Client() as client:
-        response = client.get(
-            f"https://db.netkeiba.com/jockey/{jockey_id}",
-        )
-        if response.status_code != httpx.codes.OK:
-            raise Exception(f"Failed to fetch data: {response.status_code}")
+def jockey_profile_url(jockey_id: str) -> str:
+    return f"{config.DB_BASE_URL}/jockey/{jockey_id}"
+
+
+async def get_horse_profile_html(horse_id: str, ttl: float | None = None) -> bytes:
+    """馬のページを取得する。ttl を指定しない場合は先読みしたページを使えるよう PROFILE_CACHE_TTL を使う"""
+    return await fetch(horse_profile_url(horse_id), ttl=ttl if ttl is not None else config.PROFILE_CACHE_TTL)
+
+
+def jockey_leading_url(year: int, page: int) -> str:
+    return f"{config.DB_BASE_URL}/?pid=jockey_leading&year={year}&page={page}"
+
+
+async def get_jockey_leading_html(year: int, page: int) -> bytes:
+    """騎手リーディング (年間の勝利数順の騎手一覧) のページを取得する"""
+    return await fetch(jockey_leading_url(year, page))
+
 
-        return response.content
+async def get_jockey_profile_html(jockey_id: str, ttl: float | None = None) -> bytes:
+    """騎手のページを取得する。ttl を指定しない場合は先読みしたページを使えるよう PROFILE_CACHE_TTL を使う"""
+    return await fetch(jockey_profile_url(jockey_id), ttl=ttl if ttl is not None else config.PROFILE_CACHE_TTL)
@@ -0,0 +1,130 @@
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    """環境変数を整数として読み込む。未設定・空文字の場合はデフォルト値を返す"""
+    value = os.environ.get(name, "")
+    return int(value) if value.strip() else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """環境変数を浮動小数点数として読み込む。未設定・空文字の場合はデフォルト値を返す"""
+    value = os.environ.get(name, "")
+    return float(value) if value.strip() else default
+
+
+def _env_str(name: str, default: str) -> str:
+    """環境変数を文字列として読み込む。未設定・空文字の場合はデフォルト値を返す"""
+    value = os.environ.get(name, "")
+    return value if value.strip() else default
+
+
+# netkeibaのベースURL。ローカルのスタンドインサーバーに向ける場合に変更する
+DB_BASE_URL = _env_str("KEIBA_MCP_DB_BASE_URL", "https://db.netkeiba.com").rstrip("/")
+RACE_BASE_URL = _env_str("KEIBA_MCP_RACE_BASE_URL", "https://race.netkeiba.com").rstrip("/")
+
+# 取得モード
+# live: 通常の取得 / record: 取得したページをアーカイブに記録する / replay: アーカイブからのみ取得する
+FETCH_MODE = _env_str("KEIBA_MCP_FETCH_MODE", "live")
+ARCHIVE_DIR = _env_str("KEIBA_MCP_ARCHIVE_DIR", "archive")
+
+# 取得したデータを蓄積するディレクトリ (馬の戦績など)
+DATA_DIR = _env_str("KEIBA_MCP_DATA_DIR", "data")
+# 似た馬の索引 (DATA_DIR/similar) のファイルの変更を確認して読み直す間隔(秒)。0は読み直さない
+# クローラーなど他のプロセスの追加分を取り込むため。追記分は python -m src.similar compact で定期的にまとめる
+SIMILAR_RELOAD_INTERVAL = _env_int("KEIBA_MCP_SIMILAR_RELOAD_INTERVAL", 300)
+
+# クロールのジョブキューの設定 (python -m src.crawl)
+# QUEUE_URL を指定するとコーディネーターのキューに接続する。未指定の場合は DATA_DIR/queue.sqlite3 を直接使う
+QUEUE_URL = _env_str("KEIBA_MCP_QUEUE_URL", "")
+# ワーカーがジョブを借りてから、完了しなければ別のワーカーに渡すまでの時間(秒)
+QUEUE_LEASE_SECONDS = _env_float("KEIBA_MCP_QUEUE_LEASE_SECONDS", 300)
+# ジョブを失敗とするまでの試行回数
+QUEUE_MAX_ATTEMPTS = _env_int("KEIBA_MCP_QUEUE_MAX_ATTEMPTS", 3)
+
+# Selenium Grid のエンドポイント
+SELENIUM_URL = _env_str("KEIBA_MCP_SELENIUM_URL", "http://selenium:4444/wd/hub")
+
+# サーバーのトランスポート設定 (stdio / sse)
+TRANSPORT = _env_str("KEIBA_MCP_TRANSPORT", "stdio")
+HOST = _env_str("KEIBA_MCP_HOST", "127.0.0.1")
+PORT = _env_int("KEIBA_MCP_PORT", 8000)
+# HTTPサーバーが同時に受け付ける接続数の上限 (0は無制限)
+MAX_CONNECTIONS = _env_int("KEIBA_MCP_MAX_CONNECTIONS", 0)
+
+# netkeibaへの同時HTTP接続数の上限
+MAX_HTTP_CONNECTIONS = _env_int("KEIBA_MCP_MAX_HTTP_CONNECTIONS", 10)
+# HTTPリクエストのタイムアウト(秒)
+HTTP_TIMEOUT = _env_int("KEIBA_MCP_HTTP_TIMEOUT", 30)
+# netkeibaへのリクエスト数の上限(件/秒)。0は無制限
+RATE_LIMIT = _env_float("KEIBA_MCP_RATE_LIMIT", 0)
+RATE_LIMIT_BURST = _env_int("KEIBA_MCP_RATE_LIMIT_BURST", 5)
+# 通信エラー・5xx応答時のリトライ回数
+HTTP_RETRIES = _env_int("KEIBA_MCP_HTTP_RETRIES", 2)
+# Seleniumの同時セッション数の上限
+MAX_BROWSER_SESSIONS = _env_int("KEIBA_MCP_MAX_BROWSER_SESSIONS", 2)
+# 複数レースの出馬表をまとめて描画する際に、1セッションで同時に開くタブの数
+BROWSER_MAX_TABS = _env_int("KEIBA_MCP_BROWSER_MAX_TABS", 4)
+# ブラウザでのページの描画を待つ時間の上限(秒)
+RENDER_TIMEOUT = _env_float("KEIBA_MCP_RENDER_TIMEOUT", 5)
+# ブラウザから接続を許すホスト (カンマ区切り)。広告・計測タグなどそれ以外のホストには接続しない。"*" で制限しない
+BROWSER_ALLOWED_HOSTS = _env_str("KEIBA_MCP_BROWSER_ALLOWED_HOSTS", "netkeiba.com,*.netkeiba.com")
+
+# 一括取得時にHTMLのパースを並列実行するプロセス数 (0の場合はイベントループ上で順に実行する)
+PARSE_WORKERS = _env_int("KEIBA_MCP_PARSE_WORKERS", min(os.cpu_count() or 1, 4))
+
+# 一括取得で同時に取得・パースする件数。一括取得のメモリ使用量の上限はこの値で決まる
+BULK_WINDOW = _env_int("KEIBA_MCP_BULK_WINDOW", 16)
+
+# 出馬表を取得した後に、出走馬・騎手のページをバックグラウンドで先読みするかどうか
+PREFETCH_ENABLED = _env_int("KEIBA_MCP_PREFETCH", 0) > 0
+# 先読みを並行して行う数
+PREFETCH_WORKERS = _env_int("KEIBA_MCP_PREFETCH_WORKERS", 2)
+
+# ページキャッシュの設定
+# CACHE_DIR を指定すると複数プロセス間でディスクキャッシュを共有する
+CACHE_DIR = _env_str("KEIBA_MCP_CACHE_DIR", "")
+CACHE_TTL = _env_int("KEIBA_MCP_CACHE_TTL", 600)
+CACHE_MAX_ENTRIES = _env_int("KEIBA_MCP_CACHE_MAX_ENTRIES", 1024)
+# メモリ上に保持するページの合計サイズの上限(バイト)。0は無制限
+CACHE_MAX_BYTES = _env_int("KEIBA_MCP_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+# 出馬表 (静的HTML・描画結果) のキャッシュ有効期限(秒)。出走馬の変更・オッズを反映するため短めにする
+SHUTUBA_CACHE_TTL = _env_int("KEIBA_MCP_SHUTUBA_CACHE_TTL", 60)
+# 馬・騎手のページのキャッシュ有効期限(秒)。朝に先読みしたページを午後のレースまで使えるよう長めにする
+# その代わり、対話的な取得でも当日のレース結果が最大でこの時間反映されない (refresh_horse_profiles は CACHE_TTL を使う)
+PROFILE_CACHE_TTL = _env_int("KEIBA_MCP_PROFILE_CACHE_TTL", 12 * 60 * 60)
+
+# 騎手の成績の設定
+# 保存済みの騎手情報をそのまま返す期間(秒)。過ぎていれば一括取得時に騎手のページを取得し直す
+JOCKEY_STATS_TTL = _env_int("KEIBA_MCP_JOCKEY_STATS_TTL", 12 * 60 * 60)
+# リーディングに載らない項目 (通算成績・G1勝利数など) を、騎手のページから取得し直すまでの期間(秒)
+JOCKEY_PROFILE_TTL = _env_int("KEIBA_MCP_JOCKEY_PROFILE_TTL", 7 * 24 * 60 * 60)
+# 騎手リーディングを取得するページ数の上限
+JOCKEY_LEADING_PAGES = _env_int("KEIBA_MCP_JOCKEY_LEADING_PAGES", 10)
+
+# キャッシュの先読みの設定 (python -m src.warmer)
+# 出走馬・騎手のページを先読みする時間帯 (日本時間の "開始時-終了時")。アクセスの少ない時間帯にする
+WARM_OFF_PEAK_HOURS = _env_str("KEIBA_MCP_WARM_OFF_PEAK_HOURS", "6-11")
+# 1日の先読み (レース一覧・出馬表・出走馬・騎手のページ) で送るリクエスト数の上限と、先読みのリクエスト数の上限(件/秒)
+WARM_BUDGET = _env_int("KEIBA_MCP_WARM_BUDGET", 2000)
+WARM_RATE = _env_float("KEIBA_MCP_WARM_RATE", 1)
+# 発走の何秒前から、オッズ・馬体重を含む出馬表を取得し直し続けるか
+WARM_REFRESH_WINDOW = _env_int("KEIBA_MCP_WARM_REFRESH_WINDOW", 60 * 60)
+# 発走前に出馬表を取得し直す間隔(秒)。SHUTUBA_CACHE_TTL 以下にするとキャッシュが切れない
+WARM_REFRESH_INTERVAL = _env_int("KEIBA_MCP_WARM_REFRESH_INTERVAL", 60)
+# 1回の取得し直しでブラウザでレンダリングするレース数の上限。超えた分は発走が近い順に次の確認で取得する
+WARM_MAX_RENDERS = _env_int("KEIBA_MCP_WARM_MAX_RENDERS", 4)
+# 当日に加えて、何日先までのレースを調べるか。0は当日のみ (1なら前日の夜のオフピークに翌日のページを先読みできる)
+WARM_LOOKAHEAD_DAYS = _env_int("KEIBA_MCP_WARM_LOOKAHEAD_DAYS", 1)
+
+# プロファイリングの設定
+# PROFILE_TOOLS にツール名をカンマ区切りで指定すると、そのツールの呼び出しを常にプロファイルする ("*" で全ツール)
+PROFILE_TOOLS = frozenset(name.strip() for name in _env_str("KEIBA_MCP_PROFILE_TOOLS", "").split(",") if name.strip())
+PROFILE_DIR = _env_str("KEIBA_MCP_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "keiba-mcp-profiles"))
+# 保持するプロファイルの上限数。超えた場合は古いものから削除する
+PROFILE_MAX_FILES = _env_int("KEIBA_MCP_PROFILE_MAX_FILES", 50)
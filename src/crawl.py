@@ -0,0 +1,172 @@
+"""ジョブキューを使った分散クロール
+
+コーディネーターがレース・馬・騎手のIDをキューに追加し、ワーカーがジョブを借りて取得・パースした結果をキューの
+データベースに書き込む。ワーカーを増やすほど取得が速くなり、同じIDを複数のワーカーが取得することはない
+(レート制限はワーカーのプロセスごとにかかるため、ワーカーを別のホスト・IPに分けると全体の上限も上がる)。
+
+1台のホストで実行する場合は、KEIBA_MCP_DATA_DIR/queue.sqlite3 を全プロセスで共有する。
+
+    python -m src.crawl enqueue --kind race --date 20250413
+    python -m src.crawl worker --follow   # 複数起動してよい
+    python -m src.crawl status
+
+複数のホストで実行する場合は、コーディネーターでキューをHTTPで公開し、ワーカー側で KEIBA_MCP_QUEUE_URL を指定する。
+
+    python -m src.crawl serve --host 0.0.0.0 --port 8100
+    KEIBA_MCP_QUEUE_URL=http://coordinator:8100 python -m src.crawl worker
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from collections import Counter
+from collections.abc import Awaitable, Callable
+
+import uvicorn
+from pydantic import BaseModel
+
+from src.clients import close_http_client, get_race_list_html
+from src.loaders import load_horse_profile, load_jockey_profile, load_race_result, normalize_date
+from src.metrics import registry
+from src.models import RaceResult
+from src.parse.parse_race_list import parse_race_list
+from src.workqueue import JOB_KINDS, Job, RemoteWorkQueue, WorkQueue, create_queue_app, open_work_queue
+
+# ジョブの種類ごとの取得・パース処理
+JOB_LOADERS: dict[str, Callable[[str], Awaitable[BaseModel]]] = {
+    "race": load_race_result,
+    "horse": load_horse_profile,
+    "jockey": load_jockey_profile,
+}
+
+
+def related_jobs(result: BaseModel) -> dict[str, list[str]]:
+    """レース結果に含まれる出走馬・騎手のIDを返す (--follow で続けて取得するジョブ)"""
+    if not isinstance(result, RaceResult):
+        return {}
+    return {
+        "horse": [item.horse.horse_id for item in result.results if item.horse.horse_id],
+        "jockey": [item.jockey.jockey_id for item in result.results if item.jockey.jockey_id],
+    }
+
+
+async def run_worker(
+    queue: WorkQueue | RemoteWorkQueue,
+    concurrency: int = 8,
+    follow: bool = False,
+    exit_when_idle: bool = False,
+    poll_interval: float = 1.0,
+    loaders: dict[str, Callable[[str], Awaitable[BaseModel]]] = JOB_LOADERS,
+) -> Counter[str]:
+    """キューのジョブを取得・パースし続ける
+
+    同時に最大 concurrency 件のジョブを借り、1件終わるごとに次のジョブを借りる。
+
+    Args:
+        queue: ジョブキュー
+        concurrency: 同時に実行するジョブ数
+        follow: Trueの場合、レース結果に含まれる出走馬・騎手もキューに追加する
+        exit_when_idle: Trueの場合、実行待ち・実行中のジョブがなくなったら終了する
+        poll_interval: キューが空のときに次に確認するまでの間隔(秒)
+        loaders: ジョブの種類ごとの取得・パース処理
+
+    Returns:
+        Counter[str]: 結果ごとのジョブ数 ("done" / "failed" / "lost")
+    """
+    counts: Counter[str] = Counter()
+
+    async def run(job: Job) -> None:
+        try:
+            try:
+                result = await loaders[job.kind](job.id)
+            except Exception as e:
+                await asyncio.to_thread(queue.fail, job, str(e) or type(e).__name__)
+                outcome = "failed"
+            else:
+                if follow:
+                    for kind, ids in related_jobs(result).items():
+                        await asyncio.to_thread(queue.enqueue, kind, ids)
+                # リースが切れて別のワーカーに渡っていた場合は書き込まれない
+                completed = await asyncio.to_thread(queue.complete, job, result.model_dump_json())
+                outcome = "done" if completed else "lost"
+        except Exception as e:
+            # コーディネーターに接続できないなどで結果を書き込めなかった。リースが切れると別のワーカーに渡る
+            print(f"Failed to report {job.kind} {job.id} to the queue: {e!r}", file=sys.stderr)
+            outcome = "lost"
+        counts[outcome] += 1
+        registry.inc("keiba_crawl_jobs_total", help="ワーカーが処理したジョブ数", kind=job.kind, result=outcome)
+
+    running: set[asyncio.Task[None]] = set()
+    try:
+        while True:
+            if len(running) < concurrency:
+                jobs = await asyncio.to_thread(queue.lease, concurrency - len(running))
+                running.update(asyncio.create_task(run(job)) for job in jobs)
+            if running:
+                _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            if exit_when_idle:
+                stats = await asyncio.to_thread(queue.stats)
+                if not any(statuses.get("pending") or statuses.get("leased") for statuses in stats.values()):
+                    return counts
+            await asyncio.sleep(poll_interval)
+    finally:
+        for task in running:
+            task.cancel()
+        # 取り消したタスクが終わってからクライアントを閉じる
+        await asyncio.gather(*running, return_exceptions=True)
+        await close_http_client()
+
+
+async def _race_ids_on(dates: list[str]) -> list[str]:
+    race_ids: list[str] = []
+    for date in dates:
+        race_ids.extend(parse_race_list(await get_race_list_html(normalize_date(date))))
+    return race_ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="ジョブを追加する")
+    enqueue.add_argument("--kind", choices=JOB_KINDS, required=True)
+    enqueue.add_argument("ids", nargs="*", help="取得するID。'-' の場合は標準入力から1行1件で読む")
+    enqueue.add_argument("--date", action="append", default=[], help="この日の全レースを追加する (--kind race)")
+    enqueue.add_argument("--force", action="store_true", help="完了・失敗済みのジョブも取得し直す")
+
+    worker = commands.add_parser("worker", help="ジョブを取得・パースする")
+    worker.add_argument("--concurrency", type=int, default=8, help="同時に実行するジョブ数")
+    worker.add_argument("--follow", action="store_true", help="レース結果の出走馬・騎手もキューに追加する")
+    worker.add_argument("--exit-when-idle", action="store_true", help="ジョブがなくなったら終了する")
+
+    serve = commands.add_parser("serve", help="キューを他のホストのワーカーにHTTPで公開する")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8100)
+
+    commands.add_parser("status", help="ジョブの状況と失敗したジョブを表示する")
+    args = parser.parse_args()
+
+    queue = open_work_queue()
+    if args.command == "enqueue":
+        ids = [line.strip() for line in sys.stdin] if args.ids == ["-"] else list(args.ids)
+        if args.date:
+            if args.kind != "race":
+                parser.error("--date は --kind race の場合のみ指定できます")
+            ids.extend(asyncio.run(_race_ids_on(args.date)))
+        print(f"added {queue.enqueue(args.kind, ids, force=args.force)} of {len(ids)} {args.kind} jobs")
+    elif args.command == "worker":
+        counts = asyncio.run(run_worker(queue, args.concurrency, args.follow, args.exit_when_idle))
+        print(json.dumps(counts, sort_keys=True))
+    elif args.command == "serve":
+        if not isinstance(queue, WorkQueue):
+            parser.error("serve はキューのデータベースがあるホストで、KEIBA_MCP_QUEUE_URL を指定せずに実行してください")
+        uvicorn.run(create_queue_app(queue), host=args.host, port=args.port)
+    else:
+        print(json.dumps({"jobs": queue.stats(), "failures": queue.failures()}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import asyncio
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import TypeVar
+
+from src import config
+from src.metrics import timer
+
+T = TypeVar("T")
+
+_parse_pool: ProcessPoolExecutor | None = None
+
+
+def get_parse_pool() -> ProcessPoolExecutor | None:
+    """HTMLのパースに使うプロセスプールを取得する。並列パースが無効の場合はNoneを返す"""
+    global _parse_pool
+    if config.PARSE_WORKERS <= 0:
+        return None
+    if _parse_pool is None:
+        # サーバーはスレッドを使っているため、forkではなくspawnでワーカーを起動する
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=config.PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_pool
+
+
+async def run_parser(parser: Callable[[bytes | str], T], html: bytes | str) -> T:
+    """パーサーをプロセスプールで実行する
+
+    パースはCPUを使い続けるため、一括取得では別プロセスで並列に実行してイベントループを塞がないようにする。
+    別プロセスで記録された処理段階ごとのメトリクスは集計されないため、プール全体の所要時間を parse_pool として記録する。
+    """
+    pool = get_parse_pool()
+    if pool is None:
+        return parser(html)
+
+    with timer("parse_pool"):
+        return await asyncio.get_running_loop().run_in_executor(pool, parser, html)
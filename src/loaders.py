@@ -0,0 +1,368 @@
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from src import config
+from src.clients import (
+    get_horse_profile_html,
+    get_jockey_leading_html,
+    get_jockey_profile_html,
+    get_race_list_html,
+    get_race_result_html,
+    get_race_shutuba_html,
+    get_race_shutuba_html_batch,
+    get_race_shutuba_static_html,
+)
+from src.executor import run_parser
+from src.models import (
+    EnrichedShutuba,
+    EnrichedShutubaItem,
+    HorseProfile,
+    HorseRaceResultItem,
+    JockeyInfo,
+    JockeySummary,
+    RaceResult,
+    RaceShutuba,
+    RecentFormItem,
+)
+from src.odds import ODDS_PATTERN, get_odds_store
+from src.parse.parse_horse import parse_horse_profile, parse_horse_profile_update
+from src.parse.parse_jockey import parse_jockey, parse_jockey_leading
+from src.parse.parse_race import parse_race_result
+from src.parse.parse_race_list import PLACE_CODES, parse_race_list
+from src.parse.parse_shutuba import parse_shutuba
+from src.search import index_names
+from src.similar import index_form
+from src.store import get_horse_store, get_jockey_store
+
+# netkeibaの日付・発走時刻は日本時間
+JST = timezone(timedelta(hours=9), "JST")
+
+
+def has_odds(shutuba: RaceShutuba) -> bool:
+    """出馬表にオッズ・人気が描画済みかどうかを判定する
+
+    静的HTMLではオッズが "---.-"、人気が "**" のようなプレースホルダーになる。
+    取消馬はオッズが付かないため、1頭でもオッズが入っていれば描画済みとみなす。
+    """
+    return any(
+        ODDS_PATTERN.match(item.odds.strip()) and ODDS_PATTERN.match(item.pop.strip()) for item in shutuba.shutuba
+    )
+
+
+async def _load_static_shutuba(race_id: str) -> RaceShutuba | None:
+    """ブラウザを使わずに出馬表を取得する。出走馬が取れない・取得できない場合はNoneを返す"""
+    try:
+        static_shutuba = parse_shutuba(await get_race_shutuba_static_html(race_id))
+    except Exception:
+        # 静的HTMLが取得できない場合もブラウザでの取得を試みる
+        return None
+    return static_shutuba if static_shutuba.shutuba else None
+
+
+async def load_shutuba(race_id: str, include_odds: bool = False) -> RaceShutuba:
+    """出馬表を取得してパースする
+
+    オッズ・人気はJavaScriptで描画され静的HTMLには含まれないため、include_odds の場合は
+    静的HTMLを取得せずに最初からSeleniumでレンダリングする。
+    そうでない場合はブラウザを使わないHTTPリクエストで取得し、出走馬が取れない場合のみレンダリングにフォールバックする。
+
+    Args:
+        race_id: レースID
+        include_odds: Trueの場合、ブラウザで描画してオッズ・人気を含める
+
+    Returns:
+        RaceShutuba: パースした出馬表データ
+    """
+    shutuba = None if include_odds else await _load_static_shutuba(race_id)
+    if shutuba is None:
+        shutuba = parse_shutuba(await get_race_shutuba_html(race_id))
+    _remember_shutuba(shutuba)
+    return shutuba
+
+
+async def load_shutubas(race_ids: list[str], include_odds: bool = False) -> list[RaceShutuba | Exception]:
+    """複数レースの出馬表を取得してパースする
+
+    load_shutuba と同じく、include_odds でなければ静的HTMLを先に並行して取得する。
+    ブラウザが必要なレースは、1つのSeleniumセッションのタブでまとめてレンダリングする。
+
+    Returns:
+        list[RaceShutuba | Exception]: race_ids と同じ順序の出馬表、または失敗した場合の例外
+    """
+    results: list[RaceShutuba | Exception | None]
+    if include_odds:
+        results = [None] * len(race_ids)
+    else:
+        results = list(await asyncio.gather(*(_load_static_shutuba(race_id) for race_id in race_ids)))
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        pages = await get_race_shutuba_html_batch([race_ids[i] for i in missing])
+        parsed = await asyncio.gather(
+            *(run_parser(parse_shutuba, page) for page in pages if isinstance(page, str)), return_exceptions=True
+        )
+        parsed_iter = iter(parsed)
+        for i, page in zip(missing, pages):
+            if isinstance(page, Exception):
+                results[i] = page
+                continue
+            shutuba = next(parsed_iter)
+            # キャンセルなど Exception 以外は、失敗したレースとして扱わずにそのまま伝える
+            if not isinstance(shutuba, (RaceShutuba, Exception)):
+                raise shutuba
+            results[i] = shutuba
+
+    shutubas: list[RaceShutuba | Exception] = []
+    for result in results:
+        if isinstance(result, RaceShutuba):
+            _remember_shutuba(result)
+            shutubas.append(result)
+        else:
+            shutubas.append(result if isinstance(result, Exception) else Exception("Failed to load shutuba"))
+    return shutubas
+
+
+def _remember_shutuba(shutuba: RaceShutuba) -> None:
+    """出馬表に含まれる名前を索引に登録し、オッズが付いていればその時点のオッズを記録する"""
+    index_names(shutuba)
+    if has_odds(shutuba):
+        get_odds_store().record(shutuba)
+
+
+async def load_race_result(race_id: str) -> RaceResult:
+    """レース結果を取得し、プロセスプールでパースする"""
+    html = await get_race_result_html(race_id)
+    result = await run_parser(parse_race_result, html)
+    index_names(result)
+    return result
+
+
+async def load_horse_profile(horse_id: str) -> HorseProfile:
+    """馬情報を取得し、プロセスプールでパースする"""
+    html = await get_horse_profile_html(horse_id)
+    profile = await run_parser(parse_horse_profile, html)
+    index_names(profile)
+    index_form(profile)
+    return profile
+
+
+async def load_jockey_profile(jockey_id: str) -> JockeyInfo:
+    """騎手情報を取得し、プロセスプールでパースする"""
+    html = await get_jockey_profile_html(jockey_id)
+    jockey = await run_parser(parse_jockey, html)
+    index_names(jockey)
+    if jockey.jockey_id:
+        get_jockey_store().put(jockey, from_profile=True)
+    return jockey
+
+
+async def load_jockey_stats(jockey_id: str) -> JockeyInfo:
+    """騎手情報を取得する。JOCKEY_STATS_TTL 秒以内に保存した騎手情報があれば、騎手のページを取得せずにそれを返す
+
+    load_jockey_leaderboard でリーディングを取り込んでおけば、リーディングに載っている騎手はページを取得せずに済む。
+    ただし騎手のページを一度も取得していないか、JOCKEY_PROFILE_TTL 秒より前に取得した騎手は、
+    リーディングに載らない項目を埋めるために騎手のページを取得する。
+    """
+    stored = get_jockey_store().get(jockey_id)
+    now = time.time()
+    if (
+        stored is not None
+        and now - stored.updated_at <= config.JOCKEY_STATS_TTL
+        and stored.profile_updated_at
+        and now - stored.profile_updated_at <= config.JOCKEY_PROFILE_TTL
+    ):
+        return stored.jockey
+    return await load_jockey_profile(jockey_id)
+
+
+def _merge_central(profile_text: str, leading_text: str) -> str:
+    """騎手のページの "中央17勝(15位) 地方1勝(218位)" のような項目の、中央の部分だけをリーディングの値にする"""
+    if not leading_text:
+        return profile_text
+    if "中央" not in profile_text:
+        return leading_text
+    return re.sub(r"中央\S*", lambda _: leading_text, profile_text.strip(), count=1)
+
+
+async def load_jockey_leaderboard(max_pages: int | None = None) -> list[JockeyInfo]:
+    """本年の騎手リーディングから、掲載されている全騎手の成績をまとめて取り込む
+
+    リーディングを1ページずつ取得し、新しい騎手が現れなくなったら止める。
+    本年勝利数・本年獲得賞金はリーディングの値を使い、リーディングに載らない項目 (身長・体重、デビュー年、
+    通算成績、G1・重賞勝利数) は保存済みの騎手情報から補う。騎手のページはここでは取得せず、
+    それらの項目が必要になった時点で load_jockey_stats が取得する。
+
+    Args:
+        max_pages: 取得するリーディングのページ数の上限。Noneの場合は JOCKEY_LEADING_PAGES
+
+    Returns:
+        list[JockeyInfo]: リーディングの掲載順の騎手情報
+    """
+    # netkeibaの年は日本時間で切り替わる
+    year = datetime.now(JST).year
+    leading: dict[str, JockeyInfo] = {}
+    for page in range(1, (max_pages if max_pages is not None else config.JOCKEY_LEADING_PAGES) + 1):
+        jockeys = await run_parser(parse_jockey_leading, await get_jockey_leading_html(year, page))
+        new = [jockey for jockey in jockeys if jockey.jockey_id not in leading]
+        if not new:
+            break
+        leading.update((jockey.jockey_id, jockey) for jockey in new)
+
+    store = get_jockey_store()
+    merged: list[JockeyInfo] = []
+    for jockey_id, jockey in leading.items():
+        stored = store.get(jockey_id)
+        if stored is not None:
+            jockey = stored.jockey.model_copy(
+                update={
+                    "current_year_wins": _merge_central(stored.jockey.current_year_wins, jockey.current_year_wins),
+                    "current_year_prize": _merge_central(stored.jockey.current_year_prize, jockey.current_year_prize),
+                }
+            )
+        index_names(jockey)
+        store.put(jockey, from_profile=False)
+        merged.append(jockey)
+    return merged
+
+
+def _recent_form(profile: HorseProfile, last_n: int) -> list[RecentFormItem]:
+    return [
+        RecentFormItem(
+            race_date=item.race_date,
+            race_name=item.race.race_name,
+            place=item.place,
+            course=item.course,
+            condition=item.condition,
+            horse_number=item.horse_number,
+            rank=item.rank,
+            pop=item.pop,
+            time=item.time,
+            margin=item.margin,
+            jockey_name=item.jockey.jockey_name,
+        )
+        for item in profile.race_result[:last_n]
+    ]
+
+
+async def load_enriched_shutuba(race_id: str, last_n: int = 5, include_odds: bool = False) -> EnrichedShutuba:
+    """出馬表に、出走馬の近走成績と騎手の成績を結合する
+
+    出走馬・騎手のページはすべて並行して取得する。取得に失敗した馬・騎手は該当する項目を空にする。
+
+    Args:
+        race_id: レースID
+        last_n: 出走馬ごとに含める近走の数
+        include_odds: Trueの場合、ブラウザで描画してオッズ・人気を含める
+
+    Returns:
+        EnrichedShutuba: 近走成績と騎手の成績を結合した出馬表
+    """
+    if last_n < 1:
+        raise ValueError(f"last_n must be at least 1: {last_n}")
+    shutuba = await load_shutuba(race_id, include_odds)
+
+    jockey_ids = list(dict.fromkeys(item.jockey.jockey_id for item in shutuba.shutuba if item.jockey.jockey_id))
+    horses, jockeys = await asyncio.gather(
+        asyncio.gather(*(load_horse_profile(item.horse.horse_id) for item in shutuba.shutuba), return_exceptions=True),
+        asyncio.gather(*(load_jockey_stats(jockey_id) for jockey_id in jockey_ids), return_exceptions=True),
+    )
+    jockey_by_id = {
+        jockey_id: jockey for jockey_id, jockey in zip(jockey_ids, jockeys) if isinstance(jockey, JockeyInfo)
+    }
+
+    runners: list[EnrichedShutubaItem] = []
+    for item, horse in zip(shutuba.shutuba, horses):
+        horse_profile = horse if isinstance(horse, HorseProfile) else None
+        jockey = jockey_by_id.get(item.jockey.jockey_id)
+        runners.append(
+            EnrichedShutubaItem(
+                waku=item.waku,
+                num=item.num,
+                horse=item.horse,
+                sex_age=item.sex_age,
+                impost_weight=item.impost_weight,
+                horse_weight=item.horse_weight,
+                odds=item.odds,
+                pop=item.pop,
+                total_record=horse_profile.total_record if horse_profile is not None else None,
+                recent_form=_recent_form(horse_profile, last_n) if horse_profile is not None else [],
+                jockey=JockeySummary(
+                    jockey_name=item.jockey.jockey_name,
+                    jockey_id=item.jockey.jockey_id,
+                    current_year_wins=jockey.current_year_wins if jockey is not None else None,
+                    total_wins=jockey.total_wins if jockey is not None else None,
+                    g1_wins=jockey.g1_wins if jockey is not None else None,
+                    stakes_wins=jockey.stakes_wins if jockey is not None else None,
+                ),
+            )
+        )
+
+    return EnrichedShutuba(
+        race_name=shutuba.race_name,
+        race_id=shutuba.race_id,
+        date=shutuba.date,
+        time=shutuba.time,
+        place=shutuba.place,
+        course=shutuba.course,
+        weather=shutuba.weather,
+        condition=shutuba.condition,
+        runners=runners,
+    )
+
+
+async def refresh_horse_profile(horse_id: str) -> tuple[str, HorseProfile, list[HorseRaceResultItem]]:
+    """馬情報を取得し、保存済みの戦績に新しい出走だけを取り込んで保存する
+
+    Returns:
+        tuple[str, HorseProfile, list[HorseRaceResultItem]]:
+            状態 ("created" / "unchanged" / "updated")、更新後の馬情報、新たに追加したレース結果
+    """
+    store = get_horse_store()
+    stored = store.get(horse_id)
+    # 当日のレース結果を取り込むため、先読み用の長い有効期限ではなく通常の有効期限を使う
+    html = await get_horse_profile_html(horse_id, ttl=config.CACHE_TTL)
+
+    if stored is None:
+        profile = await run_parser(parse_horse_profile, html)
+        index_names(profile)
+        index_form(profile)
+        store.put(profile)
+        return "created", profile, profile.race_result
+
+    # 保存済みの戦績は大きく、プロセスプールに渡すと pickle の負担が大きいうえ、変更がないときに
+    # stored をそのまま返す同一性も失われるため、スレッドでパースする
+    profile, new_race_results = await asyncio.to_thread(parse_horse_profile_update, html, stored)
+    index_names(profile)
+    if profile is stored:
+        return "unchanged", stored, []
+    index_form(profile)
+    store.put(profile)
+    return "updated", profile, new_race_results
+
+
+def normalize_date(date: str) -> str:
+    """日付を yyyymmdd 形式にそろえる ("2025-04-13", "2025/4/13", "2025年4月13日" に対応)"""
+    match = re.match(r"^(\d{4})\D?(\d{1,2})\D?(\d{1,2})\D?$", date.strip())
+    if match is None:
+        raise ValueError(f"Invalid date: {date}")
+    year, month, day = match.groups()
+    return f"{year}{int(month):02d}{int(day):02d}"
+
+
+def normalize_place(place: str) -> str:
+    """競馬場名または場コードを場コードにそろえる"""
+    place = place.strip()
+    if place in PLACE_CODES:
+        return PLACE_CODES[place]
+    if place.zfill(2) in PLACE_CODES.values():
+        return place.zfill(2)
+    raise ValueError(f"Unknown place: {place}")
+
+
+async def load_meeting_race_ids(place: str, date: str) -> list[str]:
+    """開催日と競馬場から、その日のレースIDの一覧を取得する"""
+    place_code = normalize_place(place)
+    race_ids = parse_race_list(await get_race_list_html(normalize_date(date)))
+    return [race_id for race_id in race_ids if race_id[4:6] == place_code]
@@ -0,0 +1,195 @@
+import functools
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# 処理時間のヒストグラムのバケット(秒)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """累積バケット形式のヒストグラム"""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後の要素は+Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """バケットから分位点を近似する(該当バケットの上限値を返す)
+
+        最大のバケットの上限を超える場合は上限がないためNoneを返す (JSONにそのまま書き出せるようにする)。
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return None
+
+
+class MetricsRegistry:
+    """カウンターとヒストグラムを保持するレジストリ"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, Histogram]] = {}
+        self._help: dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels: str) -> None:
+        """カウンターを加算する"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, help: str = "", **labels: str) -> None:
+        """ヒストグラムに値を記録する"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """Prometheusのテキスト形式で出力する"""
+        lines: list[str] = []
+        with self._lock:
+            for name, counter_series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(counter_series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+            for name, histogram_series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(histogram_series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, Any]:
+        """人が読むための要約を返す"""
+        result: dict[str, Any] = {"counters": {}, "histograms": {}}
+        with self._lock:
+            for name, counter_series in sorted(self._counters.items()):
+                result["counters"][name] = [
+                    {"labels": dict(labels), "value": value} for labels, value in sorted(counter_series.items())
+                ]
+            for name, histogram_series in sorted(self._histograms.items()):
+                result["histograms"][name] = [
+                    {
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": round(histogram.sum, 6),
+                        "mean": round(histogram.sum / histogram.count, 6) if histogram.count else 0.0,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "p99": histogram.quantile(0.99),
+                    }
+                    for labels, histogram in sorted(histogram_series.items())
+                ]
+        return result
+
+
+# プロセス全体で共有するレジストリ
+registry = MetricsRegistry()
+
+STAGE_SECONDS = "keiba_stage_seconds"
+STAGE_SECONDS_HELP = "処理段階ごとの所要時間(秒)"
+
+
+@contextmanager
+def timer(stage: str, **labels: str) -> Iterator[None]:
+    """withブロックの所要時間を処理段階(stage)のヒストグラムに記録する"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(STAGE_SECONDS, time.perf_counter() - start, help=STAGE_SECONDS_HELP, stage=stage, **labels)
+
+
+def timed(stage: str, **labels: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """関数の所要時間を処理段階(stage)のヒストグラムに記録するデコレーター"""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with timer(stage, **labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def track_tool(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    """MCPツールの呼び出し回数・エラー数・所要時間を記録するデコレーター"""
+    tool = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        registry.inc("keiba_tool_calls_total", help="ツールの呼び出し回数", tool=tool)
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except BaseException:
+            registry.inc("keiba_tool_errors_total", help="ツールのエラー回数", tool=tool)
+            raise
+        finally:
+            registry.observe("keiba_tool_seconds", time.perf_counter() - start, help="ツールの所要時間(秒)", tool=tool)
+
+    return wrapper
@@ -117,3 +117,52 @@ class JockeyInfo(BaseModel):
 class JockeyInfoPicked(BaseModel):
     jockey_name: str = Field(..., description="騎手名")
     jockey_id: str = Field(..., description="騎手ID")
+
+
+class EnrichedShutuba(BaseModel):
+    race_name: str = Field(..., description="レース名")
+    race_id: str = Field(..., description="レースID")
+    date: str = Field(..., description="日付")
+    time: str = Field(..., description="発走時刻")
+    place: str = Field(..., description="開催場所")
+    course: str = Field(..., description="コース")
+    weather: str = Field(..., description="天候")
+    condition: str = Field(..., description="馬場状態")
+    runners: list["EnrichedShutubaItem"] = Field(..., description="出走馬")
+
+
+class EnrichedShutubaItem(BaseModel):
+    waku: str = Field(..., description="枠")
+    num: str = Field(..., description="馬番")
+    horse: HorseProfilePicked = Field(..., description="馬情報")
+    sex_age: str = Field(..., description="性齢")
+    impost_weight: str = Field(..., description="斤量")
+    horse_weight: str = Field(..., description="馬体重")
+    odds: str = Field(..., description="オッズ")
+    pop: str = Field(..., description="人気")
+    total_record: str | None = Field(..., description="通算成績 (取得できなかった場合はNone)")
+    recent_form: list["RecentFormItem"] = Field(..., description="近走成績 (新しい順)")
+    jockey: "JockeySummary" = Field(..., description="騎手情報")
+
+
+class RecentFormItem(BaseModel):
+    race_date: str = Field(..., description="レース日")
+    race_name: str = Field(..., description="レース名")
+    place: str = Field(..., description="開催場所")
+    course: str = Field(..., description="コース")
+    condition: str = Field(..., description="馬場状態")
+    horse_number: str = Field(..., description="頭数")
+    rank: str = Field(..., description="着順")
+    pop: str = Field(..., description="人気")
+    time: str = Field(..., description="タイム")
+    margin: str = Field(..., description="着差")
+    jockey_name: str = Field(..., description="騎手名")
+
+
+class JockeySummary(BaseModel):
+    jockey_name: str = Field(..., description="騎手名")
+    jockey_id: str = Field(..., description="騎手ID")
+    current_year_wins: str | None = Field(..., description="本年勝利数 (取得できなかった場合はNone)")
+    total_wins: str | None = Field(..., description="通算勝利数 (取得できなかった場合はNone)")
+    g1_wins: str | None = Field(..., description="GI勝利数 (取得できなかった場合はNone)")
+    stakes_wins: str | None = Field(..., description="重賞勝利数 (取得できなかった場合はNone)")
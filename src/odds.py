@@ -0,0 +1,267 @@
+import fcntl
+import json
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from src import config
+from src.models import RaceShutuba
+
+# 1回分の記録の先頭: 時刻(UNIX秒)、変化した馬の数
+_HEADER_STRUCT = struct.Struct("<dH")
+# 馬1頭分の変化: 馬番、オッズ(10倍した整数)の前回からの差分、人気の前回からの差分
+_CHANGE_STRUCT = struct.Struct("<Bib")
+
+# 描画済みのオッズ・人気 (静的HTMLのプレースホルダー "---.-" や "**" には一致しない)
+ODDS_PATTERN = re.compile(r"^\d+(\.\d+)?$")
+
+
+def _odds_to_int(odds: str) -> int:
+    """オッズを10倍した整数にする。オッズが付いていない場合は0"""
+    odds = odds.strip()
+    return round(float(odds) * 10) if ODDS_PATTERN.match(odds) else 0
+
+
+def _pop_to_int(pop: str) -> int:
+    pop = pop.strip()
+    return int(pop) if pop.isdigit() else 0
+
+
+@dataclass
+class OddsSeries:
+    """1レース分のオッズの時系列
+
+    馬番ごとに、記録した時刻 timestamps と同じ長さの配列を持つ。オッズは10倍した整数、人気は整数で、
+    オッズ・人気が付いていない時点は0になる。
+    """
+
+    race_id: str
+    timestamps: array = field(default_factory=lambda: array("d"))
+    odds: dict[int, array] = field(default_factory=dict)
+    pop: dict[int, array] = field(default_factory=dict)
+
+    def _append(self, timestamp: float, changes: dict[int, tuple[int, int]]) -> None:
+        length = len(self.timestamps)
+        self.timestamps.append(timestamp)
+        for num in set(self.odds) | set(changes):
+            if num not in self.odds:
+                self.odds[num] = array("i", [0] * length)
+                self.pop[num] = array("i", [0] * length)
+            odds_delta, pop_delta = changes.get(num, (0, 0))
+            self.odds[num].append((self.odds[num][-1] if length else 0) + odds_delta)
+            self.pop[num].append((self.pop[num][-1] if length else 0) + pop_delta)
+
+    def latest(self) -> dict[int, tuple[int, int]]:
+        """馬番ごとの最新の (オッズ, 人気)"""
+        return {num: (self.odds[num][-1], self.pop[num][-1]) for num in self.odds}
+
+
+class OddsStore:
+    """出馬表のオッズ・人気を時系列で蓄積する追記専用のストア
+
+    レースごとに1ファイル ({path}/{race_id}.bin) を持ち、記録のたびに前回から変化した馬の
+    オッズ・人気の差分だけを追記する。馬名などの付随情報は {race_id}.json に保存する。
+    追記はファイルロックを取ってから行うため、複数のプロセスから記録してもよい。
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # レースごとに読み込み済みのファイルサイズと時系列
+        self._series: dict[str, tuple[int, OddsSeries]] = {}
+
+    def record(self, shutuba: RaceShutuba, timestamp: float | None = None) -> int:
+        """出馬表のオッズ・人気を記録する。前回から変化した馬の数を返す (変化がなければ何も書かない)"""
+        if not shutuba.race_id.isdigit():
+            return 0
+        timestamp = time.time() if timestamp is None else timestamp
+        current = {
+            int(item.num): (_odds_to_int(item.odds), _pop_to_int(item.pop))
+            for item in shutuba.shutuba
+            if item.num.strip().isdigit()
+        }
+
+        with self._lock, (self.path / f"{shutuba.race_id}.bin").open("a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                series = self._refresh(shutuba.race_id, f)
+                previous = series.latest()
+                # 出馬表から消えた馬 (取消・除外) はオッズなしとして記録する
+                current = {num: (0, 0) for num in previous} | current
+                changes = {
+                    num: (odds - previous.get(num, (0, 0))[0], pop - previous.get(num, (0, 0))[1])
+                    for num, (odds, pop) in current.items()
+                    if (odds, pop) != previous.get(num, (0, 0))
+                }
+                if not changes:
+                    return 0
+
+                record = _HEADER_STRUCT.pack(timestamp, len(changes)) + b"".join(
+                    _CHANGE_STRUCT.pack(num, odds_delta, pop_delta)
+                    for num, (odds_delta, pop_delta) in sorted(changes.items())
+                )
+                f.seek(0, os.SEEK_END)
+                f.write(record)
+                f.flush()
+                series._append(timestamp, changes)
+                self._series[shutuba.race_id] = (f.tell(), series)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        self._write_info(shutuba)
+        return len(changes)
+
+    def get(self, race_id: str) -> OddsSeries | None:
+        """レースのオッズの時系列を返す。記録がない場合はNoneを返す"""
+        path = self.path / f"{race_id}.bin"
+        if not path.exists():
+            return None
+        with self._lock, path.open("rb") as f:
+            return self._refresh(race_id, f)
+
+    def info(self, race_id: str) -> dict[str, Any]:
+        """レース名・馬名などの付随情報を返す"""
+        try:
+            info: dict[str, Any] = json.loads((self.path / f"{race_id}.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        return info
+
+    def race_ids(self, prefixes: list[str] | None = None) -> list[str]:
+        """記録のあるレースIDを昇順に返す。prefixes を指定した場合、いずれかで始まるものだけを返す
+
+        レースIDは 年(4桁) 場(2桁) 回(2桁) 日(2桁) レース番号(2桁) の順に並ぶため、
+        先頭10桁を指定すると1開催日・1競馬場の全レースが対象になる。
+        """
+        race_ids = sorted(path.stem for path in self.path.glob("*.bin"))
+        if prefixes is None:
+            return race_ids
+        return [race_id for race_id in race_ids if any(race_id.startswith(prefix) for prefix in prefixes)]
+
+    def _refresh(self, race_id: str, f: BinaryIO) -> OddsSeries:
+        """前回読み込んだ位置以降の記録を読み込み、時系列を最新にする"""
+        size, series = self._series.get(race_id, (0, OddsSeries(race_id)))
+        f.seek(size)
+        data = f.read()
+
+        offset = 0
+        while offset + _HEADER_STRUCT.size <= len(data):
+            timestamp, count = _HEADER_STRUCT.unpack_from(data, offset)
+            end = offset + _HEADER_STRUCT.size + count * _CHANGE_STRUCT.size
+            if end > len(data):
+                break  # 書きかけの記録
+            changes = {
+                num: (odds_delta, pop_delta)
+                for num, odds_delta, pop_delta in _CHANGE_STRUCT.iter_unpack(data[offset + _HEADER_STRUCT.size : end])
+            }
+            series._append(timestamp, changes)
+            offset = end
+
+        self._series[race_id] = (size + offset, series)
+        return series
+
+    def _write_info(self, shutuba: RaceShutuba) -> None:
+        previous = self.info(shutuba.race_id)
+        info = {
+            "race_name": shutuba.race_name,
+            "date": shutuba.date,
+            "time": shutuba.time,
+            "place": shutuba.place,
+            # 取り消された馬の名前も残す
+            "horses": previous.get("horses", {})
+            | {item.num.strip(): item.horse.horse_name for item in shutuba.shutuba},
+        }
+        path = self.path / f"{shutuba.race_id}.json"
+        if previous == info:
+            return
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(info, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+def odds_movement(series: OddsSeries, horses: dict[str, str] | None = None) -> list[dict[str, object]]:
+    """馬ごとのオッズの推移を集計する
+
+    オッズが付いていない時点は除いて、最初・最新・最小・最大のオッズと変化率を求める。
+    """
+    horses = horses or {}
+    movement: list[dict[str, object]] = []
+    for num in sorted(series.odds):
+        points = [
+            (timestamp, odds, pop)
+            for timestamp, odds, pop in zip(series.timestamps, series.odds[num], series.pop[num])
+            if odds > 0
+        ]
+        if not points:
+            continue
+        values = [odds for _, odds, _ in points]
+        movement.append(
+            {
+                "num": num,
+                "horse_name": horses.get(str(num), ""),
+                "first_odds": values[0] / 10,
+                "last_odds": values[-1] / 10,
+                "min_odds": min(values) / 10,
+                "max_odds": max(values) / 10,
+                "first_pop": points[0][2],
+                "last_pop": points[-1][2],
+                "change_ratio": round(values[-1] / values[0] - 1, 4),
+                "history": [{"timestamp": timestamp, "odds": odds / 10, "pop": pop} for timestamp, odds, pop in points],
+            }
+        )
+    return movement
+
+
+def steam_moves(series: OddsSeries, window: float, threshold: float) -> list[dict[str, object]]:
+    """window 秒以内にオッズが threshold 以上の割合で下がった (売れた) 馬を探す
+
+    馬ごとに、最も大きく下がった区間を1件返す。
+    """
+    moves: list[dict[str, object]] = []
+    timestamps = series.timestamps
+    for num in sorted(series.odds):
+        odds = series.odds[num]
+        best: tuple[float, int, int] | None = None
+        start = 0
+        for end in range(len(timestamps)):
+            if odds[end] <= 0:
+                continue
+            while timestamps[end] - timestamps[start] > window:
+                start += 1
+            highest = max((i for i in range(start, end) if odds[i] > 0), key=lambda i: odds[i], default=None)
+            if highest is None:
+                continue
+            drop = 1 - odds[end] / odds[highest]
+            if drop >= threshold and (best is None or drop > best[0]):
+                best = (drop, highest, end)
+        if best is not None:
+            drop, start_index, end_index = best
+            moves.append(
+                {
+                    "num": num,
+                    "from_odds": odds[start_index] / 10,
+                    "to_odds": odds[end_index] / 10,
+                    "drop_ratio": round(drop, 4),
+                    "from_timestamp": timestamps[start_index],
+                    "to_timestamp": timestamps[end_index],
+                }
+            )
+    return moves
+
+
+_odds_store: OddsStore | None = None
+
+
+def get_odds_store() -> OddsStore:
+    """プロセス内で共有するオッズのストアを取得する"""
+    global _odds_store
+    if _odds_store is None:
+        _odds_store = OddsStore(os.path.join(config.DATA_DIR, "odds"))
+    return _odds_store
@@ -2,6 +2,7 @@ import re
 
 from bs4 import BeautifulSoup
 
+from src.metrics import timed
 from src.models import (
     HorsePed,
     HorseProfile,
@@ -10,9 +11,17 @@ from src.models import (
     JockeyInfoPicked,
     RaceResultPicked,
 )
+from src.parse.preprocess import Region, make_soup
 
+# パースに必要な領域。プロフィール・血統と、戦績テーブル
+HORSE_REGIONS = [
+    Region("div", r'id="db_main_box"', parents=(("div", 'id="contents"'),)),
+    Region("div", r'class="db_main_race\b', parents=(("div", 'id="contents"'),)),
+]
 
-def parse_horse_profile(html: bytes) -> HorseProfile:
+
+@timed("parse", page="horse")
+def parse_horse_profile(html: bytes | str | BeautifulSoup) -> HorseProfile:
     """
     netkeibaの馬情報ページをパースする
 
@@ -22,7 +31,60 @@ def parse_horse_profile(html: bytes) -> HorseProfile:
     Returns:
         HorseProfilePicked: パースした馬情報データ
     """
-    soup = BeautifulSoup(html, "lxml")
+    soup = make_soup(html, "horse", HORSE_REGIONS)
+
+    return HorseProfile(
+        **parse_horse_basic_info(soup),
+        ped=parse_horse_ped(soup),  # 血統情報をパース
+        race_result=parse_horse_race_result(soup),  # レース結果をパース
+    )
+
+
+@timed("parse", page="horse_update")
+def parse_horse_profile_update(
+    html: bytes | str | BeautifulSoup, stored: HorseProfile
+) -> tuple[HorseProfile, list[HorseRaceResultItem]]:
+    """
+    保存済みの馬情報に、netkeibaの馬情報ページから新しい出走だけを取り込む
+
+    通算成績が変わっていなければ戦績はパースしない。
+    変わっている場合も、保存済みの最新のレースより新しい行だけをパースして先頭に追加する。
+
+    Args:
+        html: 馬情報のHTML
+        stored: 保存済みの馬情報
+
+    Returns:
+        tuple[HorseProfile, list[HorseRaceResultItem]]: 更新後の馬情報と、新たに追加したレース結果
+    """
+    soup = make_soup(html, "horse", HORSE_REGIONS)
+
+    basic_info = parse_horse_basic_info(soup)
+    if basic_info["total_record"] == stored.total_record:
+        return stored, []
+
+    # 同じ馬が同じ日に2回出走することはないため、開催日で保存済みのレースを判定する
+    known_race_dates = {item.race_date for item in stored.race_result}
+    new_race_results = parse_horse_race_result(soup, known_race_dates=known_race_dates)
+
+    updated = stored.model_copy(
+        update={
+            **{key: value for key, value in basic_info.items() if value},
+            "race_result": new_race_results + stored.race_result,
+        }
+    )
+    return updated, new_race_results
+
+
+def parse_horse_basic_info(html: bytes | str | BeautifulSoup) -> dict[str, str]:
+    """
+    netkeibaの馬情報ページから、馬名・ID・生年月日・獲得賞金・通算成績をパースする
+    Args:
+        html: 馬情報のHTML
+    Returns:
+        dict[str, str]: horse_name, horse_id, birth, total_prize, total_record
+    """
+    soup = make_soup(html, "horse", HORSE_REGIONS)
 
     # 馬名を取得
     horse_name_element = soup.select_one(
@@ -56,18 +118,16 @@ def parse_horse_profile(html: bytes) -> HorseProfile:
     )
     total_record = total_record_element.get_text() if total_record_element is not None else ""
 
-    return HorseProfile(
-        horse_name=horse_name,
-        horse_id=horse_id,
-        birth=birth,
-        total_prize=total_prize,
-        total_record=total_record,
-        ped=parse_horse_ped(html),  # 血統情報をパース
-        race_result=parse_horse_race_result(html),  # レース結果をパース
-    )
+    return {
+        "horse_name": horse_name,
+        "horse_id": horse_id,
+        "birth": birth,
+        "total_prize": total_prize,
+        "total_record": total_record,
+    }
 
 
-def parse_horse_ped(html: bytes) -> HorsePed:
+def parse_horse_ped(html: bytes | str | BeautifulSoup) -> HorsePed:
     """
     netkeibaの馬情報ページをパースする
     Args:
@@ -76,7 +136,7 @@ def parse_horse_ped(html: bytes) -> HorsePed:
         HorsePed: パースした馬情報データ
     """
 
-    soup = BeautifulSoup(html, "lxml")
+    soup = make_soup(html, "horse", HORSE_REGIONS)
 
     # 血統情報を取得
     # 父を取得
@@ -167,16 +227,20 @@ def parse_horse_ped(html: bytes) -> HorsePed:
     )
 
 
-def parse_horse_race_result(html: bytes) -> list[HorseRaceResultItem]:
+def parse_horse_race_result(
+    html: bytes | str | BeautifulSoup, known_race_dates: set[str] | None = None
+) -> list[HorseRaceResultItem]:
     """
     netkeibaの馬情報ページをパースする
     Args:
         html: 馬情報のHTML
+        known_race_dates: 保存済みのレースの開催日。指定した場合、このいずれかに一致する行でパースを打ち切る
+            (戦績は新しい順に並んでいるため、それより新しい行だけが返る)
     Returns:
         HorseRaceResultItem: パースした馬情報データ
     """
 
-    soup = BeautifulSoup(html, "lxml")
+    soup = make_soup(html, "horse", HORSE_REGIONS)
 
     horse_race_result_items: list[HorseRaceResultItem] = []
     # レース結果を取得
@@ -184,6 +248,8 @@ def parse_horse_race_result(html: bytes) -> list[HorseRaceResultItem]:
         # レース日を取得
         date_element = item.select_one("td:nth-child(1) > a")
         race_date = date_element.get_text() if date_element is not None else ""
+        if known_race_dates is not None and race_date in known_race_dates:
+            break
 
         # 開催場所を取得
         place_element = item.select_one("td:nth-child(2) > a")
@@ -1,11 +1,20 @@
 import re
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 
+from src.metrics import timed
 from src.models import JockeyInfo
+from src.parse.preprocess import Region, make_soup
 
+# パースに必要な領域。騎手名・IDと、成績の詳細テーブル
+JOCKEY_REGIONS = [
+    Region("div", r'id="db_main_box"'),
+    Region("table", r'id="DetailTable"'),
+]
 
-def parse_jockey(html: bytes) -> JockeyInfo:
+
+@timed("parse", page="jockey")
+def parse_jockey(html: bytes | str | BeautifulSoup) -> JockeyInfo:
     """騎手情報を取得する関数
     https://db.netkeiba.com/jockey/{jockey_id}/ から取得する
 
@@ -16,7 +25,7 @@ def parse_jockey(html: bytes) -> JockeyInfo:
         JockeyInfo - 騎手情報
     """
 
-    soup = BeautifulSoup(html, "lxml")
+    soup = make_soup(html, "jockey", JOCKEY_REGIONS)
 
     # 騎手名
     jockey_element = soup.select_one("#db_main_box > div > div.db_head_name.fc > div > h1")
@@ -72,3 +81,103 @@ def parse_jockey(html: bytes) -> JockeyInfo:
         g1_wins=g1_wins,
         stakes_wins=stakes_wins,
     )
+
+
+# リーディングの表。順位・騎手名と、1着数・収得賞金の列を使う
+JOCKEY_LEADING_REGIONS = [Region("table", r'class="[^"]*race_table_01')]
+_JOCKEY_LINK_PATTERN = re.compile(r"/jockey/(?:result/recent/)?(\d{5})/?")
+
+
+def _header_positions(table: Tag) -> dict[str, int]:
+    """表の1行目の見出しから、見出しの文字列 -> データ行での列の位置 を返す
+
+    "重賞 (出走/勝利)" のように2行にまたがる見出しは colspan の分だけ列を進める。
+    """
+    positions: dict[str, int] = {}
+    header = table.select_one("tr")
+    column = 0
+    for cell in header.select("th, td") if header is not None else []:
+        positions.setdefault(re.sub(r"\s", "", cell.get_text()), column)
+        colspan = cell.get("colspan")
+        column += int(colspan) if isinstance(colspan, str) and colspan.isdigit() else 1
+    return positions
+
+
+def _find_column(positions: dict[str, int], *prefixes: str) -> int | None:
+    for prefix in prefixes:
+        for label, column in positions.items():
+            if label.startswith(prefix):
+                return column
+    return None
+
+
+@timed("parse", page="jockey_leading")
+def parse_jockey_leading(html: bytes | str | BeautifulSoup) -> list[JockeyInfo]:
+    """騎手リーディング (年間の勝利数順の騎手一覧) をパースする
+    https://db.netkeiba.com/?pid=jockey_leading&year={year}&page={page}
+
+    1ページで多数の騎手の本年勝利数・本年獲得賞金がそろう。
+    リーディングに載らない項目 (身長・体重、デビュー年、通算成績、G1・重賞勝利数) は空文字にする。
+
+    Args:
+        html: リーディングのHTML
+
+    Returns:
+        list[JockeyInfo]: 掲載順の騎手情報
+    """
+    soup = make_soup(html, "jockey_leading", JOCKEY_LEADING_REGIONS)
+    table = soup.select_one("table.race_table_01")
+    if table is None:
+        return []
+
+    positions = _header_positions(table)
+    rank_column = _find_column(positions, "順位")
+    wins_column = _find_column(positions, "1着")
+    prize_column = _find_column(positions, "収得賞金", "獲得賞金", "賞金")
+
+    def cell_text(cells: list[Tag], column: int | None) -> str:
+        if column is None or column >= len(cells):
+            return ""
+        return re.sub(r"\s", "", cells[column].get_text())
+
+    jockeys: list[JockeyInfo] = []
+    for row in table.select("tr"):
+        cells = row.select("td")
+        link = row.select_one("a[href*='/jockey/']")
+        href = link.get("href") if link is not None else None
+        id_match = _JOCKEY_LINK_PATTERN.search(href) if isinstance(href, str) else None
+        if not cells or link is None or id_match is None:
+            continue
+
+        rank = cell_text(cells, rank_column)
+        wins = cell_text(cells, wins_column)
+        prize = cell_text(cells, prize_column)
+        # 騎手のページと同じ "中央17勝(15位)" の形式にそろえる
+        current_year_wins = f"中央{wins}勝({rank}位)" if wins and rank.isdigit() else f"中央{wins}勝" if wins else ""
+        jockeys.append(
+            JockeyInfo(
+                jockey_name=re.sub(r"\s", "", link.get_text()),
+                jockey_id=id_match.group(1),
+                height_weight="",
+                debut_year="",
+                current_year_wins=current_year_wins,
+                total_wins="",
+                current_year_prize=f"中央{_format_prize(prize)}" if prize else "",
+                total_prize="",
+                g1_wins="",
+                stakes_wins="",
+            )
+        )
+    return jockeys
+
+
+def _format_prize(man_yen: str) -> str:
+    """リーディングの賞金 (万円単位の "35,924.0") を、騎手のページと同じ "3億5,924万円" の形式にする"""
+    try:
+        amount = round(float(man_yen.replace(",", "")))
+    except ValueError:
+        return f"{man_yen}万円"
+    oku, man = divmod(amount, 10000)
+    if oku == 0:
+        return f"{man:,}万円"
+    return f"{oku}億{man:,}万円" if man else f"{oku}億円"
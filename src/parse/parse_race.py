@@ -2,15 +2,24 @@ import re
 
 from bs4 import BeautifulSoup
 
+from src.metrics import timed
 from src.models import (
     HorseProfilePicked,
     JockeyInfoPicked,
     RaceResult,
     RaceResultItem,
 )
+from src.parse.preprocess import Region, make_soup
 
+# パースに必要な領域。レース情報と、着順テーブル
+RACE_RESULT_REGIONS = [
+    Region("div", r'id="main"'),
+    Region("div", r'id="contents_liquid"'),
+]
 
-def parse_race_result(html: bytes) -> RaceResult:
+
+@timed("parse", page="race_result")
+def parse_race_result(html: bytes | str | BeautifulSoup) -> RaceResult:
     """
     レース結果をパースする
 
@@ -20,7 +29,7 @@ def parse_race_result(html: bytes) -> RaceResult:
     Returns:
         RaceResult: パースしたレース結果データ
     """
-    soup = BeautifulSoup(html, "lxml")
+    soup = make_soup(html, "race_result", RACE_RESULT_REGIONS, keep_title=True)
 
     # レース名、日付を取得
     title_element = soup.select_one("head > title")
@@ -65,11 +74,11 @@ def parse_race_result(html: bytes) -> RaceResult:
         course=course,
         weather=weather,
         condition=condition,
-        results=parse_race_result_items(html),
+        results=parse_race_result_items(soup),
     )
 
 
-def parse_race_result_items(html: bytes) -> list[RaceResultItem]:
+def parse_race_result_items(html: bytes | str | BeautifulSoup) -> list[RaceResultItem]:
     """
     レース結果の馬情報をパースする
 
@@ -79,7 +88,7 @@ def parse_race_result_items(html: bytes) -> list[RaceResultItem]:
     Returns:
         list[RaceResultItem]: パースしたレース結果データ
     """
-    soup = BeautifulSoup(html, "lxml")
+    soup = make_soup(html, "race_result", RACE_RESULT_REGIONS, keep_title=True)
 
     race_result_items: list[RaceResultItem] = []
     for item in soup.select("#contents_liquid > table > tr")[1:]:  # 1行目はヘッダーなのでスキップ
@@ -0,0 +1,46 @@
+import re
+
+from bs4 import BeautifulSoup
+
+from src.metrics import timed
+from src.parse.preprocess import make_soup
+
+# 競馬場名と、レースIDの5-6桁目の場コードの対応
+PLACE_CODES = {
+    "札幌": "01",
+    "函館": "02",
+    "福島": "03",
+    "新潟": "04",
+    "東京": "05",
+    "中山": "06",
+    "中京": "07",
+    "京都": "08",
+    "阪神": "09",
+    "小倉": "10",
+}
+
+
+@timed("parse", page="race_list")
+def parse_race_list(html: bytes | str | BeautifulSoup) -> list[str]:
+    """
+    netkeibaの開催日別レース一覧ページをパースする
+    https://db.netkeiba.com/race/list/{yyyymmdd}/
+
+    Args:
+        html: レース一覧のHTML
+
+    Returns:
+        list[str]: その日に行われたレースのIDのリスト(昇順)
+    """
+    soup = make_soup(html, "race_list", [])
+
+    race_ids: set[str] = set()
+    for link_element in soup.select("a[href]"):
+        href = link_element.get("href")
+        if not isinstance(href, str):
+            continue
+        race_id_match = re.match(r"^(?:https://db\.netkeiba\.com)?/race/(\d{12})/?$", href)
+        if race_id_match:
+            race_ids.add(race_id_match.group(1))
+
+    return sorted(race_ids)
@@ -2,15 +2,24 @@ import re
 
 from bs4 import BeautifulSoup
 
+from src.metrics import timed
 from src.models import (
     HorseProfilePicked,
     JockeyInfoPicked,
     RaceShutuba,
     RaceShutubaItem,
 )
+from src.parse.preprocess import Region, make_soup
 
+# パースに必要な領域。レース情報と、出馬表テーブル
+SHUTUBA_REGIONS = [
+    Region("div", r'class="RaceColumn01"', parents=(("div", 'id="page"'),)),
+    Region("div", r'class="RaceTableArea"', parents=(("div", 'id="page"'), ("div", 'class="RaceColumn02"'))),
+]
 
-def parse_shutuba(html: str) -> RaceShutuba:
+
+@timed("parse", page="shutuba")
+def parse_shutuba(html: bytes | str | BeautifulSoup) -> RaceShutuba:
     """
     netkeibaの出馬表ページをパースする
 
@@ -20,7 +29,7 @@ def parse_shutuba(html: str) -> RaceShutuba:
     Returns:
         RaceShutuba: パースした出馬表データ
     """
-    soup = BeautifulSoup(html, "lxml")
+    soup = make_soup(html, "shutuba", SHUTUBA_REGIONS, keep_title=True)
 
     # レース名、日付、場所を取得
     title_element = soup.select_one("head > title")
@@ -67,11 +76,11 @@ def parse_shutuba(html: str) -> RaceShutuba:
         course=course,
         weather=weather,
         condition=condition,
-        shutuba=parse_shutuba_items(html),
+        shutuba=parse_shutuba_items(soup),
     )
 
 
-def parse_shutuba_items(html: str) -> list[RaceShutubaItem]:
+def parse_shutuba_items(html: bytes | str | BeautifulSoup) -> list[RaceShutubaItem]:
     """
     出馬表の馬情報をパースする
 
@@ -81,7 +90,7 @@ def parse_shutuba_items(html: str) -> list[RaceShutubaItem]:
     Returns:
         list[RaceShutubaItem]: パースした出馬表データ
     """
-    soup = BeautifulSoup(html, "lxml")
+    soup = make_soup(html, "shutuba", SHUTUBA_REGIONS, keep_title=True)
 
     # 出馬表の馬情報を取得
     shutuba_items: list[RaceShutubaItem] = []
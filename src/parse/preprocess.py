@@ -0,0 +1,120 @@
+import re
+from dataclasses import dataclass
+
+from bs4 import BeautifulSoup
+
+from src.metrics import timer
+
+# netkeibaのページは EUC-JP で配信される
+DEFAULT_ENCODING = "euc-jp"
+
+_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+_TITLE_PATTERN = re.compile(r"<title[^>]*>.*?</title>", re.IGNORECASE | re.DOTALL)
+# パース結果に影響しない要素。中に含まれるタグが領域の切り出しを狂わせないよう先に取り除く
+_NOISE_PATTERN = re.compile(r"<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+
+
+@dataclass(frozen=True)
+class Region:
+    """ページから切り出す領域
+
+    Attributes:
+        tag: 切り出す要素のタグ名
+        attrs: 開始タグ内の属性にマッチする正規表現 (例: r'id="db_main_box"')
+        parents: 切り出した要素を包む祖先要素の (タグ名, 属性) のリスト。
+            パーサーのCSSセレクターが祖先要素を起点にしている場合に指定する
+    """
+
+    tag: str
+    attrs: str
+    parents: tuple[tuple[str, str], ...] = ()
+
+
+def decode_html(html: str | bytes, encoding: str | None = None) -> str:
+    """HTMLを文字列にデコードする
+
+    encoding が指定されていない場合は、先頭の meta タグで宣言された文字コードを使う。
+    宣言がない場合は EUC-JP とみなす。
+    宣言された文字コードでデコードできない場合 (ブラウザで保存し直したページなど) は UTF-8 を試す。
+    """
+    if isinstance(html, str):
+        return html
+    if encoding is None:
+        match = _CHARSET_PATTERN.search(html, 0, 4096)
+        encoding = match.group(1).decode("ascii") if match else DEFAULT_ENCODING
+    for candidate in (encoding, "utf-8"):
+        try:
+            return html.decode(candidate)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    # 宣言された文字コードが実在しない場合もあるため、最後は既知の文字コードで置換しながらデコードする
+    return html.decode(DEFAULT_ENCODING, errors="replace")
+
+
+def _find_element(html: str, region: Region) -> str | None:
+    """開始タグと対応する終了タグまでを切り出す。見つからない場合はNoneを返す"""
+    start = re.search(rf"<{region.tag}\b[^>]*{region.attrs}[^>]*>", html, re.IGNORECASE)
+    if start is None:
+        return None
+
+    # 同名タグの開始・終了を数え、対応する終了タグを探す
+    depth = 0
+    for tag in re.finditer(rf"<(/?){region.tag}\b[^>]*>", html[start.start() :], re.IGNORECASE):
+        if tag.group(0).endswith("/>"):
+            continue
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return html[start.start() : start.start() + tag.end()]
+    return None
+
+
+def slice_html(html: str, regions: list[Region], keep_title: bool = False) -> str | None:
+    """パースに必要な領域だけを切り出した小さなHTMLを組み立てる
+
+    Args:
+        html: デコード済みのHTML
+        regions: 切り出す領域のリスト
+        keep_title: Trueの場合、<title>も残す
+
+    Returns:
+        str | None: 組み立てたHTML。いずれかの領域が見つからない場合はNone
+    """
+    html = _NOISE_PATTERN.sub("", html)
+
+    fragments: list[str] = []
+    for region in regions:
+        element = _find_element(html, region)
+        if element is None:
+            return None
+        opening = "".join(f"<{tag} {attrs}>" for tag, attrs in region.parents)
+        closing = "".join(f"</{tag}>" for tag, _ in reversed(region.parents))
+        fragments.append(opening + element + closing)
+
+    head = ""
+    if keep_title:
+        title = _TITLE_PATTERN.search(html)
+        if title is None:
+            return None
+        head = f"<head>{title.group(0)}</head>"
+
+    return f"<html>{head}<body>{''.join(fragments)}</body></html>"
+
+
+def make_soup(
+    html: str | bytes | BeautifulSoup, page: str, regions: list[Region], keep_title: bool = False
+) -> BeautifulSoup:
+    """HTMLをデコード・切り出ししてからBeautifulSoupを構築する
+
+    既知の文字コードでデコードして文字コード判定を省き、必要な領域だけで木を構築する。
+    領域が見つからない場合はページ全体から構築する。
+    BeautifulSoupが渡された場合はそのまま返す。
+    """
+    if isinstance(html, BeautifulSoup):
+        return html
+
+    with timer("decode", page=page):
+        text = decode_html(html)
+    with timer("slice", page=page):
+        sliced = slice_html(text, regions, keep_title) if regions else None
+    with timer("soup_build", page=page):
+        return BeautifulSoup(sliced if sliced is not None else text, "lxml")
@@ -0,0 +1,96 @@
+import asyncio
+import io
+import json
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterator, Callable, Coroutine, Iterable
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+from src import config
+from src.metrics import timer
+
+T = TypeVar("T")
+
+
+async def stream_bulk(
+    ids: Iterable[str], load: Callable[[str], Coroutine[Any, Any, T]], window: int | None = None
+) -> AsyncIterator[tuple[str, T | Exception]]:
+    """IDごとの取得・パースを、同時に最大 window 件まで実行しながら入力と同じ順序で返す
+
+    先頭の結果が取り出されるまで次のIDの取得は始めないため、メモリ上に同時に存在するページ・パース結果は
+    入力の件数ではなく window で決まる。失敗したIDは例外をそのまま返す。
+
+    Args:
+        ids: 取得するIDの列
+        load: IDを受け取り、取得・パースした結果を返す非同期関数
+        window: 同時に実行する件数の上限。Noneの場合は config.BULK_WINDOW を使う
+
+    Yields:
+        tuple[str, T | Exception]: IDと、その結果または例外
+    """
+    window = max(window or config.BULK_WINDOW, 1)
+    pending: deque[tuple[str, asyncio.Task[T]]] = deque()
+
+    async def pop() -> tuple[str, T | Exception]:
+        id, task = pending.popleft()
+        try:
+            return id, await task
+        except Exception as e:
+            return id, e
+
+    try:
+        for id in ids:
+            pending.append((id, asyncio.create_task(load(id))))
+            if len(pending) >= window:
+                yield await pop()
+        while pending:
+            yield await pop()
+    finally:
+        # 途中で打ち切られた場合は実行中の取得を止め、終了を待つ
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+
+async def dump_json_array(
+    items: AsyncIterator[tuple[str, T | Exception]],
+    id_field: str,
+    tool: str,
+    raise_errors: bool = False,
+) -> str:
+    """stream_bulk の結果を、届いた順にJSON配列の文字列へ書き出す
+
+    パース結果は1件ずつシリアライズしてすぐに手放すため、全件のモデルを同時に保持しない。
+    途中で例外を送出した場合も items を閉じ、実行中の取得を止めてから返る。
+
+    Args:
+        items: stream_bulk の戻り値
+        id_field: 失敗した要素でIDを入れるキー名 (例: "race_id")
+        tool: メトリクスに記録するツール名
+        raise_errors: Trueの場合、失敗した要素があればその例外を送出する。
+            Falseの場合は {id_field: ID, "error": エラー内容} の要素にする
+    """
+    output = io.StringIO()
+    output.write("[")
+    first = True
+    try:
+        async for id, result in items:
+            if isinstance(result, Exception) and raise_errors:
+                raise result
+            with timer("serialize", tool=tool):
+                if not first:
+                    output.write(",")
+                if isinstance(result, BaseModel):
+                    output.write(result.model_dump_json())
+                elif isinstance(result, Exception):
+                    output.write(json.dumps({id_field: id, "error": str(result)}, ensure_ascii=False))
+                else:
+                    output.write(json.dumps(result, ensure_ascii=False))
+            first = False
+    finally:
+        # stream_bulk のような非同期ジェネレーターは、ここで閉じて実行中の取得を止める
+        if isinstance(items, AsyncGenerator):
+            await items.aclose()
+    output.write("]")
+    return output.getvalue()
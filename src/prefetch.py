@@ -0,0 +1,100 @@
+import asyncio
+import itertools
+from dataclasses import dataclass
+
+from src import config
+from src.clients import get_horse_profile_html, get_jockey_profile_html
+from src.metrics import registry
+from src.models import RaceShutuba
+from src.ratelimit import background_fetch
+
+
+@dataclass(frozen=True)
+class PrefetchJob:
+    race_id: str
+    kind: str  # "horse" または "jockey"
+    target_id: str
+
+
+class Prefetcher:
+    """出馬表の出走馬・騎手のページをバックグラウンドで先読みし、ページキャッシュに載せる
+
+    先読みのリクエストはレートリミッターに対してバックグラウンド扱いになり、
+    対話的なリクエストが実行中の間は待機する。
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._queue: asyncio.Queue[PrefetchJob] | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._pending: set[PrefetchJob] = set()
+        self._sequence = itertools.count()
+
+    def enqueue_shutuba(self, shutuba: RaceShutuba) -> int:
+        """出馬表の出走馬・騎手のページを先読みの対象に加える。追加した件数を返す"""
+        self._ensure_workers()
+        assert self._queue is not None
+
+        jobs = [PrefetchJob(shutuba.race_id, "horse", item.horse.horse_id) for item in shutuba.shutuba]
+        jobs += [PrefetchJob(shutuba.race_id, "jockey", item.jockey.jockey_id) for item in shutuba.shutuba]
+
+        added = 0
+        for job in jobs:
+            if job.target_id and job not in self._pending:
+                self._pending.add(job)
+                self._queue.put_nowait(job)
+                added += 1
+        registry.inc("keiba_prefetch_jobs_total", added, help="先読みに追加したページ数", result="queued")
+        return added
+
+    def cancel(self, race_id: str | None = None) -> int:
+        """待機中の先読みを取り消す。race_id を省略した場合はすべて取り消す。取り消した件数を返す"""
+        cancelled = [job for job in self._pending if race_id is None or job.race_id == race_id]
+        # キューからは取り出した時点で読み飛ばす
+        self._pending.difference_update(cancelled)
+        registry.inc("keiba_prefetch_jobs_total", len(cancelled), help="先読みに追加したページ数", result="cancelled")
+        return len(cancelled)
+
+    def pending(self) -> int:
+        """待機中の先読みの件数"""
+        return len(self._pending)
+
+    async def stop(self) -> None:
+        """ワーカーを停止する"""
+        self.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._queue = None
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"prefetch-{next(self._sequence)}"))
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        # このタスクからのリクエストはすべてバックグラウンド扱いにする
+        background_fetch.set(True)
+        while True:
+            job = await self._queue.get()
+            try:
+                if job not in self._pending:
+                    continue  # 取り消し済み
+                if job.kind == "horse":
+                    await get_horse_profile_html(job.target_id)
+                else:
+                    await get_jockey_profile_html(job.target_id)
+                registry.inc("keiba_prefetch_jobs_total", help="先読みに追加したページ数", result="fetched")
+            except Exception:
+                registry.inc("keiba_prefetch_jobs_total", help="先読みに追加したページ数", result="failed")
+            finally:
+                self._pending.discard(job)
+                self._queue.task_done()
+
+
+# プロセス内で共有する先読み器
+prefetcher = Prefetcher(workers=config.PREFETCH_WORKERS)
@@ -0,0 +1,81 @@
+import cProfile
+import functools
+import hashlib
+import itertools
+import json
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any, ParamSpec, TypeVar
+
+from src import config
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# cProfileは同時に1つしか有効にできないため、プロファイル中の呼び出しを排他する
+_profile_lock = threading.Lock()
+# 同一秒内のプロファイルでファイル名が衝突しないようにする連番
+_sequence = itertools.count()
+
+
+def profiled(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    """MCPツールの呼び出しをcProfileでプロファイルするデコレーター
+
+    環境変数 KEIBA_MCP_PROFILE_TOOLS に含まれるツール、またはキーワード引数 profile=True で
+    呼び出された場合のみプロファイルし、結果をpstats形式で KEIBA_MCP_PROFILE_DIR に書き出す。
+    出力された .prof ファイルは snakeviz などでフレームグラフとして確認できる。
+    プロファイル中は同じイベントループで並行して動く他の処理も記録される。
+    """
+    tool = func.__name__
+    always = tool in config.PROFILE_TOOLS or "*" in config.PROFILE_TOOLS
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        if not (always or kwargs.get("profile")):
+            return await func(*args, **kwargs)
+
+        # 他の呼び出しがプロファイル中の場合は、プロファイルせずに実行する
+        if not _profile_lock.acquire(blocking=False):
+            return await func(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        start = time.time()
+        try:
+            profiler.enable()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                _write_profile(profiler, tool, kwargs, start, time.time() - start)
+        finally:
+            _profile_lock.release()
+
+    return wrapper
+
+
+def _write_profile(
+    profiler: cProfile.Profile, tool: str, arguments: dict[str, Any], start: float, elapsed: float
+) -> None:
+    """プロファイル結果とその呼び出し情報を書き出し、古いプロファイルを削除する"""
+    profile_dir = Path(config.PROFILE_DIR)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+
+    arguments_json = json.dumps(arguments, ensure_ascii=False, sort_keys=True, default=str)
+    digest = hashlib.sha1(arguments_json.encode()).hexdigest()[:8]
+    stem = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(start))}-{next(_sequence):04d}_{tool}_{digest}"
+
+    profiler.dump_stats(profile_dir / f"{stem}.prof")
+    (profile_dir / f"{stem}.json").write_text(
+        json.dumps(
+            {"tool": tool, "arguments": json.loads(arguments_json), "started_at": start, "elapsed": elapsed},
+            ensure_ascii=False,
+        )
+    )
+
+    # ファイル名は開始時刻順に並ぶ
+    profiles = sorted(profile_dir.glob("*.prof"))
+    for path in profiles[: max(len(profiles) - config.PROFILE_MAX_FILES, 0)]:
+        path.unlink(missing_ok=True)
+        path.with_suffix(".json").unlink(missing_ok=True)
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+# 現在のタスクのリクエストがバックグラウンド(先読みなど)かどうか
+background_fetch: ContextVar[bool] = ContextVar("background_fetch", default=False)
+# バックグラウンドで始めた取得を、対話的なリクエストが待ち始めたときにセットするイベント
+fetch_promoted: ContextVar[asyncio.Event | None] = ContextVar("fetch_promoted", default=None)
+
+
+class PriorityRateLimiter:
+    """優先度付きのトークンバケット型レートリミッター
+
+    対話的なリクエストを優先し、バックグラウンドのリクエストは
+    対話的なリクエストが待機中・実行中でないときにだけトークンを取得する。
+    待っている間に fetch_promoted のイベントがセットされたバックグラウンドのリクエストは、対話的なリクエストとして扱う。
+    rate が0以下の場合は流量を制限せず、優先度の制御のみ行う。
+    """
+
+    # バックグラウンドのリクエストが空きを確認する間隔(秒)
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._interactive = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    @staticmethod
+    def _yields(background: bool) -> bool:
+        """対話的なリクエストに譲るかどうか。格上げされたバックグラウンドのリクエストは譲らない"""
+        promoted = fetch_promoted.get()
+        return background and (promoted is None or not promoted.is_set())
+
+    async def _take(self, background: bool) -> None:
+        """トークンを1つ取得する
+
+        待機中はロックを持たず、トークンを取る直前に優先度を確認する。
+        バックグラウンドのリクエストは、待っている間に対話的なリクエストが来た場合はそちらに譲る。
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            if self._interactive > 0 and self._yields(background):
+                await asyncio.sleep(self.POLL_INTERVAL)
+                continue
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    @asynccontextmanager
+    async def slot(self, background: bool | None = None) -> AsyncIterator[None]:
+        """リクエスト1件分の枠を確保する
+
+        Args:
+            background: Trueの場合は低優先度で待機する。Noneの場合は background_fetch の値を使う
+        """
+        if background is None:
+            background = background_fetch.get()
+
+        if self._yields(background):
+            while self._interactive > 0 and self._yields(background):
+                await asyncio.sleep(self.POLL_INTERVAL)
+            if self._yields(background):
+                await self._take(background=True)
+                yield
+                return
+
+        self._interactive += 1
+        try:
+            await self._take(background=False)
+            yield
+        finally:
+            self._interactive -= 1
@@ -0,0 +1,190 @@
+import bisect
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from src import config
+from src.models import HorseProfile, HorseProfilePicked, JockeyInfo, JockeyInfoPicked
+
+# 名前の比較で無視する文字 (空白・中黒・記号)
+_IGNORED_PATTERN = re.compile(r"[\s・･.\-_'’()（）]")
+# ひらがな (ぁ-ゖ) をカタカナに寄せるためのオフセット
+_HIRAGANA_TO_KATAKANA = {code: code + 0x60 for code in range(ord("ぁ"), ord("ゖ") + 1)}
+
+
+def normalize_name(name: str) -> str:
+    """名前を検索用に正規化する
+
+    全角・半角の英数字と半角カナを NFKC でそろえ、ひらがなをカタカナに、英字を小文字にする。
+    空白・中黒などの記号は取り除く。
+    """
+    name = unicodedata.normalize("NFKC", name).translate(_HIRAGANA_TO_KATAKANA).lower()
+    return _IGNORED_PATTERN.sub("", name)
+
+
+def _ngrams(key: str, n: int = 2) -> set[str]:
+    if len(key) <= n:
+        return {key}
+    return {key[i : i + n] for i in range(len(key) - n + 1)}
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    id: str
+    name: str
+    match: str  # "exact" / "prefix" / "fuzzy"
+    score: float
+
+
+class NameIndex:
+    """名前からIDを引くための索引
+
+    正規化した名前の完全一致・前方一致と、2文字単位のn-gramによるあいまい検索に対応する。
+    1つのIDに複数の名前 (出馬表の「浜中」とプロフィールの「浜中俊」など) を別名として登録でき、どの名前でも検索できる。
+    path を指定すると、新しく登録した (ID, 名前) を1行1件のJSONで追記し、次回の起動時に読み込む。
+    """
+
+    # あいまい検索で候補とする類似度 (Dice係数) の下限
+    FUZZY_THRESHOLD = 0.4
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._names: dict[str, list[str]] = {}  # ID -> 名前 (別名) のリスト
+        self._keys: dict[str, set[str]] = defaultdict(set)  # 正規化した名前 -> IDの集合
+        self._ngram_postings: dict[str, set[str]] = defaultdict(set)  # n-gram -> 正規化した名前の集合
+        self._sorted_keys: list[str] | None = None
+
+        if self.path is not None and self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._insert(entry["id"], entry["name"])
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._names
+
+    def name(self, id: str) -> str | None:
+        """登録済みの名前のうち、最も長いもの (省略されていない名前) を返す。未登録の場合はNone"""
+        names = self._names.get(id)
+        return max(names, key=len) if names else None
+
+    def aliases(self, id: str) -> list[str]:
+        """登録済みの名前を登録順にすべて返す"""
+        return list(self._names.get(id, ()))
+
+    def add(self, id: str, name: str) -> bool:
+        """IDと名前を登録する。新しい名前を登録した場合はTrueを返す"""
+        name = name.strip()
+        if not id or not name or not normalize_name(name):
+            return False
+        with self._lock:
+            if name in self._names.get(id, ()):
+                return False
+            self._insert(id, name)
+            if self.path is not None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({"id": id, "name": name}, ensure_ascii=False) + "\n")
+        return True
+
+    def search(self, query: str, limit: int = 10) -> list[SearchHit]:
+        """名前で検索する。完全一致・前方一致・あいまい一致の順に、最大 limit 件を返す"""
+        key = normalize_name(query)
+        if not key or limit <= 0:
+            return []
+
+        hits: list[SearchHit] = []
+        seen: set[str] = set()
+
+        def collect(matched_key: str, match: str, score: float) -> None:
+            for id in sorted(self._keys.get(matched_key, ())):
+                if id not in seen:
+                    seen.add(id)
+                    hits.append(SearchHit(id=id, name=max(self._names[id], key=len), match=match, score=score))
+
+        collect(key, "exact", 1.0)
+
+        sorted_keys = self._get_sorted_keys()
+        for position in range(bisect.bisect_left(sorted_keys, key), len(sorted_keys)):
+            candidate = sorted_keys[position]
+            if len(hits) >= limit or not candidate.startswith(key):
+                break
+            if candidate != key:
+                collect(candidate, "prefix", len(key) / len(candidate))
+
+        if len(hits) < limit:
+            query_grams = _ngrams(key)
+            shared: Counter[str] = Counter()
+            for gram in query_grams:
+                shared.update(self._ngram_postings.get(gram, ()))
+            scored = []
+            for candidate, count in shared.items():
+                score = 2 * count / (len(query_grams) + len(_ngrams(candidate)))
+                if score >= self.FUZZY_THRESHOLD:
+                    scored.append((score, candidate))
+            for score, candidate in sorted(scored, key=lambda item: (-item[0], item[1])):
+                if len(hits) >= limit:
+                    break
+                collect(candidate, "fuzzy", round(score, 3))
+
+        return hits[:limit]
+
+    def _insert(self, id: str, name: str) -> None:
+        names = self._names.setdefault(id, [])
+        if name in names:
+            return
+        key = normalize_name(name)
+        names.append(name)
+        self._keys[key].add(id)
+        for gram in _ngrams(key):
+            self._ngram_postings[gram].add(key)
+        self._sorted_keys = None
+
+    def _get_sorted_keys(self) -> list[str]:
+        sorted_keys = self._sorted_keys
+        if sorted_keys is None:
+            sorted_keys = self._sorted_keys = sorted(self._keys)
+        return sorted_keys
+
+
+_indexes: dict[str, NameIndex] = {}
+
+
+def get_name_index(kind: str) -> NameIndex:
+    """プロセス内で共有する名前の索引を取得する
+
+    Args:
+        kind: "horse" または "jockey"
+    """
+    if kind not in _indexes:
+        _indexes[kind] = NameIndex(os.path.join(config.DATA_DIR, "search", f"{kind}.jsonl"))
+    return _indexes[kind]
+
+
+def index_names(model: BaseModel) -> int:
+    """パース結果に含まれる馬・騎手の名前とIDをすべて索引に登録する。新たに登録した件数を返す"""
+    added = 0
+    if isinstance(model, (HorseProfile, HorseProfilePicked)):
+        added += get_name_index("horse").add(model.horse_id, model.horse_name)
+    elif isinstance(model, (JockeyInfo, JockeyInfoPicked)):
+        added += get_name_index("jockey").add(model.jockey_id, model.jockey_name)
+
+    for field_name in type(model).model_fields:
+        value = getattr(model, field_name)
+        if isinstance(value, BaseModel):
+            added += index_names(value)
+        elif isinstance(value, list):
+            added += sum(index_names(item) for item in value if isinstance(item, BaseModel))
+    return added
@@ -0,0 +1,407 @@
+"""馬の戦績の傾向 (距離・馬場の適性、近走の着順・着差、斤量・馬体重、道悪の得手不得手) が似た馬を探す
+
+戦績を固定長の特徴ベクトルにし、全馬のベクトルをNumPyの配列に持って総当たりで距離を計算する。
+馬情報を取得するたびに索引へ追記し、compact() で1つのファイルにまとめる。
+
+    python -m src.similar build     # 蓄積済みの馬情報 (KEIBA_MCP_DATA_DIR/horses) から索引を作り直す
+    python -m src.similar compact   # 追記分を索引のファイルにまとめる
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from src import config
+from src.models import HorseProfile, HorseRaceResultItem
+from src.store import get_horse_store
+
+_COURSE_PATTERN = re.compile(r"(芝|ダ|障)\D*?(\d{3,4})")
+_HORSE_WEIGHT_PATTERN = re.compile(r"^(\d{3})\(([+-]?\d+)\)$")
+# 道悪とみなす馬場状態
+OFF_GOING = ("稍重", "重", "不良")
+# 近走として扱うレース数
+RECENT_RACES = 5
+
+# 特徴量の名前と、標準化に使う中心・尺度
+# 尺度を固定しておくことで、馬を追加しても既存のベクトルを計算し直さずに済む
+FEATURES: dict[str, tuple[float, float]] = {
+    "turf_share": (0.5, 0.5),  # 芝のレースの割合
+    "dirt_share": (0.5, 0.5),  # ダートのレースの割合
+    "jump_share": (0.0, 0.5),  # 障害のレースの割合
+    "mean_distance": (1800.0, 400.0),  # 平均距離(m)
+    "best_distance": (1800.0, 400.0),  # 3着以内に入ったレースの平均距離(m)
+    "distance_spread": (200.0, 200.0),  # 距離の標準偏差(m)
+    "recent_rank": (6.0, 4.0),  # 近走の平均着順
+    "recent_relative_rank": (0.5, 0.3),  # 近走の着順を頭数で割った値 (0が1着、1が最下位)
+    "win_rate": (0.1, 0.2),  # 勝率
+    "top3_rate": (0.3, 0.3),  # 3着内率
+    "mean_margin": (1.0, 1.0),  # 勝ち馬との平均着差(秒)
+    "recent_margin": (1.0, 1.0),  # 近走の勝ち馬との平均着差(秒)
+    "impost_weight": (55.0, 2.0),  # 平均斤量(kg)
+    "horse_weight": (470.0, 30.0),  # 直近の馬体重(kg)
+    "weight_change": (0.0, 6.0),  # 近走の馬体重の増減の平均(kg)
+    "off_going_share": (0.25, 0.25),  # 道悪のレースの割合
+    "off_going_edge": (0.0, 0.3),  # 良馬場より道悪で着順 (頭数比) が良い度合い
+    "starts": (2.0, 1.0),  # 出走数 (log1p)
+}
+FEATURE_NAMES = list(FEATURES)
+_CENTERS = np.array([center for center, _ in FEATURES.values()], dtype=np.float32)
+_SCALES = np.array([scale for _, scale in FEATURES.values()], dtype=np.float32)
+DIMENSIONS = len(FEATURES)
+
+
+def _to_float(text: str) -> float:
+    try:
+        return float(text.strip())
+    except ValueError:
+        return math.nan
+
+
+def _nanmean(values: Iterable[float]) -> float:
+    values = [value for value in values if not math.isnan(value)]
+    return sum(values) / len(values) if values else math.nan
+
+
+@dataclass(frozen=True)
+class _Run:
+    """特徴量の計算に使う、着順の付いた1走分の値"""
+
+    rank: int
+    relative_rank: float
+    surface: str
+    distance: float
+    off_going: bool
+    margin: float
+    impost_weight: float
+    horse_weight: float
+    weight_change: float
+
+
+def form_features(history: list[HorseRaceResultItem]) -> dict[str, float] | None:
+    """戦績 (新しい順) から特徴量を計算する。着順の付いたレースが1つもない場合はNone
+
+    計算できない特徴量はNaNにする。
+    """
+    rows: list[_Run] = []
+    for item in history:
+        rank = item.rank.strip()
+        if not rank.isdigit():
+            # 取消・除外・中止などは傾向に含めない
+            continue
+        course = _COURSE_PATTERN.search(item.course)
+        field_size = _to_float(item.horse_number)
+        weight = _HORSE_WEIGHT_PATTERN.match(item.horse_weight.strip())
+        rows.append(
+            _Run(
+                rank=int(rank),
+                relative_rank=(int(rank) - 1) / (field_size - 1) if field_size > 1 else math.nan,
+                surface=course.group(1) if course else "",
+                distance=float(course.group(2)) if course else math.nan,
+                off_going=item.condition.strip() in OFF_GOING,
+                margin=min(max(_to_float(item.margin), -2.0), 5.0),
+                impost_weight=_to_float(item.impost_weight),
+                horse_weight=float(weight.group(1)) if weight else math.nan,
+                weight_change=float(weight.group(2)) if weight else math.nan,
+            )
+        )
+    if not rows:
+        return None
+
+    recent = rows[:RECENT_RACES]
+    starts = len(rows)
+    distances = [row.distance for row in rows if not math.isnan(row.distance)]
+    mean_distance = _nanmean(distances)
+    good = _nanmean(row.relative_rank for row in rows if not row.off_going)
+    off = _nanmean(row.relative_rank for row in rows if row.off_going)
+    return {
+        "turf_share": sum(row.surface == "芝" for row in rows) / starts,
+        "dirt_share": sum(row.surface == "ダ" for row in rows) / starts,
+        "jump_share": sum(row.surface == "障" for row in rows) / starts,
+        "mean_distance": mean_distance,
+        "best_distance": _nanmean(row.distance for row in rows if row.rank <= 3),
+        "distance_spread": (
+            math.sqrt(sum((distance - mean_distance) ** 2 for distance in distances) / len(distances))
+            if distances
+            else math.nan
+        ),
+        "recent_rank": sum(row.rank for row in recent) / len(recent),
+        "recent_relative_rank": _nanmean(row.relative_rank for row in recent),
+        "win_rate": sum(row.rank == 1 for row in rows) / starts,
+        "top3_rate": sum(row.rank <= 3 for row in rows) / starts,
+        "mean_margin": _nanmean(row.margin for row in rows),
+        "recent_margin": _nanmean(row.margin for row in recent),
+        "impost_weight": _nanmean(row.impost_weight for row in rows),
+        "horse_weight": next((row.horse_weight for row in rows if not math.isnan(row.horse_weight)), math.nan),
+        "weight_change": _nanmean(row.weight_change for row in recent),
+        "off_going_share": sum(row.off_going for row in rows) / starts,
+        "off_going_edge": good - off if not (math.isnan(good) or math.isnan(off)) else math.nan,
+        "starts": math.log1p(starts),
+    }
+
+
+def form_vector(history: list[HorseRaceResultItem]) -> np.ndarray | None:
+    """戦績を標準化した特徴ベクトルにする。計算できない特徴量は中心 (0) にする"""
+    features = form_features(history)
+    if features is None:
+        return None
+    raw = np.array([features[name] for name in FEATURE_NAMES], dtype=np.float32)
+    vector: np.ndarray = np.nan_to_num((raw - _CENTERS) / _SCALES, nan=0.0)
+    return vector
+
+
+def describe_vector(vector: np.ndarray) -> dict[str, float]:
+    """特徴ベクトルを元の単位の特徴量に戻す (計算できなかった特徴量は中心の値になる)"""
+    raw = vector * _SCALES + _CENTERS
+    return {name: round(float(value), 3) for name, value in zip(FEATURE_NAMES, raw)}
+
+
+class FormIndex:
+    """馬IDから特徴ベクトルを引き、似たベクトルの馬を探すための索引
+
+    ベクトルは (馬の数, DIMENSIONS) のfloat32の配列に持ち、検索では SEARCH_CHUNK 行ずつ
+    ユークリッド距離を計算して上位を残す。数十万頭でも1回の検索は数ミリ秒で終わる。
+
+    path を指定すると、{path}/index.npz に全件を、{path}/log.jsonl に以降の追加・更新を1行1件で保存し、
+    次回の起動時に読み込む。compact() で追記分を index.npz にまとめる。
+    他のプロセス (クローラーなど) の追加分は reload() で読み直す。get_form_index() は
+    SIMILAR_RELOAD_INTERVAL 秒ごとにファイルの変更を確認して読み直す。
+    """
+
+    SEARCH_CHUNK = 65536
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}  # 馬ID -> 行
+        self._vectors = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)  # 各行の二乗ノルム
+        self._signature: tuple[tuple[str, int, int], ...] = ()
+
+        if self.path is not None:
+            self._signature = self._files_signature()
+            self._read(self.path, include_log=True)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._rows
+
+    def vector(self, id: str) -> np.ndarray | None:
+        """登録済みの特徴ベクトルを返す。未登録の場合はNone"""
+        with self._lock:
+            row = self._rows.get(id)
+            return self._vectors[row].copy() if row is not None else None
+
+    def add(self, id: str, vector: np.ndarray) -> bool:
+        """特徴ベクトルを登録する。新たに登録・更新した場合はTrueを返す"""
+        vector = np.asarray(vector, dtype=np.float32)
+        if vector.shape != (DIMENSIONS,):
+            raise ValueError(f"Invalid vector shape: {vector.shape}")
+        with self._lock:
+            row = self._rows.get(id)
+            if row is not None and np.array_equal(self._vectors[row], vector):
+                return False
+            self._insert(id, vector)
+            if self.path is not None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                with (self.path / "log.jsonl").open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({"id": id, "vector": vector.tolist()}) + "\n")
+        return True
+
+    def search(self, vector: np.ndarray, limit: int = 10, exclude: Iterable[str] = ()) -> list[tuple[str, float]]:
+        """vector に近い順に、最大 limit 件の (馬ID, 距離) を返す。exclude の馬は除く"""
+        if limit <= 0:
+            return []
+        # 登録済みの馬の更新は行を書き換えるため、検索中はロックを持つ (数十万頭でも数ミリ秒で終わる)
+        with self._lock:
+            return self._search(np.asarray(vector, dtype=np.float32), limit, exclude)
+
+    def _search(self, query: np.ndarray, limit: int, exclude: Iterable[str]) -> list[tuple[str, float]]:
+        excluded = {self._rows[id] for id in exclude if id in self._rows}
+        count = len(self._ids)
+        vectors, norms, ids = self._vectors, self._norms, self._ids
+        if count == 0:
+            return []
+
+        query_norm = float(query @ query)
+        keep = limit + len(excluded)
+        candidates: list[np.ndarray] = []
+        candidate_distances: list[np.ndarray] = []
+        for start in range(0, count, self.SEARCH_CHUNK):
+            stop = min(start + self.SEARCH_CHUNK, count)
+            distances = norms[start:stop] - 2 * (vectors[start:stop] @ query) + query_norm
+            if stop - start > keep:
+                top = np.argpartition(distances, keep)[:keep]
+            else:
+                top = np.arange(stop - start)
+            candidates.append(top + start)
+            candidate_distances.append(distances[top])
+
+        rows = np.concatenate(candidates)
+        distances = np.concatenate(candidate_distances)
+        hits = []
+        for i in np.argsort(distances, kind="stable"):
+            if int(rows[i]) in excluded:
+                continue
+            hits.append((ids[int(rows[i])], math.sqrt(max(float(distances[i]), 0.0))))
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def compact(self) -> int:
+        """追記分を index.npz にまとめる。まとめた件数を返す
+
+        追記中のファイルを退避してから読み直すため、他のプロセスが追記していてもその内容は失われない。
+        """
+        if self.path is None:
+            raise Exception("path is not configured")
+        self.path.mkdir(parents=True, exist_ok=True)
+        log_path = self.path / "log.jsonl"
+        if log_path.exists():
+            os.replace(log_path, self.path / f"compacting-{time.time_ns()}.jsonl")
+
+        # このプロセスの追加分は退避したファイルに含まれるため、ファイルから読み直す
+        merged = FormIndex()
+        merged._read(self.path, include_log=False)
+        pending = sorted(self.path.glob("compacting-*.jsonl"))
+        for path in pending:
+            merged._replay(path)
+
+        tmp_path = self.path / f".tmp-{os.getpid()}.npz"
+        try:
+            with tmp_path.open("wb") as f:
+                np.savez(f, ids=np.array(merged._ids, dtype=str), vectors=merged._vectors[: len(merged)])
+            os.replace(tmp_path, self.path / "index.npz")
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        for path in pending:
+            path.unlink()
+        return len(merged)
+
+    def reload(self) -> bool:
+        """他のプロセスが追記・まとめたファイルを読み直す。ファイルが変わっていなければ何もせずFalseを返す"""
+        if self.path is None:
+            return False
+        signature = self._files_signature()
+        if signature == self._signature:
+            return False
+        loaded = FormIndex()
+        loaded._read(self.path, include_log=True)
+        with self._lock:
+            self._ids, self._rows = loaded._ids, loaded._rows
+            self._vectors, self._norms = loaded._vectors, loaded._norms
+            self._signature = signature
+        return True
+
+    def _files_signature(self) -> tuple[tuple[str, int, int], ...]:
+        """索引のファイルの名前・更新時刻・サイズ。変わっていれば他のプロセスが書き込んでいる"""
+        assert self.path is not None
+        signature = []
+        for path in sorted([self.path / "index.npz", self.path / "log.jsonl", *self.path.glob("compacting-*.jsonl")]):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            signature.append((path.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _read(self, path: Path, include_log: bool) -> None:
+        """index.npz と、まとめる前の追記分を読み込む"""
+        snapshot = path / "index.npz"
+        if snapshot.exists():
+            with np.load(snapshot, allow_pickle=False) as data:
+                ids = [str(id) for id in data["ids"]]
+                vectors = data["vectors"].astype(np.float32)
+            self._ids = ids
+            self._rows = {id: row for row, id in enumerate(ids)}
+            self._vectors = vectors
+            self._norms = np.einsum("ij,ij->i", vectors, vectors)
+        if include_log:
+            for log_path in [*sorted(path.glob("compacting-*.jsonl")), path / "log.jsonl"]:
+                self._replay(log_path)
+
+    def _replay(self, log_path: Path) -> None:
+        if not log_path.exists():
+            return
+        with log_path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._insert(entry["id"], np.array(entry["vector"], dtype=np.float32))
+
+    def _insert(self, id: str, vector: np.ndarray) -> None:
+        row = self._rows.get(id)
+        if row is None:
+            row = len(self._ids)
+            if row == len(self._vectors):
+                # 容量を倍にして、追加のたびに配列をコピーしないようにする
+                capacity = max(1024, 2 * len(self._vectors))
+                vectors = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+                vectors[:row] = self._vectors[:row]
+                norms = np.zeros(capacity, dtype=np.float32)
+                norms[:row] = self._norms[:row]
+                self._vectors, self._norms = vectors, norms
+            self._vectors[row] = vector
+            self._norms[row] = vector @ vector
+            # 検索がIDを引く前に行を書き終えておく
+            self._ids.append(id)
+            self._rows[id] = row
+        else:
+            self._vectors[row] = vector
+            self._norms[row] = vector @ vector
+
+
+_form_index: FormIndex | None = None
+_form_index_checked_at = 0.0
+
+
+def get_form_index() -> FormIndex:
+    """プロセス内で共有する戦績の索引を取得する
+
+    SIMILAR_RELOAD_INTERVAL 秒ごとに、他のプロセスの追加分やまとめ直した索引のファイルを読み直す。
+    """
+    global _form_index, _form_index_checked_at
+    now = time.monotonic()
+    if _form_index is None:
+        _form_index = FormIndex(os.path.join(config.DATA_DIR, "similar"))
+        _form_index_checked_at = now
+    elif config.SIMILAR_RELOAD_INTERVAL > 0 and now - _form_index_checked_at >= config.SIMILAR_RELOAD_INTERVAL:
+        _form_index_checked_at = now
+        _form_index.reload()
+    return _form_index
+
+
+def index_form(profile: HorseProfile) -> bool:
+    """馬情報の戦績を索引に登録する。新たに登録・更新した場合はTrueを返す"""
+    vector = form_vector(profile.race_result)
+    if vector is None or not profile.horse_id:
+        return False
+    return get_form_index().add(profile.horse_id, vector)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "compact"])
+    args = parser.parse_args()
+
+    index = get_form_index()
+    if args.command == "build":
+        added = sum(index_form(profile) for profile in get_horse_store().profiles())
+        print(f"added: {added}")
+    print(f"indexed: {index.compact()}")
+
+
+if __name__ == "__main__":
+    main()
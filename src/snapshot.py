@@ -0,0 +1,320 @@
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import typing
+import zlib
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+from typing import Any, Generic, TypeVar
+
+from pydantic import BaseModel
+
+M = TypeVar("M", bound=BaseModel)
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+# 世代番号を付けたデータ・索引ファイルの名前
+_GENERATION_FILE_PATTERN = re.compile(r"^(?:data|index)-(\d+)\.bin$")
+# 索引の1件分: ブロックのオフセット、ブロックの長さ、ブロック内の位置 (IDは先頭に固定長で置く)
+_ENTRY_STRUCT = struct.Struct("<QII")
+
+
+def _field_types(model_type: type[BaseModel]) -> dict[str, Any]:
+    """フィールド名と型の対応を、文字列で書かれた前方参照を解決して返す"""
+    hints = typing.get_type_hints(model_type)
+    return {name: hints[name] for name in model_type.model_fields}
+
+
+def model_schema(model_type: type[BaseModel]) -> dict[str, Any]:
+    """モデルのフィールドの並びを入れ子も含めて返す。スナップショットの互換性の判定に使う"""
+    schema: dict[str, Any] = {}
+    for name, annotation in _field_types(model_type).items():
+        nested = _model_type_of(annotation)
+        schema[name] = model_schema(nested) if nested is not None else None
+    return schema
+
+
+def encode_model(model: BaseModel) -> list[Any]:
+    """モデルをフィールド名を省いた入れ子のリストに変換する (フィールドの定義順に並べる)"""
+    return [_encode_value(getattr(model, name)) for name in type(model).model_fields]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return encode_model(value)
+    if isinstance(value, list):
+        return [_encode_value(item) for item in value]
+    return value
+
+
+def _model_type_of(annotation: Any) -> type[BaseModel] | None:
+    """フィールドの型に含まれるモデルの型を返す (list[X] や X | None も対象)"""
+    for candidate in (annotation, *typing.get_args(annotation)):
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+        if typing.get_origin(candidate) is list:
+            return _model_type_of(typing.get_args(candidate)[0])
+    return None
+
+
+_dict_builders: dict[type[BaseModel], Callable[[list[Any]], dict[str, Any]]] = {}
+
+
+def _dict_builder(model_type: type[BaseModel]) -> Callable[[list[Any]], dict[str, Any]]:
+    """encode_model の出力をフィールド名付きの辞書に戻す関数を返す"""
+    if model_type in _dict_builders:
+        return _dict_builders[model_type]
+
+    fields: list[tuple[str, Callable[[list[Any]], dict[str, Any]] | None, bool]] = []
+    for name, annotation in _field_types(model_type).items():
+        nested = _model_type_of(annotation)
+        is_list = any(typing.get_origin(arg) is list for arg in (annotation, *typing.get_args(annotation)))
+        fields.append((name, _dict_builder(nested) if nested is not None else None, is_list))
+
+    def build(data: list[Any]) -> dict[str, Any]:
+        return {
+            name: (
+                value
+                if nested is None or value is None
+                else [nested(item) for item in value]
+                if is_list
+                else nested(value)
+            )
+            for (name, nested, is_list), value in zip(fields, data)
+        }
+
+    _dict_builders[model_type] = build
+    return build
+
+
+def decoder_for(model_type: type[M]) -> Callable[[list[Any]], M]:
+    """encode_model の出力からモデルを復元する関数を返す
+
+    辞書に戻してから model_validate する (model_construct で入れ子のモデルを組み立てるより速い)。
+    """
+    build = _dict_builder(model_type)
+    return lambda data: model_type.model_validate(build(data))
+
+
+def write_snapshot(
+    path: str | Path, model_type: type[M], items: Iterable[tuple[str, M]], block_bytes: int = 8 * 1024
+) -> int:
+    """モデルのスナップショットを書き出す。書き出した件数を返す
+
+    ディレクトリ内に、ブロックごとにzlib圧縮したデータファイルと、IDの昇順に並べた固定長の索引ファイルを作る。
+    ファイル名には世代番号を付け、最後に meta.json を置き換えて切り替えるため、
+    書き出し中も古いスナップショットを読み続けられる。直前の世代のファイルは次に書き出すまで残すため、
+    切り替え前の meta.json を読んだ読み手もファイルを開ける。同じIDが複数ある場合は後のものが有効になる。
+
+    Args:
+        path: スナップショットのディレクトリ
+        model_type: 保存するモデルの型
+        items: (ID, モデル) の列
+        block_bytes: 1ブロックにまとめる圧縮前のサイズの目安(バイト)。
+            大きいほど圧縮率が上がり、小さいほど1件の取得で展開する量が減る
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    previous = _read_meta(path)
+    generation = previous["generation"] + 1 if previous is not None else 1
+    data_name = f"data-{generation}.bin"
+    index_name = f"index-{generation}.bin"
+
+    entries: dict[bytes, tuple[int, int, int]] = {}
+    with (path / data_name).open("wb") as data_file:
+        block: list[tuple[bytes, str]] = []
+        block_size = 0
+
+        def flush() -> None:
+            compressed = zlib.compress(("[" + ",".join(record for _, record in block) + "]").encode())
+            offset = data_file.tell()
+            data_file.write(compressed)
+            for position, (key, _) in enumerate(block):
+                entries[key] = (offset, len(compressed), position)
+            block.clear()
+
+        for id, model in items:
+            record = json.dumps(encode_model(model), ensure_ascii=False, separators=(",", ":"))
+            block.append((id.encode(), record))
+            block_size += len(record)
+            if block_size >= block_bytes:
+                flush()
+                block_size = 0
+        if block:
+            flush()
+        data_file.flush()
+        os.fsync(data_file.fileno())
+
+    id_width = max((len(key) for key in entries), default=1)
+    with (path / index_name).open("wb") as index_file:
+        for key in sorted(entries):
+            index_file.write(key.ljust(id_width, b"\0") + _ENTRY_STRUCT.pack(*entries[key]))
+        index_file.flush()
+        os.fsync(index_file.fileno())
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "generation": generation,
+        "model": model_type.__name__,
+        "schema": model_schema(model_type),
+        "count": len(entries),
+        "id_width": id_width,
+        "data": data_name,
+        "index": index_name,
+    }
+    # 同時に書き出す他のプロセスと一時ファイルが衝突しないよう、一意な名前で書いてから置き換える
+    fd, tmp_meta = tempfile.mkstemp(prefix=f".{META_FILE}.", suffix=".tmp", dir=path)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(meta, ensure_ascii=False))
+        os.replace(tmp_meta, path / META_FILE)
+    except BaseException:
+        Path(tmp_meta).unlink(missing_ok=True)
+        raise
+
+    # 直前の世代より古いファイルを削除する (開いている読み手はそのまま読み続けられる)
+    for file in path.iterdir():
+        match = _GENERATION_FILE_PATTERN.match(file.name)
+        if match and int(match.group(1)) < generation - 1:
+            file.unlink(missing_ok=True)
+    return len(entries)
+
+
+def _read_meta(path: Path) -> dict[str, Any] | None:
+    try:
+        meta: dict[str, Any] = json.loads((path / META_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    return meta
+
+
+class SnapshotReader(Generic[M]):
+    """write_snapshot で書き出したスナップショットを読む
+
+    索引はメモリマップして二分探索するため、開く際に全件を読み込まない。
+    1件の取得ではそのIDを含むブロックだけを展開し、直近に展開したブロックは保持しておく。
+    """
+
+    BLOCK_CACHE_SIZE = 16
+    # meta.json を読んでからファイルを開くまでに世代が進んで削除された場合に、読み直す回数
+    OPEN_RETRIES = 3
+
+    def __init__(self, path: str | Path, model_type: type[M]) -> None:
+        self.path = Path(path)
+        self.model_type = model_type
+        meta, data_file, index_file = self._open_files()
+
+        self.count: int = meta["count"]
+        self._id_width: int = meta["id_width"]
+        self._entry_size = self._id_width + _ENTRY_STRUCT.size
+        self._decode = decoder_for(model_type)
+        self._lock = threading.Lock()
+        self._blocks: OrderedDict[int, list[Any]] = OrderedDict()
+
+        self._data_file = data_file
+        self._data = self._mmap(self._data_file)
+        self._index_file = index_file
+        self._index = self._mmap(self._index_file)
+
+    def _open_files(self) -> tuple[dict[str, Any], typing.BinaryIO, typing.BinaryIO]:
+        """meta.json と、それが指すデータ・索引ファイルを開く"""
+        for attempt in range(self.OPEN_RETRIES + 1):
+            meta = _read_meta(self.path)
+            if meta is None:
+                raise Exception(f"Snapshot not found: {self.path}")
+            if meta["format"] != FORMAT_VERSION or meta["schema"] != model_schema(self.model_type):
+                raise Exception(f"Snapshot schema mismatch: {self.path} (rebuild the snapshot)")
+            try:
+                data_file = (self.path / meta["data"]).open("rb")
+            except FileNotFoundError:
+                if attempt == self.OPEN_RETRIES:
+                    raise
+                continue
+            try:
+                index_file = (self.path / meta["index"]).open("rb")
+            except FileNotFoundError:
+                data_file.close()
+                if attempt == self.OPEN_RETRIES:
+                    raise
+                continue
+            return meta, data_file, index_file
+        raise AssertionError("unreachable")
+
+    @staticmethod
+    def _mmap(file: typing.BinaryIO) -> mmap.mmap | bytes:
+        # 空のファイルはメモリマップできない
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, id: str) -> bool:
+        return self._find(id) is not None
+
+    def get(self, id: str) -> M | None:
+        """IDに対応するモデルを返す。含まれていない場合はNoneを返す"""
+        entry = self._find(id)
+        if entry is None:
+            return None
+        offset, length, position = entry
+        return self._decode(self._block(offset, length)[position])
+
+    def ids(self) -> Iterator[str]:
+        """含まれているIDを昇順に返す"""
+        for i in range(self.count):
+            start = i * self._entry_size
+            yield bytes(self._index[start : start + self._id_width]).rstrip(b"\0").decode()
+
+    def items(self) -> Iterator[tuple[str, M]]:
+        """(ID, モデル) をIDの昇順に返す"""
+        for id in self.ids():
+            model = self.get(id)
+            if model is not None:
+                yield id, model
+
+    def close(self) -> None:
+        for mapped in (self._data, self._index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        self._data_file.close()
+        self._index_file.close()
+
+    def _find(self, id: str) -> tuple[int, int, int] | None:
+        key = id.encode()
+        if len(key) > self._id_width:
+            return None
+        key = key.ljust(self._id_width, b"\0")
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = middle * self._entry_size
+            current = self._index[start : start + self._id_width]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return _ENTRY_STRUCT.unpack_from(self._index, start + self._id_width)
+        return None
+
+    def _block(self, offset: int, length: int) -> list[Any]:
+        with self._lock:
+            cached = self._blocks.get(offset)
+            if cached is not None:
+                self._blocks.move_to_end(offset)
+                return cached
+
+        block: list[Any] = json.loads(zlib.decompress(self._data[offset : offset + length]))
+        with self._lock:
+            self._blocks[offset] = block
+            while len(self._blocks) > self.BLOCK_CACHE_SIZE:
+                self._blocks.popitem(last=False)
+        return block
@@ -0,0 +1,258 @@
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from src.models import RaceResult
+
+# 着差の表記と馬身の対応
+MARGIN_LENGTHS = {
+    "": 0.0,  # 1着、または着差の表記なし
+    "同着": 0.0,
+    "ハナ": 0.05,
+    "アタマ": 0.1,
+    "クビ": 0.25,
+    "大": 10.0,  # 大差
+}
+_MARGIN_PATTERN = re.compile(r"^(?:(\d+)\.)?(?:(\d+)/(\d+))?$|^(\d+)$")
+_COURSE_PATTERN = re.compile(r"(芝|ダ|障)\D*?(\d{3,4})m")
+_CONDITION_PATTERN = re.compile(r"(不良|稍重|重|良)")
+
+# 基準タイムを開催条件ごとの中央値から求めるのに必要なレース数。足りない場合は距離からの回帰で補う
+MIN_PAR_RACES = 3
+# 馬場差を求めるのに必要な、同じ日・同じ競馬場・同じ馬場のレース数
+MIN_VARIANT_RACES = 2
+# 基準タイムより1%速いごとに加える指数
+POINTS_PER_PERCENT = 10.0
+
+
+def parse_margin(margin: str) -> float:
+    """着差の表記 ("クビ", "1.1/2", "3/4", "大" など) を馬身に変換する。解釈できない場合はNaN"""
+    margin = margin.strip()
+    if margin in MARGIN_LENGTHS:
+        return MARGIN_LENGTHS[margin]
+    match = _MARGIN_PATTERN.match(margin)
+    if match is None:
+        return float("nan")
+    whole, numerator, denominator, integer = match.groups()
+    if integer is not None:
+        return float(integer)
+    value = float(whole or 0)
+    if numerator is not None:
+        value += int(numerator) / int(denominator)
+    return value
+
+
+def times_to_seconds(times: np.ndarray) -> np.ndarray:
+    """走破タイムの文字列の配列 ("2:31.9", "59.8") を秒数の配列に変換する。解釈できない要素はNaN"""
+    times = np.char.strip(np.asarray(times, dtype=str))
+    parts = np.char.partition(times, ":")
+    has_minutes = parts[:, 1] == ":"
+    minutes = np.where(has_minutes, parts[:, 0], "0")
+    seconds = np.where(has_minutes, parts[:, 2], parts[:, 0])
+
+    valid = (
+        (np.char.str_len(seconds) > 0)
+        & np.char.isdigit(np.char.replace(seconds, ".", "", count=1))
+        & np.char.isdigit(minutes)
+    )
+    values = np.where(valid, minutes, "0").astype(float) * 60 + np.where(valid, seconds, "0").astype(float)
+    return np.where(valid, values, np.nan)
+
+
+def margins_to_lengths(margins: np.ndarray) -> np.ndarray:
+    """着差の文字列の配列を馬身の配列に変換する
+
+    表記の種類は少ないため、重複を除いた表記ごとに変換して配列全体に展開する。
+    """
+    margins = np.char.strip(np.asarray(margins, dtype=str))
+    if margins.size == 0:
+        return np.zeros(0)
+    uniques, inverse = np.unique(margins, return_inverse=True)
+    return np.array([parse_margin(margin) for margin in uniques])[inverse]
+
+
+def _map_unique(values: np.ndarray, convert: Callable[[str], Any]) -> np.ndarray:
+    """重複を除いた値ごとに変換し、配列全体に展開する"""
+    uniques, inverse = np.unique(values, return_inverse=True)
+    return np.array([convert(value) for value in uniques], dtype=object)[inverse]
+
+
+def _group_median(values: np.ndarray, groups: np.ndarray, group_count: int) -> tuple[np.ndarray, np.ndarray]:
+    """グループごとの中央値と件数を返す (NaNの要素は除く)"""
+    valid = ~np.isnan(values)
+    values, groups = values[valid], groups[valid]
+    counts = np.bincount(groups, minlength=group_count)
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    medians = np.full(group_count, np.nan)
+    has_values = counts > 0
+    low = starts[has_values] + (counts[has_values] - 1) // 2
+    high = starts[has_values] + counts[has_values] // 2
+    medians[has_values] = (sorted_values[low] + sorted_values[high]) / 2
+    return medians, counts
+
+
+@dataclass
+class SpeedFigures:
+    """出走馬ごとのスピード指数の計算結果。各配列は出走馬1頭につき1要素"""
+
+    race_id: np.ndarray
+    rank: np.ndarray  # 着順 (着外・取消などはNaN)
+    num: np.ndarray
+    horse_name: np.ndarray
+    horse_id: np.ndarray
+    surface: np.ndarray  # "芝" / "ダ" / "障"
+    distance: np.ndarray  # 距離(m)
+    condition: np.ndarray  # 馬場状態
+    time_seconds: np.ndarray  # 走破タイム(秒)
+    margin_lengths: np.ndarray  # 前の馬との着差(馬身)
+    beaten_lengths: np.ndarray  # 勝ち馬との着差(馬身)
+    par_time: np.ndarray  # 同じ馬場・距離・馬場状態の基準タイム(秒)
+    track_variant: np.ndarray  # 馬場差 (1000mあたりの秒数。正は時計がかかる馬場)
+    speed_figure: np.ndarray  # スピード指数 (基準タイムちょうどで100)
+
+    def rows(self) -> list[dict[str, object]]:
+        """JSON化できる形に変換する。NaNはNoneにする"""
+
+        def value(array: np.ndarray, i: int, digits: int = 2) -> object:
+            item = array[i]
+            if isinstance(item, (float, np.floating)):
+                return None if np.isnan(item) else round(float(item), digits)
+            if isinstance(item, np.integer):
+                return int(item)
+            return str(item)
+
+        return [
+            {
+                "race_id": value(self.race_id, i),
+                "rank": None if np.isnan(self.rank[i]) else int(self.rank[i]),
+                "num": value(self.num, i),
+                "horse_name": value(self.horse_name, i),
+                "horse_id": value(self.horse_id, i),
+                "surface": value(self.surface, i),
+                "distance": value(self.distance, i),
+                "condition": value(self.condition, i),
+                "time_seconds": value(self.time_seconds, i, 1),
+                "margin_lengths": value(self.margin_lengths, i),
+                "beaten_lengths": value(self.beaten_lengths, i),
+                "par_time": value(self.par_time, i),
+                "track_variant": value(self.track_variant, i, 3),
+                "speed_figure": value(self.speed_figure, i, 1),
+            }
+            for i in range(len(self.race_id))
+        ]
+
+
+def compute_speed_figures(results: list[RaceResult]) -> SpeedFigures:
+    """レース結果の一括データからスピード指数を計算する
+
+    1. 走破タイムを秒に、着差を馬身に変換し、勝ち馬との着差を累積で求める
+    2. 馬場 (芝/ダート/障害)・距離・馬場状態ごとに、勝ち時計の中央値を基準タイムとする。
+       レース数が MIN_PAR_RACES に満たない条件は、馬場ごとの距離と勝ち時計の回帰直線で補う
+    3. 同じ日・同じ競馬場・同じ馬場のレースについて、勝ち時計と基準タイムの差の平均 (1000mあたり) を馬場差とする
+    4. 馬場差で補正したタイムが基準タイムより1%速いごとに POINTS_PER_PERCENT を加え、基準タイムちょうどを100とする
+
+    Args:
+        results: レース結果のリスト
+
+    Returns:
+        SpeedFigures: 出走馬ごとの計算結果
+    """
+    # 出走馬のいないレースは除く (以降、各レースに1頭以上いることを前提にする)
+    results = [result for result in results if result.results]
+    if not results:
+        return SpeedFigures(**{name: np.zeros(0) for name in SpeedFigures.__dataclass_fields__})
+
+    # レース単位の情報 (レース数は出走馬数より十分少ない)
+    race_count = len(results)
+    race_course = np.array([result.course for result in results], dtype=str)
+    race_condition = np.array([result.condition for result in results], dtype=str)
+    race_day = np.array([f"{result.date}|{result.place}" for result in results], dtype=str)
+
+    courses = _map_unique(race_course, lambda course: _COURSE_PATTERN.search(course))
+    race_surface = np.array([match.group(1) if match else "" for match in courses], dtype=str)
+    race_distance = np.array([float(match.group(2)) if match else np.nan for match in courses])
+    race_condition = _map_unique(
+        race_condition, lambda condition: match.group(1) if (match := _CONDITION_PATTERN.search(condition)) else ""
+    ).astype(str)
+
+    # 出走馬単位の配列
+    items = [item for result in results for item in result.results]
+    sizes = np.array([len(result.results) for result in results], dtype=int)
+    race_index = np.repeat(np.arange(race_count), sizes)
+    race_id = np.repeat(np.array([result.race_id for result in results], dtype=str), sizes)
+    rank_text = np.char.strip(np.array([item.rank for item in items], dtype=str))
+    rank = np.where(np.char.isdigit(rank_text), rank_text, "nan").astype(float)
+    time_seconds = times_to_seconds(np.array([item.time for item in items], dtype=str))
+    margin_lengths = margins_to_lengths(np.array([item.margin for item in items], dtype=str))
+
+    # 勝ち馬との着差: レースごとに着順に並べて累積する (着外・取消などは除く)
+    order = np.lexsort((rank, race_index))
+    race_starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    sorted_margin = np.where(np.isnan(rank[order]) | np.isnan(margin_lengths[order]), 0.0, margin_lengths[order])
+    sorted_margin[race_starts] = 0.0
+    cumulative = np.cumsum(sorted_margin)
+    cumulative -= np.repeat(cumulative[race_starts], sizes)
+    beaten_lengths = np.empty_like(cumulative)
+    beaten_lengths[order] = cumulative
+    beaten_lengths[np.isnan(rank)] = np.nan
+
+    # 勝ち時計
+    winner_time = np.full(race_count, np.nan)
+    winners = rank == 1
+    winner_time[race_index[winners]] = time_seconds[winners]
+
+    # 基準タイム: 馬場・距離・馬場状態ごとの勝ち時計の中央値
+    race_key = np.char.add(np.char.add(race_surface, "|"), np.char.add(race_distance.astype(str), "|"))
+    race_key = np.char.add(race_key, race_condition)
+    keys, key_index = np.unique(race_key, return_inverse=True)
+    key_median, key_count = _group_median(winner_time, key_index, len(keys))
+    race_par = key_median[key_index]
+
+    # レース数が足りない条件は、馬場ごとの距離と勝ち時計の回帰直線で補う
+    sparse = key_count[key_index] < MIN_PAR_RACES
+    for surface in np.unique(race_surface[sparse]):
+        fit_mask = (race_surface == surface) & ~np.isnan(winner_time) & ~np.isnan(race_distance)
+        if len(np.unique(race_distance[fit_mask])) < 2:
+            continue
+        slope, intercept = np.polyfit(race_distance[fit_mask], winner_time[fit_mask], 1)
+        target = sparse & (race_surface == surface)
+        race_par[target] = slope * race_distance[target] + intercept
+
+    # 馬場差: 同じ日・同じ競馬場・同じ馬場の勝ち時計と基準タイムの差の平均 (1000mあたりの秒数)
+    race_deviation = (winner_time - race_par) / race_distance * 1000
+    day_key = np.char.add(np.char.add(race_day, "|"), race_surface)
+    days, day_index = np.unique(day_key, return_inverse=True)
+    valid = ~np.isnan(race_deviation)
+    day_sum = np.bincount(day_index[valid], weights=race_deviation[valid], minlength=len(days))
+    day_count = np.bincount(day_index[valid], minlength=len(days))
+    day_variant = np.divide(day_sum, day_count, out=np.zeros(len(days)), where=day_count >= MIN_VARIANT_RACES)
+    race_variant = day_variant[day_index]
+
+    # スピード指数
+    par_time = race_par[race_index]
+    track_variant = race_variant[race_index]
+    adjusted_time = time_seconds - track_variant * race_distance[race_index] / 1000
+    speed_figure = 100 + (par_time - adjusted_time) / par_time * 100 * POINTS_PER_PERCENT
+
+    return SpeedFigures(
+        race_id=race_id,
+        rank=rank,
+        num=np.array([item.num for item in items], dtype=str),
+        horse_name=np.array([item.horse.horse_name for item in items], dtype=str),
+        horse_id=np.array([item.horse.horse_id for item in items], dtype=str),
+        surface=race_surface[race_index],
+        distance=race_distance[race_index],
+        condition=race_condition[race_index],
+        time_seconds=time_seconds,
+        margin_lengths=margin_lengths,
+        beaten_lengths=beaten_lengths,
+        par_time=par_time,
+        track_variant=track_variant,
+        speed_figure=speed_figure,
+    )
@@ -0,0 +1,199 @@
+import json
+import os
+import tempfile
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from src import config
+from src.models import HorseProfile, JockeyInfo
+from src.snapshot import META_FILE, SnapshotReader, write_snapshot
+
+
+def _replace_file(path: Path, content: str) -> None:
+    """一時ファイル経由でファイルを置き換える。読み込み中の他のプロセスが書きかけの内容を読むことはない"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class HorseStore:
+    """馬情報をJSONファイルとして蓄積するストア
+
+    馬1頭につき1ファイル ({path}/{horse_id}.json) を保存する。
+    書き込みは一時ファイル経由で置き換えるため、複数のプロセスから読み書きしても壊れない。
+
+    snapshot_path を指定すると、compact() で全件をスナップショットにまとめ、
+    JSONファイルがない馬はスナップショットから読む。
+    """
+
+    def __init__(self, path: str, snapshot_path: str | None = None) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self._snapshot: SnapshotReader[HorseProfile] | None = None
+        self._snapshot_mtime = 0.0
+
+    def get(self, horse_id: str) -> HorseProfile | None:
+        """保存済みの馬情報を取得する。未登録の場合はNoneを返す"""
+        try:
+            return HorseProfile.model_validate_json(self._path(horse_id).read_bytes())
+        except FileNotFoundError:
+            snapshot = self._get_snapshot()
+            return snapshot.get(horse_id) if snapshot is not None else None
+
+    def put(self, profile: HorseProfile) -> None:
+        """馬情報を保存する"""
+        _replace_file(self._path(profile.horse_id), profile.model_dump_json())
+
+    def __contains__(self, horse_id: str) -> bool:
+        if self._path(horse_id).exists():
+            return True
+        snapshot = self._get_snapshot()
+        return snapshot is not None and horse_id in snapshot
+
+    def profiles(self) -> Iterator[HorseProfile]:
+        """保存済みの馬情報をすべて返す (JSONファイルのものを優先する)"""
+        from_files = set()
+        for path in self.path.glob("*.json"):
+            try:
+                profile = HorseProfile.model_validate_json(path.read_bytes())
+            except FileNotFoundError:
+                # 列挙した後に compact() で削除された
+                continue
+            from_files.add(path.stem)
+            yield profile
+        snapshot = self._get_snapshot()
+        if snapshot is not None:
+            yield from (profile for horse_id, profile in snapshot.items() if horse_id not in from_files)
+
+    def compact(self) -> int:
+        """JSONファイルとスナップショットの全件を新しいスナップショットにまとめ、取り込んだJSONファイルを削除する
+
+        まとめている間に更新されたJSONファイルは削除せずに残す。スナップショットに含めた件数を返す。
+        """
+        if self.snapshot_path is None:
+            raise Exception("snapshot_path is not configured")
+
+        files = {path: path.stat().st_mtime for path in self.path.glob("*.json")}
+        snapshot = self._get_snapshot()
+
+        def items() -> Iterator[tuple[str, HorseProfile]]:
+            from_files = {path.stem for path in files}
+            if snapshot is not None:
+                yield from ((horse_id, profile) for horse_id, profile in snapshot.items() if horse_id not in from_files)
+            for path in files:
+                yield path.stem, HorseProfile.model_validate_json(path.read_bytes())
+
+        count = write_snapshot(self.snapshot_path, HorseProfile, items())
+        for path, mtime in files.items():
+            try:
+                if path.stat().st_mtime == mtime:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+        return count
+
+    def _get_snapshot(self) -> SnapshotReader[HorseProfile] | None:
+        """スナップショットを開く。他のプロセスが書き直していれば開き直す"""
+        if self.snapshot_path is None:
+            return None
+        try:
+            mtime = (self.snapshot_path / META_FILE).stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if self._snapshot is None or mtime != self._snapshot_mtime:
+            if self._snapshot is not None:
+                self._snapshot.close()
+            self._snapshot = SnapshotReader(self.snapshot_path, HorseProfile)
+            self._snapshot_mtime = mtime
+        return self._snapshot
+
+    def _path(self, horse_id: str) -> Path:
+        if not horse_id.isalnum():
+            raise ValueError(f"Invalid horse_id: {horse_id}")
+        return self.path / f"{horse_id}.json"
+
+
+_horse_store: HorseStore | None = None
+
+
+def get_horse_store() -> HorseStore:
+    """プロセス内で共有する馬情報ストアを取得する"""
+    global _horse_store
+    if _horse_store is None:
+        _horse_store = HorseStore(
+            os.path.join(config.DATA_DIR, "horses"),
+            snapshot_path=os.path.join(config.DATA_DIR, "snapshots", "horses"),
+        )
+    return _horse_store
+
+
+@dataclass(frozen=True)
+class StoredJockey:
+    jockey: JockeyInfo
+    updated_at: float  # 最後に保存した時刻 (UNIX時刻)
+    profile_updated_at: float  # 騎手のページから取得した時刻 (UNIX時刻。0は未取得)
+
+
+class JockeyStore:
+    """騎手情報をJSONファイルとして蓄積するストア
+
+    騎手1人につき1ファイル ({path}/{jockey_id}.json) を保存する。
+    リーディングから取り込んだ本年の成績と、騎手のページからしか得られない通算成績などを1つにまとめて持ち、
+    それぞれを最後に更新した時刻も保存する。
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get(self, jockey_id: str) -> StoredJockey | None:
+        """保存済みの騎手情報を取得する。未登録の場合はNoneを返す"""
+        try:
+            entry = json.loads(self._path(jockey_id).read_bytes())
+        except FileNotFoundError:
+            return None
+        return StoredJockey(
+            jockey=JockeyInfo.model_validate(entry["jockey"]),
+            updated_at=entry["updated_at"],
+            profile_updated_at=entry["profile_updated_at"],
+        )
+
+    def put(self, jockey: JockeyInfo, from_profile: bool) -> None:
+        """騎手情報を保存する
+
+        Args:
+            jockey: 騎手情報
+            from_profile: 騎手のページから取得した情報の場合はTrue。リーディングから取り込んだ場合はFalse
+        """
+        now = time.time()
+        if from_profile:
+            profile_updated_at = now
+        else:
+            stored = self.get(jockey.jockey_id)
+            profile_updated_at = stored.profile_updated_at if stored is not None else 0.0
+        entry = {"updated_at": now, "profile_updated_at": profile_updated_at, "jockey": jockey.model_dump()}
+        _replace_file(self._path(jockey.jockey_id), json.dumps(entry, ensure_ascii=False))
+
+    def _path(self, jockey_id: str) -> Path:
+        if not jockey_id.isdigit():
+            raise ValueError(f"Invalid jockey_id: {jockey_id}")
+        return self.path / f"{jockey_id}.json"
+
+
+_jockey_store: JockeyStore | None = None
+
+
+def get_jockey_store() -> JockeyStore:
+    """プロセス内で共有する騎手情報ストアを取得する"""
+    global _jockey_store
+    if _jockey_store is None:
+        _jockey_store = JockeyStore(os.path.join(config.DATA_DIR, "jockeys"))
+    return _jockey_store
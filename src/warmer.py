@@ -0,0 +1,263 @@
+"""当日のレースのページを、アクセスが集中する前にキャッシュへ先読みする
+
+アクセスの少ない時間帯 (KEIBA_MCP_WARM_OFF_PEAK_HOURS) に当日と翌日 (KEIBA_MCP_WARM_LOOKAHEAD_DAYS) の全レースの
+出馬表と、出走馬・騎手のページを取得し、発走が近づいたレース (KEIBA_MCP_WARM_REFRESH_WINDOW) は
+オッズ・馬体重の入った出馬表を一定間隔で取得し直す。
+サーバーとは別のプロセスで動かし、KEIBA_MCP_CACHE_DIR のディスクキャッシュを共有する。
+
+    KEIBA_MCP_CACHE_DIR=/data/cache python -m src.warmer
+    KEIBA_MCP_CACHE_DIR=/data/cache python -m src.warmer --once   # 時間帯にかかわらず1回だけ先読みする
+"""
+
+import argparse
+import asyncio
+import re
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from src import config
+from src.clients import (
+    close_http_client,
+    get_horse_profile_html,
+    get_jockey_profile_html,
+    get_race_list_html,
+    get_race_shutuba_static_html,
+    horse_profile_url,
+    jockey_profile_url,
+    page_cache,
+)
+from src.executor import run_parser
+from src.loaders import JST, load_shutubas
+from src.metrics import registry
+from src.models import RaceShutuba
+from src.parse.parse_race_list import parse_race_list
+from src.parse.parse_shutuba import parse_shutuba
+from src.pipeline import stream_bulk
+from src.ratelimit import PriorityRateLimiter, background_fetch
+
+_POST_TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{2})")
+
+
+def parse_hours(spec: str) -> tuple[int, int]:
+    """「開始時-終了時」の形式の時間帯を (開始時, 終了時) にする。"22-6" のように日をまたいでもよい"""
+    match = re.match(r"^\s*(\d{1,2})\s*-\s*(\d{1,2})\s*$", spec)
+    if match is None:
+        raise ValueError(f"Invalid hours: {spec}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def in_hours(hour: int, hours: tuple[int, int]) -> bool:
+    start, end = hours
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def post_time(shutuba: RaceShutuba, race_date: date) -> datetime | None:
+    """出馬表の発走時刻 ("15:40" など) を日時にする。読み取れない場合はNone"""
+    match = _POST_TIME_PATTERN.search(shutuba.time)
+    if match is None:
+        return None
+    return datetime(
+        race_date.year, race_date.month, race_date.day, int(match.group(1)), int(match.group(2)), tzinfo=JST
+    )
+
+
+class RequestBudget:
+    """先読みで送るリクエスト数の残り"""
+
+    def __init__(self, limit: int) -> None:
+        self.remaining = limit
+
+    def take(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+@dataclass
+class WarmRace:
+    race_id: str
+    race_day: date
+    post_at: datetime | None = None
+    refreshed_at: datetime | None = None
+    horse_ids: list[str] = field(default_factory=list)
+    jockey_ids: list[str] = field(default_factory=list)
+
+
+class CacheWarmer:
+    """当日のレースのページをキャッシュに先読みする
+
+    日付が変わると当日から lookahead_days 日先までのレース一覧と出馬表を取得して発走時刻を調べ
+    (前日に調べた日は取得し直さない)、オフピークの時間帯に出走馬・騎手のページを先読みする
+    (キャッシュに残っているページは取得しない)。発走の refresh_window 秒前から発走までは、
+    refresh_interval 秒ごとにオッズ・馬体重を含む出馬表を取得し直す。一度にレンダリングするのは
+    発走が近い順に max_renders レースまで。すべてのリクエストは1日の予算とレート制限の範囲で送る。
+    """
+
+    def __init__(
+        self,
+        off_peak_hours: tuple[int, int] | None = None,
+        budget: int | None = None,
+        rate: float | None = None,
+        refresh_window: float | None = None,
+        refresh_interval: float | None = None,
+        max_renders: int | None = None,
+        lookahead_days: int | None = None,
+    ) -> None:
+        self.off_peak_hours = off_peak_hours or parse_hours(config.WARM_OFF_PEAK_HOURS)
+        self.daily_budget = budget if budget is not None else config.WARM_BUDGET
+        window = refresh_window if refresh_window is not None else config.WARM_REFRESH_WINDOW
+        interval = refresh_interval if refresh_interval is not None else config.WARM_REFRESH_INTERVAL
+        self.refresh_window = timedelta(seconds=window)
+        self.refresh_interval = timedelta(seconds=interval)
+        self.max_renders = max(max_renders if max_renders is not None else config.WARM_MAX_RENDERS, 1)
+        self.lookahead_days = max(lookahead_days if lookahead_days is not None else config.WARM_LOOKAHEAD_DAYS, 0)
+
+        self.races: dict[str, WarmRace] = {}
+        self.budget = RequestBudget(self.daily_budget)
+        self._day: date | None = None
+        self._discovered: set[date] = set()
+        self._warmed = False
+        self._limiter = PriorityRateLimiter(rate if rate is not None else config.WARM_RATE, 1)
+
+    async def run_once(self, now: datetime, force_warm: bool = False) -> Counter[str]:
+        """その時刻にやるべき先読みを実行する。取得したページ数などを返す"""
+        counts: Counter[str] = Counter()
+        today = now.date()
+        if self._day != today:
+            # 前日に先読みした翌日以降のレースは引き継ぐ
+            self.races = {race_id: race for race_id, race in self.races.items() if race.race_day >= today}
+            self._discovered = {day for day in self._discovered if day >= today}
+            self.budget = RequestBudget(self.daily_budget)
+            self._warmed = False
+            for offset in range(self.lookahead_days + 1):
+                race_day = today + timedelta(days=offset)
+                if race_day not in self._discovered:
+                    counts["shutuba"] += await self.discover(race_day)
+                    self._discovered.add(race_day)
+            self._day = today
+        if not self._warmed and (force_warm or in_hours(now.hour, self.off_peak_hours)):
+            counts += await self.warm_profiles()
+            self._warmed = True
+        counts["refreshed"] += await self.refresh(now)
+
+        for kind, count in counts.items():
+            registry.inc("keiba_warm_pages_total", count, help="キャッシュに先読みしたページ数", result=kind)
+        return counts
+
+    async def run(self, tick: float = 30.0) -> None:
+        """tick 秒ごとに run_once を実行し続ける"""
+        # 対話的なリクエストと同じプロセスで動かす場合も、先読みは後回しにさせる
+        background_fetch.set(True)
+        while True:
+            try:
+                await self.run_once(datetime.now(JST))
+            except Exception:
+                registry.inc("keiba_warm_errors_total", help="キャッシュの先読みの失敗回数")
+            await asyncio.sleep(tick)
+
+    async def discover(self, race_day: date) -> int:
+        """その日のレース一覧と各レースの出馬表を取得し、発走時刻と出走馬・騎手を調べる。取得した出馬表の数を返す"""
+        html = await self._request(get_race_list_html, race_day.strftime("%Y%m%d"))
+        race_ids = parse_race_list(html) if html is not None else []
+        for race_id in race_ids:
+            self.races[race_id] = WarmRace(race_id, race_day)
+
+        async def load(race_id: str) -> RaceShutuba | None:
+            html = await self._request(get_race_shutuba_static_html, race_id)
+            return await run_parser(parse_shutuba, html) if html is not None else None
+
+        found = 0
+        async for race_id, shutuba in stream_bulk(race_ids, load, window=4):
+            if isinstance(shutuba, RaceShutuba):
+                found += 1
+                race = self.races[race_id]
+                race.post_at = post_time(shutuba, race_day)
+                race.horse_ids = [item.horse.horse_id for item in shutuba.shutuba if item.horse.horse_id]
+                race.jockey_ids = [item.jockey.jockey_id for item in shutuba.shutuba if item.jockey.jockey_id]
+        return found
+
+    async def warm_profiles(self) -> Counter[str]:
+        """調べたレース (当日と翌日以降) の出走馬・騎手のページを先読みする"""
+        races = self.races.values()
+        pages: dict[str, tuple[Callable[[str], Awaitable[bytes]], str]] = {
+            horse_profile_url(id): (get_horse_profile_html, id) for race in races for id in race.horse_ids
+        }
+        pages |= {jockey_profile_url(id): (get_jockey_profile_html, id) for race in races for id in race.jockey_ids}
+
+        async def fetch(url: str) -> bool:
+            get, id = pages[url]
+            return await self._request(get, id) is not None
+
+        counts: Counter[str] = Counter()
+        # キャッシュに残っているページは取得しない
+        urls = [url for url in pages if page_cache.get(url, ttl=config.PROFILE_CACHE_TTL) is None]
+        counts["cached"] = len(pages) - len(urls)
+        async for _, result in stream_bulk(urls, fetch, window=4):
+            counts["profile" if result is True else "over_budget" if result is False else "failed"] += 1
+        return counts
+
+    async def refresh(self, now: datetime) -> int:
+        """発走が近いレースの出馬表 (オッズ・馬体重を含む) を取得し直す。取得し直したレース数を返す"""
+        due = [
+            race
+            for race in self.races.values()
+            if race.post_at is not None
+            and race.post_at - self.refresh_window <= now <= race.post_at
+            and (race.refreshed_at is None or now - race.refreshed_at >= self.refresh_interval)
+        ]
+        # 同時にレンダリングするのは発走が近い順に max_renders レースまで。残りは次の確認で取得する
+        races: list[WarmRace] = []
+        for race in sorted(due, key=lambda race: (race.post_at or now, race.race_id))[: self.max_renders]:
+            # 1レースにつき1リクエストとして、予算とレート制限を消費する
+            if not self.budget.take():
+                break
+            async with self._limiter.slot(background=False):
+                races.append(race)
+        if not races:
+            return 0
+
+        shutubas = await load_shutubas([race.race_id for race in races], include_odds=True)
+        refreshed = 0
+        for race, shutuba in zip(races, shutubas):
+            race.refreshed_at = now
+            if isinstance(shutuba, RaceShutuba):
+                # 発走時刻が変更されることがある
+                race.post_at = post_time(shutuba, race.race_day) or race.post_at
+                refreshed += 1
+        return refreshed
+
+    async def _request(self, get: Callable[[str], Awaitable[bytes]], id: str) -> bytes | None:
+        """予算の範囲内で、先読みのレート制限をかけてページを取得する。予算を使い切っていればNone"""
+        if not self.budget.take():
+            return None
+        async with self._limiter.slot(background=False):
+            return await get(id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="時間帯にかかわらず当日分を1回だけ先読みして終了する")
+    parser.add_argument("--tick", type=float, default=30.0, help="先読みが必要か確認する間隔(秒)")
+    args = parser.parse_args()
+
+    if not config.CACHE_DIR:
+        parser.error("サーバーとキャッシュを共有するため、KEIBA_MCP_CACHE_DIR を指定してください")
+
+    async def run() -> None:
+        warmer = CacheWarmer()
+        try:
+            if args.once:
+                print(dict(await warmer.run_once(datetime.now(JST), force_warm=True)))
+            else:
+                await warmer.run(args.tick)
+        finally:
+            await close_http_client()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
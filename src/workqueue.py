@@ -0,0 +1,346 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from src import config
+
+# ジョブの種類 (取得するページ)
+JOB_KINDS = ("race", "horse", "jockey")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending / leased / done / failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    token TEXT,
+    lease_until REAL,
+    available_at REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at);
+CREATE TABLE IF NOT EXISTS results (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+"""
+
+
+@dataclass(frozen=True)
+class Job:
+    kind: str
+    id: str
+    token: str  # リースを取得したワーカーだけが完了・失敗を報告できるようにするための値
+    attempts: int
+
+
+class WorkQueue:
+    """クロールのジョブを共有するキュー (1台のホスト内の複数プロセスで共有する)
+
+    ジョブは (種類, ID) で一意になり、同じIDを何度追加しても1回しか取得されない。
+    ワーカーは lease でジョブを借り、結果を complete で書き込む。
+    リースの期限までに完了・失敗が報告されないジョブ (ワーカーが落ちた場合など) は、別のワーカーが借り直す。
+    失敗したジョブは max_attempts 回まで、間隔を空けながら再試行する。
+
+    結果は同じデータベースの results テーブルに保存する。
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        lease_seconds: float | None = None,
+        max_attempts: int | None = None,
+        retry_delay: float = 30.0,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds if lease_seconds is not None else config.QUEUE_LEASE_SECONDS
+        self.max_attempts = max_attempts if max_attempts is not None else config.QUEUE_MAX_ATTEMPTS
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        # 複数のプロセスから書き込むため、WALモードで開き、ロック待ちはタイムアウトまで待つ
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, kind: str, ids: list[str], force: bool = False) -> int:
+        """ジョブを追加する。新たに追加した件数を返す
+
+        Args:
+            kind: ジョブの種類 ("race" / "horse" / "jockey")
+            ids: 取得するIDのリスト
+            force: Trueの場合、完了・失敗済みのジョブも取得し直す
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = time.time()
+        rows = [(kind, id, now) for id in dict.fromkeys(id.strip() for id in ids) if id]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO jobs (kind, id, updated_at) VALUES (?, ?, ?)", rows)
+            if force:
+                conn.executemany(
+                    "UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0, error = NULL, updated_at = ?"
+                    " WHERE kind = ? AND id = ? AND status IN ('done', 'failed')",
+                    [(now, kind, id) for kind, id, _ in rows],
+                )
+            return conn.total_changes - before
+
+    def lease(self, limit: int = 1) -> list[Job]:
+        """実行可能なジョブを最大 limit 件借りる。リースの期限が切れたジョブも対象にする"""
+        now = time.time()
+        with self._transaction() as conn:
+            # 期限切れのまま再試行の上限に達したジョブは失敗にする
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', token = NULL, error = 'lease expired', updated_at = ?"
+                " WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                "SELECT kind, id, attempts FROM jobs"
+                " WHERE (status = 'pending' AND available_at <= ?) OR (status = 'leased' AND lease_until < ?)"
+                " ORDER BY available_at, rowid LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            jobs = [
+                Job(kind=kind, id=id, token=secrets.token_hex(8), attempts=attempts + 1) for kind, id, attempts in rows
+            ]
+            conn.executemany(
+                "UPDATE jobs SET status = 'leased', token = ?, lease_until = ?, attempts = ?, updated_at = ?"
+                " WHERE kind = ? AND id = ?",
+                [(job.token, now + self.lease_seconds, job.attempts, now, job.kind, job.id) for job in jobs],
+            )
+        return jobs
+
+    def complete(self, job: Job, data: str) -> bool:
+        """ジョブの結果 (JSON文字列) を保存して完了にする
+
+        リースが切れて別のワーカーに渡っていた場合は何もせずFalseを返す (結果を二重に書き込まない)。
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = 'done', token = NULL, error = NULL, updated_at = ?"
+                " WHERE kind = ? AND id = ? AND token = ?",
+                (now, job.kind, job.id, job.token),
+            ).rowcount
+            if not updated:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO results (kind, id, data, updated_at) VALUES (?, ?, ?, ?)",
+                (job.kind, job.id, data, now),
+            )
+        return True
+
+    def fail(self, job: Job, error: str) -> bool:
+        """ジョブの失敗を報告する。再試行の上限に達していなければ、間隔を空けて再試行する"""
+        now = time.time()
+        retry = job.attempts < self.max_attempts
+        with self._transaction() as conn:
+            return bool(
+                conn.execute(
+                    "UPDATE jobs SET status = ?, token = NULL, available_at = ?, error = ?, updated_at = ?"
+                    " WHERE kind = ? AND id = ? AND token = ?",
+                    (
+                        "pending" if retry else "failed",
+                        now + self.retry_delay * 2 ** (job.attempts - 1) if retry else 0,
+                        error,
+                        now,
+                        job.kind,
+                        job.id,
+                        job.token,
+                    ),
+                ).rowcount
+            )
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """種類・状態ごとのジョブ数を返す"""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status").fetchall()
+        stats: dict[str, dict[str, int]] = {}
+        for kind, status, count in rows:
+            stats.setdefault(kind, {})[status] = count
+        return stats
+
+    def result(self, kind: str, id: str) -> str | None:
+        """保存した結果 (JSON文字列) を返す。ない場合はNoneを返す"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM results WHERE kind = ? AND id = ?", (kind, id)).fetchone()
+        return row[0] if row is not None else None
+
+    def failures(self, kind: str | None = None, limit: int = 100) -> list[dict[str, Any]]:
+        """失敗したジョブとエラー内容を返す"""
+        query = "SELECT kind, id, attempts, error FROM jobs WHERE status = 'failed'"
+        params: tuple[Any, ...] = ()
+        if kind is not None:
+            query += " AND kind = ?"
+            params = (kind,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY updated_at DESC LIMIT ?", (*params, limit)).fetchall()
+        return [{"kind": kind, "id": id, "attempts": attempts, "error": error} for kind, id, attempts, error in rows]
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._lock, self._conn)
+
+
+class _Transaction:
+    """書き込みロックを先に取ってからトランザクションを始める (読んだ行を他のプロセスに横取りされないように)"""
+
+    def __init__(self, lock: threading.Lock, conn: sqlite3.Connection) -> None:
+        self._lock = lock
+        self._conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._lock.acquire()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._conn
+
+    def __exit__(self, exc_type: type[BaseException] | None, *_: object) -> None:
+        try:
+            self._conn.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+        finally:
+            self._lock.release()
+
+
+class RemoteWorkQueue:
+    """コーディネーターが HTTP で公開する WorkQueue に接続するクライアント
+
+    複数のホストのワーカーから1つのキューを共有する場合に使う。メソッドは WorkQueue と同じ。
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0) -> None:
+        self.url = url.rstrip("/")
+        self._client = httpx.Client(base_url=self.url, timeout=timeout)
+
+    def close(self) -> None:
+        self._client.close()
+
+    def enqueue(self, kind: str, ids: list[str], force: bool = False) -> int:
+        return int(self._post("/enqueue", {"kind": kind, "ids": ids, "force": force})["added"])
+
+    def lease(self, limit: int = 1) -> list[Job]:
+        return [Job(**job) for job in self._post("/lease", {"limit": limit})["jobs"]]
+
+    def complete(self, job: Job, data: str) -> bool:
+        return bool(self._post("/complete", {"job": asdict(job), "data": data})["ok"])
+
+    def fail(self, job: Job, error: str) -> bool:
+        return bool(self._post("/fail", {"job": asdict(job), "error": error})["ok"])
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        stats = self._get("/stats")
+        return {kind: {status: int(count) for status, count in statuses.items()} for kind, statuses in stats.items()}
+
+    def result(self, kind: str, id: str) -> str | None:
+        response = self._client.get(f"/results/{kind}/{id}")
+        if response.status_code == httpx.codes.NOT_FOUND:
+            return None
+        response.raise_for_status()
+        return response.text
+
+    def failures(self, kind: str | None = None, limit: int = 100) -> list[dict[str, Any]]:
+        params: dict[str, str | int] = {"limit": limit}
+        if kind is not None:
+            params["kind"] = kind
+        return [dict(failure) for failure in self._get("/failures", params)]
+
+    def _get(self, path: str, params: dict[str, str | int] | None = None) -> Any:
+        response = self._client.get(path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, path: str, body: dict[str, Any]) -> Any:
+        response = self._client.post(path, json=body)
+        response.raise_for_status()
+        return response.json()
+
+
+def create_queue_app(queue: WorkQueue) -> Starlette:
+    """WorkQueue を HTTP で公開するアプリケーションを作る (RemoteWorkQueue から接続する)
+
+    SQLiteの操作はロック待ちでイベントループを止めないよう、スレッドプールで実行する。
+    """
+
+    async def enqueue(request: Request) -> Response:
+        body = await request.json()
+        try:
+            added = await run_in_threadpool(queue.enqueue, body["kind"], body["ids"], body.get("force", False))
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return JSONResponse({"added": added})
+
+    async def lease(request: Request) -> Response:
+        body = await request.json()
+        jobs = await run_in_threadpool(queue.lease, int(body.get("limit", 1)))
+        return JSONResponse({"jobs": [asdict(job) for job in jobs]})
+
+    async def complete(request: Request) -> Response:
+        body = await request.json()
+        return JSONResponse({"ok": await run_in_threadpool(queue.complete, Job(**body["job"]), body["data"])})
+
+    async def fail(request: Request) -> Response:
+        body = await request.json()
+        return JSONResponse({"ok": await run_in_threadpool(queue.fail, Job(**body["job"]), body["error"])})
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse(await run_in_threadpool(queue.stats))
+
+    async def failures(request: Request) -> Response:
+        kind = request.query_params.get("kind")
+        limit = int(request.query_params.get("limit", 100))
+        return JSONResponse(await run_in_threadpool(queue.failures, kind, limit))
+
+    async def result(request: Request) -> Response:
+        data = await run_in_threadpool(queue.result, request.path_params["kind"], request.path_params["id"])
+        if data is None:
+            return Response(status_code=404)
+        return Response(data, media_type="application/json")
+
+    return Starlette(
+        routes=[
+            Route("/enqueue", enqueue, methods=["POST"]),
+            Route("/lease", lease, methods=["POST"]),
+            Route("/complete", complete, methods=["POST"]),
+            Route("/fail", fail, methods=["POST"]),
+            Route("/stats", stats),
+            Route("/failures", failures),
+            Route("/results/{kind}/{id}", result),
+        ]
+    )
+
+
+def open_work_queue() -> WorkQueue | RemoteWorkQueue:
+    """設定に応じてキューを開く
+
+    KEIBA_MCP_QUEUE_URL を指定した場合はコーディネーターに接続し、
+    指定しない場合は KEIBA_MCP_DATA_DIR/queue.sqlite3 を直接開く。
+    """
+    if config.QUEUE_URL:
+        return RemoteWorkQueue(config.QUEUE_URL)
+    return WorkQueue(os.path.join(config.DATA_DIR, "queue.sqlite3"))
@@ -0,0 +1,92 @@
+"""複数のテストで使うモデル・HTMLの組み立て"""
+
+from src.models import (
+    HorseProfilePicked,
+    HorseRaceResultItem,
+    JockeyInfoPicked,
+    RaceResultPicked,
+    RaceShutuba,
+    RaceShutubaItem,
+)
+
+_RACE_FIELDS = ("race_name", "race_id", "date", "time", "place", "course", "weather", "condition")
+
+
+def make_shutuba_item(
+    num: int,
+    horse_id: str = "",
+    jockey_id: str = "",
+    odds: str = "",
+    pop: str = "",
+    horse_name: str = "",
+) -> RaceShutubaItem:
+    """出走馬1頭分の行を作る。指定しなかった項目は空文字にする"""
+    return RaceShutubaItem(
+        waku="1",
+        num=str(num),
+        horse=HorseProfilePicked(horse_name=horse_name, horse_id=horse_id),
+        sex_age="",
+        impost_weight="",
+        jockey=JockeyInfoPicked(jockey_name="", jockey_id=jockey_id),
+        horse_weight="",
+        odds=odds,
+        pop=pop,
+    )
+
+
+def make_shutuba(items: list[RaceShutubaItem], **race: str) -> RaceShutuba:
+    """出馬表を作る。race で指定しなかったレースの項目 (race_name, race_id など) は空文字にする"""
+    return RaceShutuba(**{**dict.fromkeys(_RACE_FIELDS, ""), **race}, shutuba=items)
+
+
+def make_history(runs: list[tuple[str, str, str, str]]) -> list[HorseRaceResultItem]:
+    """runs: (コース, 馬場状態, 着順, 着差) の新しい順の並び"""
+    return [
+        HorseRaceResultItem(
+            race=RaceResultPicked(race_name="テストレース", race_id=""),
+            race_date="2025/04/13",
+            place="東京",
+            weather="晴",
+            course=course,
+            condition=condition,
+            horse_number="11",
+            rank=rank,
+            waku="1",
+            num="1",
+            impost_weight="57",
+            jockey=JockeyInfoPicked(jockey_name="騎手", jockey_id="00000"),
+            time="",
+            margin=margin,
+            odds="",
+            pop="",
+            horse_weight="480(+4)",
+        )
+        for course, condition, rank, margin in runs
+    ]
+
+
+def make_leading_html(jockeys: list[tuple[str, str, int, str]]) -> str:
+    """騎手リーディングのHTMLを作る。jockeys: (騎手ID, 騎手名, 1着数, 収得賞金) の順位順の並び"""
+    groups = "".join(f'<th colspan="2">{label}</th>' for label in ("重賞", "特別", "平場", "芝", "ダート"))
+    header = (
+        "<tr>"
+        + "".join(
+            f'<th rowspan="2">{label}</th>'
+            for label in ("順位", "騎手名", "所属", "生年月日", "1着", "2着", "3着", "着外")
+        )
+        + groups
+        + "".join(
+            f'<th rowspan="2">{label}</th>' for label in ("勝率", "連対率", "複勝率", "収得賞金<br>(万円)", "代表馬")
+        )
+        + "</tr><tr>"
+        + "<th>出走</th><th>勝利</th>" * 5
+        + "</tr>"
+    )
+    rows = "".join(
+        f'<tr><td>{rank}</td><td><a href="/jockey/result/recent/{jockey_id}/">{name}</a></td><td>栗東</td>'
+        f"<td>1969/03/15</td><td>{wins}</td><td>20</td><td>18</td><td>150</td>"
+        + "<td>5</td><td>1</td>" * 5
+        + f"<td>0.082</td><td>0.180</td><td>0.260</td><td>{prize}</td><td>テスト馬</td></tr>"
+        for rank, (jockey_id, name, wins, prize) in enumerate(jockeys, start=1)
+    )
+    return f'<html><body><table class="nk_tb_common race_table_01" summary="">{header}{rows}</table></body></html>'
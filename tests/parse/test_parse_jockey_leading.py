@@ -0,0 +1,17 @@
+from src.parse.parse_jockey import parse_jockey_leading
+from tests.factories import make_leading_html
+
+
+def test_parse_jockey_leading() -> None:
+    html = make_leading_html([("05339", "ルメール", 120, "312,345.6"), ("00666", "武 豊", 17, "35,924.0")])
+    jockeys = parse_jockey_leading(html)
+
+    assert [(jockey.jockey_id, jockey.jockey_name) for jockey in jockeys] == [("05339", "ルメール"), ("00666", "武豊")]
+    assert jockeys[1].current_year_wins == "中央17勝(2位)"
+    # 賞金は騎手のページと同じ "億・万円" の形式にそろえる
+    assert jockeys[0].current_year_prize == "中央31億2,346万円"
+    assert jockeys[1].current_year_prize == "中央3億5,924万円"
+    # リーディングに載らない項目は空にする
+    assert jockeys[1].total_wins == "" and jockeys[1].g1_wins == ""
+
+    assert parse_jockey_leading("<html><body></body></html>") == []
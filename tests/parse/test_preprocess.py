@@ -0,0 +1,45 @@
+from src.parse.preprocess import Region, decode_html, make_soup, slice_html
+
+HTML = """<html><head><title>テスト</title><script>var s = "<div>";</script></head>
+<body><div id="header"><div>ナビ</div></div>
+<div id="contents"><div id="db_main_box"><div><h1>馬名</h1></div></div><!-- <div> --></div>
+<table id="DetailTable"><tbody><tr><td>1</td></tr></tbody></table>
+</body></html>"""
+
+
+def test_decode_html_declared_charset() -> None:
+    html = '<meta http-equiv="Content-Type" content="text/html; charset=EUC-JP" /><p>競馬</p>'.encode("euc-jp")
+    assert "競馬" in decode_html(html)
+
+
+def test_decode_html_unknown_charset() -> None:
+    # 実在しない文字コードが宣言されていても、例外にせず既定の文字コードでデコードする
+    html = '<meta charset="x-bogus"><p>競馬</p>'.encode("euc-jp")
+    assert "競馬" in decode_html(html)
+    # UTF-8 で保存し直されたページは UTF-8 でデコードする
+    assert "競馬" in decode_html('<meta charset="x-bogus"><p>競馬</p>'.encode("utf-8"))
+
+
+def test_slice_html() -> None:
+    regions = [
+        Region("div", r'id="db_main_box"', parents=(("div", 'id="contents"'),)),
+        Region("table", r'id="DetailTable"'),
+    ]
+    sliced = slice_html(HTML, regions, keep_title=True)
+
+    assert sliced is not None
+    assert "ナビ" not in sliced
+    assert "<script" not in sliced
+
+    soup = make_soup(sliced, "test", [])
+    assert soup.select_one("head > title").get_text() == "テスト"
+    assert soup.select_one("#contents > #db_main_box > div > h1").get_text() == "馬名"
+    assert soup.select_one("#DetailTable > tbody > tr > td").get_text() == "1"
+
+
+def test_slice_html_missing_region() -> None:
+    # 領域が見つからない場合はNoneを返し、呼び出し側はページ全体でパースする
+    assert slice_html(HTML, [Region("div", r'id="missing"')]) is None
+
+    soup = make_soup(HTML, "test", [Region("div", r'id="missing"')])
+    assert soup.select_one("#header") is not None
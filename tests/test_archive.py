@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from src.archive import PageArchive
+
+
+def test_page_archive_roundtrip(tmp_path: Path) -> None:
+    archive = PageArchive(tmp_path)
+    archive.put("https://db.netkeiba.com/horse/2002100816", b"horse")
+    archive.put("https://db.netkeiba.com/jockey/00666", b"jockey")
+    archive.put("https://db.netkeiba.com/horse/2002100816", b"horse-updated")
+
+    # 再度開いても索引から読み出せる
+    reopened = PageArchive(tmp_path)
+    assert len(reopened) == 2
+    assert reopened.get("https://db.netkeiba.com/horse/2002100816") == b"horse-updated"
+    assert reopened.get("https://db.netkeiba.com/jockey/00666") == b"jockey"
+    assert reopened.get("https://db.netkeiba.com/jockey/00000") is None
+
+
+def test_page_archive_find_by_path(tmp_path: Path) -> None:
+    archive = PageArchive(tmp_path)
+    archive.put("https://race.netkeiba.com/race/shutuba.html?race_id=202509020611", b"shutuba")
+
+    assert archive.find_by_path("/race/shutuba.html?race_id=202509020611") == b"shutuba"
+    assert archive.find_by_path("/race/shutuba.html?race_id=202509020612") is None
+
+
+def test_page_archive_find_by_path_latest(tmp_path: Path) -> None:
+    archive = PageArchive(tmp_path)
+    archive.put("https://db.netkeiba.com/horse/2002100816", b"db")
+    archive.put("http://127.0.0.1:8080/horse/2002100816", b"standin")
+    archive.put("rendered:https://race.netkeiba.com/race/shutuba.html?race_id=202509020611", b"rendered")
+
+    # 再度開いても最後に記録したものを返し、rendered: のキーはパスで引けない
+    reopened = PageArchive(tmp_path)
+    assert reopened.find_by_path("/horse/2002100816/") == b"standin"
+    assert reopened.find_by_path("/race/shutuba.html?race_id=202509020611") is None
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from src.cache import PageCache
+
+
+def test_page_cache_memory() -> None:
+    cache = PageCache(ttl=60, max_entries=2)
+    cache.set("a", b"A")
+    cache.set("b", b"B")
+    cache.set("c", b"C")
+
+    # 上限を超えた場合は最も古いエントリが破棄される
+    assert cache.get("a") is None
+    assert cache.get("b") == b"B"
+    assert cache.get("c") == b"C"
+
+
+def test_page_cache_expired() -> None:
+    cache = PageCache(ttl=60, max_entries=2)
+    cache.set("a", b"A")
+
+    assert cache.get("a", ttl=-1) is None
+
+
+def test_page_cache_shared_disk(tmp_path: Path) -> None:
+    writer = PageCache(ttl=60, max_entries=2, cache_dir=str(tmp_path))
+    reader = PageCache(ttl=60, max_entries=2, cache_dir=str(tmp_path))
+    writer.set("a", b"A")
+
+    # 別インスタンス(別プロセス想定)からディスク経由で読める
+    assert reader.get("a") == b"A"
+
+
+def test_page_cache_max_bytes() -> None:
+    cache = PageCache(ttl=60, max_entries=10, max_bytes=5)
+    cache.set("a", b"AA")
+    cache.set("b", b"BB")
+    cache.set("a", b"AAA")
+    cache.set("c", b"C")
+
+    # 合計サイズが上限を超えた場合も最も古いエントリが破棄される
+    assert cache.get("b") is None
+    assert cache.get("a") == b"AAA"
+    assert cache.get("c") == b"C"
@@ -0,0 +1,146 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src import clients, config
+from src.ratelimit import PriorityRateLimiter, background_fetch
+
+
+class FakeDriver:
+    """タブごとに、描画が完了するまでの確認回数を持つ偽のWebDriver"""
+
+    def __init__(self, polls: dict[str, int | None], unpublished: set[str]) -> None:
+        self.polls = polls  # URL -> 描画が完了するまでの確認回数 (Noneは出走馬の行も現れない)
+        self.unpublished = unpublished  # オッズが埋まらないURL
+        self.tabs: dict[str, str | None] = {"tab-0": None}
+        self.blocked: set[str] = set()
+        self.current = "tab-0"
+        self.quit_called = False
+        self.switch_to = self
+
+    @property
+    def current_window_handle(self) -> str:
+        return self.current
+
+    def new_window(self, kind: str) -> None:
+        self.current = f"tab-{len(self.tabs)}"
+        self.tabs[self.current] = None
+
+    def window(self, handle: str) -> None:
+        self.current = handle
+
+    def get(self, url: str) -> None:
+        self.tabs[self.current] = url
+
+    def execute(self, command: str, params: dict[str, object]) -> None:
+        if params["cmd"] == "Network.setBlockedURLs":
+            self.blocked.add(self.current)
+
+    def execute_script(self, script: str) -> int:
+        url = self.tabs[self.current]
+        remaining = self.polls[url] if url is not None else None
+        if remaining is None:
+            return 0
+        if remaining > 0:
+            self.polls[url] = remaining - 1
+            return 0
+        return clients.RENDER_USABLE if url in self.unpublished else clients.RENDER_COMPLETE
+
+    @property
+    def page_source(self) -> str:
+        return f"<html>{self.tabs[self.current]}</html>"
+
+    def quit(self) -> None:
+        self.quit_called = True
+
+
+def test_render_pages_reuses_tabs_of_one_session(monkeypatch: pytest.MonkeyPatch) -> None:
+    polls: dict[str, int | None] = {f"url-{i}": i % 3 for i in range(10)}
+    polls["url-4"] = None
+    driver = FakeDriver(polls, unpublished={"url-7"})
+    sessions: list[str] = []
+
+    def new_driver(page_load_strategy: str = "eager") -> FakeDriver:
+        sessions.append(page_load_strategy)
+        clients._block_resources(driver)
+        return driver
+
+    monkeypatch.setattr(clients, "_new_driver", new_driver)
+    monkeypatch.setattr(clients.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(config, "RENDER_TIMEOUT", 0.05)
+
+    results = clients._render_pages(list(polls), clients.SHUTUBA_READY, max_tabs=3)
+
+    assert sessions == ["none"]
+    assert len(driver.tabs) == 3
+    # 画像・CSSなどのブロックはタブごとに設定する
+    assert driver.blocked == set(driver.tabs)
+    assert driver.quit_called
+    for i, result in enumerate(results):
+        if i == 4:
+            assert isinstance(result, Exception) and "Timed out" in str(result)
+        else:
+            # オッズが発売前で埋まらないページも、時間切れの時点で出走馬の行があれば取り出す
+            assert result == f"<html>url-{i}</html>"
+
+
+def test_fetch_shares_inflight_request(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[str] = []
+
+    async def get_with_retry(url: str) -> httpx.Response:
+        calls.append(url)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, content=b"page")
+
+    monkeypatch.setattr(clients, "_get_with_retry", get_with_retry)
+    monkeypatch.setattr(clients.page_cache, "get", lambda url, ttl=None: None)
+    monkeypatch.setattr(config, "FETCH_MODE", "live")
+
+    async def scenario() -> list[bytes]:
+        url = "https://db.netkeiba.com/horse/2002100816"
+        # 先読みが取得している間に、同じURLへの対話的なリクエストが来る
+        prefetch = asyncio.create_task(clients.fetch(url))
+        await asyncio.sleep(0.01)
+        return [await clients.fetch(url), await prefetch]
+
+    assert asyncio.run(scenario()) == [b"page", b"page"]
+    assert len(calls) == 1
+    assert not clients._inflight
+
+
+def test_interactive_request_promotes_shared_background_fetch(monkeypatch: pytest.MonkeyPatch) -> None:
+    class FakeClient:
+        async def get(self, url: str) -> httpx.Response:
+            return httpx.Response(200, content=b"page")
+
+    monkeypatch.setattr(clients, "get_http_client", lambda: FakeClient())
+    monkeypatch.setattr(clients, "rate_limiter", PriorityRateLimiter(rate=0))
+    monkeypatch.setattr(clients.page_cache, "get", lambda url, ttl=None: None)
+    monkeypatch.setattr(clients.page_cache, "set", lambda url, content: None)
+    monkeypatch.setattr(config, "FETCH_MODE", "live")
+
+    async def scenario() -> list[str]:
+        url = "https://db.netkeiba.com/horse/2002100816"
+        order: list[str] = []
+
+        async def other_interactive() -> None:
+            async with clients.rate_limiter.slot(background=False):
+                await asyncio.sleep(0.3)
+                order.append("other")
+
+        async def prefetch() -> bytes:
+            background_fetch.set(True)
+            return await clients.fetch(url)
+
+        async def interactive() -> None:
+            await asyncio.sleep(0.02)
+            await clients.fetch(url)
+            order.append("shared")
+
+        # 他の対話的なリクエストの実行中に、先読みが待っている取得へ対話的なリクエストが合流する
+        await asyncio.gather(other_interactive(), prefetch(), interactive())
+        return order
+
+    assert asyncio.run(scenario()) == ["shared", "other"]
+    assert not clients._inflight
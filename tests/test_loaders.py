@@ -0,0 +1,173 @@
+import asyncio
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from src import loaders
+from src.loaders import has_odds, normalize_date, normalize_place
+from src.models import HorsePed, HorseProfile, HorseProfilePicked, JockeyInfo, RaceShutuba
+from src.store import JockeyStore
+from tests.factories import make_history, make_leading_html, make_shutuba, make_shutuba_item
+
+JOCKEY_ASSET = Path(__file__).parent / "assets" / "netkeiba_jockey_take_yutaka.html"
+
+
+def _shutuba(odds: list[tuple[str, str]]) -> RaceShutuba:
+    return make_shutuba([make_shutuba_item(i + 1, odds=o, pop=p) for i, (o, p) in enumerate(odds)])
+
+
+def test_has_odds() -> None:
+    # 静的HTMLのプレースホルダー
+    assert not has_odds(_shutuba([("---.-", "**"), ("---.-", "**")]))
+    # 描画済み(取消馬を含む)
+    assert has_odds(_shutuba([("38.5", "10"), ("---.-", "**")]))
+
+
+def test_normalize_date() -> None:
+    assert normalize_date("2025-04-13") == "20250413"
+    assert normalize_date("20250413") == "20250413"
+    assert normalize_date("2025年4月13日") == "20250413"
+    with pytest.raises(ValueError):
+        normalize_date("4/13")
+
+
+def test_normalize_place() -> None:
+    assert normalize_place("阪神") == "09"
+    assert normalize_place("9") == "09"
+    with pytest.raises(ValueError):
+        normalize_place("大井")
+
+
+def test_load_jockey_leaderboard(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    pages = [
+        make_leading_html([("05339", "ルメール", 120, "312,345.6"), ("00666", "武豊", 17, "35,924.0")]),
+        make_leading_html([("01167", "テスト騎手", 3, "1,200.0")]),
+    ]
+    requested: list[str] = []
+
+    async def get_jockey_leading_html(year: int, page: int) -> str:
+        requested.append(f"leading:{page}")
+        # 最終ページより後は、最終ページと同じ内容が返る
+        return pages[min(page, len(pages)) - 1]
+
+    async def get_jockey_profile_html(jockey_id: str) -> bytes:
+        requested.append(f"jockey:{jockey_id}")
+        return JOCKEY_ASSET.read_bytes()
+
+    async def run_parser(parse: Callable[[bytes | str], object], html: bytes | str) -> object:
+        return parse(html)
+
+    store = JockeyStore(str(tmp_path))
+    stored = JockeyInfo(
+        jockey_name="C.ルメール",
+        jockey_id="05339",
+        height_weight="163cm/53kg",
+        debut_year="2015年",
+        current_year_wins="中央110勝(1位)\u2003地方1勝(218位)",
+        total_wins="中央1,800勝\u2003地方30勝",
+        current_year_prize="中央30億円",
+        total_prize="中央400億円",
+        g1_wins="50勝",
+        stakes_wins="200勝",
+    )
+    store.put(stored, from_profile=True)
+    monkeypatch.setattr(loaders, "get_jockey_store", lambda: store)
+    monkeypatch.setattr(loaders, "get_jockey_leading_html", get_jockey_leading_html)
+    monkeypatch.setattr(loaders, "get_jockey_profile_html", get_jockey_profile_html)
+    monkeypatch.setattr(loaders, "run_parser", run_parser)
+    monkeypatch.setattr(loaders, "index_names", lambda model: 0)
+
+    jockeys = asyncio.run(loaders.load_jockey_leaderboard())
+
+    # リーディング3ページだけを取得し、保存済みでない騎手のページも取得しない
+    assert requested == ["leading:1", "leading:2", "leading:3"]
+    assert [jockey.jockey_id for jockey in jockeys] == ["05339", "00666", "01167"]
+
+    # 本年の成績の中央の部分だけをリーディングの値にし、それ以外の項目は騎手のページの値を残す
+    assert jockeys[0].current_year_wins == "中央120勝(1位)\u2003地方1勝(218位)"
+    assert jockeys[0].current_year_prize == "中央31億2,346万円"
+    assert jockeys[0].jockey_name == "C.ルメール" and jockeys[0].total_wins == stored.total_wins
+    # 保存済みでない騎手は、リーディングの項目だけを返す
+    assert jockeys[2].current_year_wins == "中央3勝(1位)" and jockeys[2].total_wins == ""
+
+    # 騎手のページを取得済みの騎手は、騎手のページを取得せずに返す
+    requested.clear()
+    assert asyncio.run(loaders.load_jockey_stats("05339")) == jockeys[0]
+    assert requested == []
+
+    # リーディングからしか取り込んでいない騎手は、必要になった時点で騎手のページを取得する
+    jockey = asyncio.run(loaders.load_jockey_stats("00666"))
+    assert requested == ["jockey:00666"]
+    assert jockey.height_weight == "170cm/51kg"
+    stored_jockey = store.get("00666")
+    assert stored_jockey is not None and stored_jockey.profile_updated_at > 0
+
+
+def test_load_enriched_shutuba(monkeypatch: pytest.MonkeyPatch) -> None:
+    shutuba = _shutuba([("2.5", "1"), ("8.0", "3"), ("4.1", "2")])
+    for item, horse_id, jockey_id in zip(shutuba.shutuba, ["h1", "h2", "h3"], ["j1", "j2", "j1"]):
+        item.horse.horse_id = horse_id
+        item.jockey.jockey_id = jockey_id
+    parent = HorseProfilePicked(horse_name="", horse_id="")
+    jockey_calls: list[str] = []
+
+    async def load_shutuba(race_id: str, include_odds: bool = False) -> RaceShutuba:
+        return shutuba
+
+    async def load_horse_profile(horse_id: str) -> HorseProfile:
+        if horse_id == "h2":
+            raise Exception("Failed to fetch data: 404")
+        return HorseProfile(
+            horse_name=horse_id,
+            horse_id=horse_id,
+            birth="",
+            total_prize="",
+            total_record="3戦1勝",
+            ped=HorsePed(
+                father=parent,
+                mother=parent,
+                father_father=parent,
+                father_mother=parent,
+                mother_father=parent,
+                mother_mother=parent,
+            ),
+            race_result=make_history([("芝2000", "良", str(rank), "0.1") for rank in (1, 2, 3)]),
+        )
+
+    async def load_jockey_stats(jockey_id: str) -> JockeyInfo:
+        jockey_calls.append(jockey_id)
+        if jockey_id == "j2":
+            raise Exception("Failed to fetch data: 404")
+        return JockeyInfo(
+            jockey_name="騎手",
+            jockey_id=jockey_id,
+            height_weight="",
+            debut_year="",
+            current_year_wins="10",
+            total_wins="100",
+            current_year_prize="",
+            total_prize="",
+            g1_wins="1",
+            stakes_wins="5",
+        )
+
+    monkeypatch.setattr(loaders, "load_shutuba", load_shutuba)
+    monkeypatch.setattr(loaders, "load_horse_profile", load_horse_profile)
+    monkeypatch.setattr(loaders, "load_jockey_stats", load_jockey_stats)
+
+    enriched = asyncio.run(loaders.load_enriched_shutuba("202509020611", last_n=2))
+
+    # 同じ騎手は1回だけ取得する
+    assert jockey_calls == ["j1", "j2"]
+    first, failed, third = enriched.runners
+    assert first.total_record == "3戦1勝"
+    assert [form.rank for form in first.recent_form] == ["1", "2"]
+    assert first.jockey.total_wins == "100"
+    # 取得に失敗した馬・騎手の項目は空にする
+    assert failed.total_record is None and failed.recent_form == []
+    assert failed.jockey.jockey_id == "j2" and failed.jockey.total_wins is None
+    assert third.jockey.g1_wins == "1"
+
+    with pytest.raises(ValueError):
+        asyncio.run(loaders.load_enriched_shutuba("202509020611", last_n=0))
@@ -0,0 +1,39 @@
+import json
+
+from src.metrics import MetricsRegistry
+
+
+def test_registry_render_prometheus() -> None:
+    registry = MetricsRegistry()
+    registry.inc("requests_total", result="hit")
+    registry.inc("requests_total", result="hit")
+    registry.observe("stage_seconds", 0.02, stage="parse")
+    registry.observe("stage_seconds", 100, stage="parse")
+
+    text = registry.render_prometheus()
+    assert 'requests_total{result="hit"} 2' in text
+    assert 'stage_seconds_bucket{stage="parse",le="0.025"} 1' in text
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 2' in text
+    assert 'stage_seconds_count{stage="parse"} 2' in text
+
+
+def test_registry_summary() -> None:
+    registry = MetricsRegistry()
+    for _ in range(99):
+        registry.observe("stage_seconds", 0.02, stage="parse")
+    registry.observe("stage_seconds", 3, stage="parse")
+
+    histogram = registry.summary()["histograms"]["stage_seconds"][0]
+    assert histogram["count"] == 100
+    assert histogram["p50"] == 0.025
+    assert histogram["p99"] == 0.025
+
+
+def test_registry_summary_over_largest_bucket() -> None:
+    registry = MetricsRegistry()
+    registry.observe("stage_seconds", 1000, stage="parse")
+
+    # 最大のバケットを超える分位点はnullとして書き出す
+    histogram = registry.summary()["histograms"]["stage_seconds"][0]
+    assert histogram["p50"] is None
+    assert "Infinity" not in json.dumps(registry.summary())
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+from src.models import RaceShutuba
+from src.odds import OddsStore, odds_movement, steam_moves
+from tests.factories import make_shutuba, make_shutuba_item
+
+
+def make_odds(odds: dict[str, str]) -> RaceShutuba:
+    return make_shutuba(
+        [
+            make_shutuba_item(
+                int(num), horse_id=f"20220000{int(num):02d}", odds=value, pop=str(rank), horse_name=f"馬{num}"
+            )
+            for rank, (num, value) in enumerate(odds.items(), start=1)
+        ],
+        race_name="桜花賞",
+        race_id="202509020611",
+        date="2025年4月13日",
+        time="15:40",
+        place="阪神11R",
+        course="芝1600m",
+        weather="晴",
+        condition="良",
+    )
+
+
+def test_odds_store_records_deltas(tmp_path: Path) -> None:
+    store = OddsStore(tmp_path)
+    assert store.record(make_odds({"1": "2.0", "2": "5.0", "3": "10.0"}), timestamp=0) == 3
+    # 変化がなければ何も書かない
+    assert store.record(make_odds({"1": "2.0", "2": "5.0", "3": "10.0"}), timestamp=60) == 0
+    assert store.record(make_odds({"1": "2.5", "2": "5.0", "3": "6.0"}), timestamp=120) == 2
+    # 3番が取り消された
+    assert store.record(make_odds({"1": "2.4", "2": "4.8"}), timestamp=180) == 3
+
+    # 別インスタンス(別プロセス想定)からファイル経由で読める
+    series = OddsStore(tmp_path).get("202509020611")
+    assert series is not None
+    assert list(series.timestamps) == [0, 120, 180]
+    assert list(series.odds[1]) == [20, 25, 24]
+    assert list(series.odds[3]) == [100, 60, 0]
+
+    movement = {item["num"]: item for item in odds_movement(series, store.info("202509020611")["horses"])}
+    assert movement[3]["horse_name"] == "馬3"
+    assert movement[3]["last_odds"] == 6.0
+    assert movement[1]["change_ratio"] == 0.2
+    assert store.race_ids(["2025090206"]) == ["202509020611"]
+    assert store.race_ids(["2025090207"]) == []
+
+
+def test_steam_moves(tmp_path: Path) -> None:
+    store = OddsStore(tmp_path)
+    store.record(make_odds({"1": "10.0", "2": "5.0"}), timestamp=0)
+    store.record(make_odds({"1": "9.0", "2": "5.1"}), timestamp=600)
+    store.record(make_odds({"1": "6.0", "2": "5.0"}), timestamp=900)
+
+    series = store.get("202509020611")
+    assert series is not None
+    moves = steam_moves(series, window=600, threshold=0.2)
+    assert [(move["num"], move["from_odds"], move["to_odds"]) for move in moves] == [(1, 9.0, 6.0)]
+    # 時間幅を広げると最初の記録からの下落になる
+    assert steam_moves(series, window=900, threshold=0.2)[0]["from_odds"] == 10.0
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+
+from src.pipeline import dump_json_array, stream_bulk
+
+
+def test_stream_bulk_bounded_and_ordered() -> None:
+    async def scenario() -> tuple[str, int]:
+        in_flight = 0
+        max_in_flight = 0
+
+        async def load(id: str) -> dict[str, str]:
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            # 後のIDほど早く終わるようにしても、出力は入力の順序になる
+            await asyncio.sleep(0.01 * (10 - int(id)))
+            in_flight -= 1
+            if id == "3":
+                raise Exception("failed")
+            return {"id": id}
+
+        ids = [str(i) for i in range(10)]
+        output = await dump_json_array(stream_bulk(ids, load, window=3), "id", tool="test")
+        return output, max_in_flight
+
+    output, max_in_flight = asyncio.run(scenario())
+
+    assert max_in_flight == 3
+    items = json.loads(output)
+    assert [item["id"] for item in items] == [str(i) for i in range(10)]
+    assert items[3] == {"id": "3", "error": "failed"}
+
+
+def test_dump_json_array_raise_errors() -> None:
+    async def load(id: str) -> dict[str, str]:
+        raise ValueError(id)
+
+    with pytest.raises(ValueError):
+        asyncio.run(dump_json_array(stream_bulk(["1"], load), "id", tool="test", raise_errors=True))
+
+
+def test_dump_json_array_raise_errors_stops_pending() -> None:
+    async def load(id: str) -> dict[str, str]:
+        if id == "0":
+            raise ValueError(id)
+        await asyncio.sleep(10)
+        return {"id": id}
+
+    async def scenario() -> set[asyncio.Task[object]]:
+        # 参照を持ち続け、ガベージコレクションで閉じられないようにする
+        items = stream_bulk([str(i) for i in range(5)], load, window=3)
+        with pytest.raises(ValueError):
+            await dump_json_array(items, "id", tool="test", raise_errors=True)
+        return {task for task in asyncio.all_tasks() if task is not asyncio.current_task()}
+
+    assert asyncio.run(scenario()) == set()
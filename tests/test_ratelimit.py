@@ -0,0 +1,59 @@
+import asyncio
+
+from src.ratelimit import PriorityRateLimiter
+
+
+def test_background_waits_for_interactive() -> None:
+    async def scenario() -> list[str]:
+        limiter = PriorityRateLimiter(rate=0)
+        order: list[str] = []
+
+        async def interactive() -> None:
+            async with limiter.slot(background=False):
+                await asyncio.sleep(0.1)
+                order.append("interactive")
+
+        async def background() -> None:
+            await asyncio.sleep(0.01)
+            async with limiter.slot(background=True):
+                order.append("background")
+
+        await asyncio.gather(interactive(), background())
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "background"]
+
+
+def test_rate_limit() -> None:
+    async def scenario() -> float:
+        limiter = PriorityRateLimiter(rate=50, burst=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(6):
+            async with limiter.slot():
+                pass
+        return loop.time() - start
+
+    # 1件目はバーストで即時、残り5件は 1/50 秒ずつ待つ
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_interactive_overtakes_waiting_background() -> None:
+    async def scenario() -> list[str]:
+        limiter = PriorityRateLimiter(rate=20, burst=1)
+        order: list[str] = []
+
+        async def request(name: str, background: bool) -> None:
+            async with limiter.slot(background=background):
+                order.append(name)
+
+        # 先読みがまとめてトークンを待っている間に対話的なリクエストが来る
+        tasks = [asyncio.create_task(request(f"background-{i}", True)) for i in range(5)]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(request("interactive", False)))
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    # バーストで即時に通った1件を除き、対話的なリクエストが次のトークンを取る
+    assert order.index("interactive") <= 1
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+from src.search import NameIndex, normalize_name
+
+
+def test_normalize_name() -> None:
+    assert normalize_name("ﾃﾞｨｰﾌﾟｲﾝﾊﾟｸﾄ") == "ディープインパクト"
+    assert normalize_name("でぃーぷいんぱくと") == "ディープインパクト"
+    assert normalize_name("Ｃ．ルメール") == normalize_name("C. ルメール") == "cルメール"
+
+
+def test_name_index_search(tmp_path: Path) -> None:
+    index = NameIndex(tmp_path / "horse.jsonl")
+    index.add("2002100816", "ディープインパクト")
+    index.add("2009102739", "ディープブリランテ")
+    index.add("2010105827", "キズナ")
+
+    exact = index.search("でぃーぷいんぱくと")
+    assert [(hit.id, hit.match) for hit in exact][0] == ("2002100816", "exact")
+
+    prefix = index.search("ﾃﾞｨｰﾌﾟ")
+    assert {hit.id for hit in prefix} == {"2002100816", "2009102739"}
+    assert all(hit.match == "prefix" for hit in prefix)
+
+    # 1文字違いでもあいまい一致で見つかる
+    fuzzy = index.search("ディープインパクド")
+    assert fuzzy[0].id == "2002100816"
+    assert fuzzy[0].match == "fuzzy"
+
+    # 再度開いても追記した内容から復元できる
+    reopened = NameIndex(tmp_path / "horse.jsonl")
+    assert len(reopened) == 3
+    assert reopened.search("キズナ")[0].id == "2010105827"
+
+
+def test_name_index_rename() -> None:
+    index = NameIndex()
+    assert index.add("00666", "武豊")
+    assert not index.add("00666", "武豊")
+    assert index.add("00666", "武 豊")
+
+    assert index.search("武豊")[0].name == "武 豊"
+    assert len(index) == 1
+
+
+def test_name_index_aliases(tmp_path: Path) -> None:
+    index = NameIndex(tmp_path / "jockey.jsonl")
+    # 出馬表の短い名前と、プロフィールの完全な名前
+    assert index.add("01115", "浜中")
+    assert index.add("01115", "浜中俊")
+    assert not index.add("01115", "浜中")
+
+    assert index.search("浜中")[0].id == "01115"
+    assert index.search("浜中俊")[0].match == "exact"
+    assert index.name("01115") == "浜中俊"
+
+    # 既存の名前は追記しない
+    assert len((tmp_path / "jockey.jsonl").read_text(encoding="utf-8").splitlines()) == 2
+    reopened = NameIndex(tmp_path / "jockey.jsonl")
+    assert reopened.aliases("01115") == ["浜中", "浜中俊"]
+    assert [hit.id for hit in reopened.search("浜中")] == ["01115"]
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import numpy as np
+
+from src.similar import DIMENSIONS, FormIndex, describe_vector, form_features, form_vector
+from tests.factories import make_history
+
+
+def test_form_features() -> None:
+    history = make_history(
+        [
+            ("芝2400", "重", "1", "-0.3"),
+            ("芝2000", "良", "6", "0.8"),
+            ("ダ1800", "良", "中", ""),  # 競走中止は含めない
+            ("芝2400", "良", "3", "0.2"),
+        ]
+    )
+    features = form_features(history)
+    assert features is not None
+    assert features["turf_share"] == 1.0 and features["dirt_share"] == 0.0
+    assert round(features["mean_distance"]) == 2267
+    assert features["best_distance"] == 2400
+    assert features["win_rate"] == 1 / 3 and features["top3_rate"] == 2 / 3
+    assert features["horse_weight"] == 480 and features["weight_change"] == 4
+    # 道悪 (1着) の方が良馬場 (平均4.5着) より着順が良い
+    assert features["off_going_share"] == 1 / 3 and features["off_going_edge"] > 0
+
+    assert form_features(make_history([("芝1600", "良", "取", "")])) is None
+
+    # 標準化したベクトルは元の単位に戻せる
+    vector = form_vector(history)
+    assert vector is not None and vector.shape == (DIMENSIONS,)
+    assert describe_vector(vector)["best_distance"] == 2400
+
+
+def test_form_index_search(tmp_path: Path) -> None:
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(3000, DIMENSIONS)).astype(np.float32)
+    index = FormIndex(tmp_path)
+    # 検索の分割をまたいでも正しく上位を選べるようにする
+    index.SEARCH_CHUNK = 512
+    for i, vector in enumerate(vectors):
+        index.add(f"h{i}", vector)
+
+    query = vectors[42] + 0.01
+    expected = np.argsort(np.linalg.norm(vectors - query, axis=1))[:6]
+    hits = index.search(query, limit=5, exclude=["h42"])
+    assert [id for id, _ in hits] == [f"h{i}" for i in expected if i != 42][:5]
+    assert hits[0][1] <= hits[-1][1]
+
+    # 更新した馬は新しいベクトルで検索される
+    assert not index.add("h7", vectors[7])
+    assert index.add("h7", query)
+    assert index.search(query, limit=1)[0][0] == "h7"
+
+    # まとめた後も、その後に追記した分も、開き直して復元できる
+    assert index.compact() == 3000
+    index.add("h3000", query)
+    reopened = FormIndex(tmp_path)
+    assert len(reopened) == 3001
+    assert np.array_equal(reopened.vector("h7"), query.astype(np.float32))
+    assert {id for id, _ in reopened.search(query, limit=2)} == {"h7", "h3000"}
+
+    # 他のプロセスの追加分は読み直すと見える
+    other = FormIndex(tmp_path)
+    other.add("h3001", -query)
+    assert "h3001" not in reopened
+    assert reopened.reload() and "h3001" in reopened and len(reopened) == 3002
+    assert not reopened.reload()
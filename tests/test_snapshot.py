@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+
+from src.models import HorseProfilePicked, JockeySummary
+from src.snapshot import SnapshotReader, write_snapshot
+
+
+def test_snapshot_roundtrip(tmp_path: Path) -> None:
+    horses = [HorseProfilePicked(horse_name=f"馬{i}", horse_id=f"{i:010d}") for i in range(200)]
+    items = ((h.horse_id, h) for h in reversed(horses))
+    assert write_snapshot(tmp_path, HorseProfilePicked, items, block_bytes=512) == 200
+
+    reader = SnapshotReader(tmp_path, HorseProfilePicked)
+    assert len(reader) == 200
+    assert reader.get("0000000123") == horses[123]
+    assert reader.get("0000000999") is None
+    assert reader.get("00000001234") is None
+    assert list(reader.ids()) == [h.horse_id for h in horses]
+
+    # 書き直すと新しい世代に切り替わる。直前の世代のファイルは次に書き出すまで残す
+    write_snapshot(tmp_path, HorseProfilePicked, [("0000000001", horses[1])])
+    assert len(SnapshotReader(tmp_path, HorseProfilePicked)) == 1
+    assert len(list(tmp_path.glob("*.bin"))) == 4
+    write_snapshot(tmp_path, HorseProfilePicked, [("0000000002", horses[2])])
+    assert sorted(file.name for file in tmp_path.glob("*.bin")) == [
+        "data-2.bin",
+        "data-3.bin",
+        "index-2.bin",
+        "index-3.bin",
+    ]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_snapshot_optional_fields(tmp_path: Path) -> None:
+    jockey = JockeySummary(
+        jockey_name="武豊", jockey_id="00666", current_year_wins=None, total_wins="4570", g1_wins=None, stakes_wins=None
+    )
+    write_snapshot(tmp_path, JockeySummary, [("00666", jockey)])
+    assert SnapshotReader(tmp_path, JockeySummary).get("00666") == jockey
+
+
+def test_snapshot_schema_mismatch(tmp_path: Path) -> None:
+    write_snapshot(tmp_path, HorseProfilePicked, [])
+    with pytest.raises(Exception, match="schema mismatch"):
+        SnapshotReader(tmp_path, JockeySummary)
@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+
+from src.models import HorseProfilePicked, JockeyInfoPicked, RaceResult, RaceResultItem
+from src.speed import compute_speed_figures, margins_to_lengths, parse_margin, times_to_seconds
+
+
+def make_result(race_id: str, date: str, course: str, runners: list[tuple[str, str, str]]) -> RaceResult:
+    """runners: (着順, タイム, 着差) の並び"""
+    return RaceResult(
+        race_name="テストレース",
+        race_id=race_id,
+        date=date,
+        time="15:00",
+        place="東京",
+        course=course,
+        weather="晴",
+        condition="良",
+        results=[
+            RaceResultItem(
+                rank=rank,
+                waku="1",
+                num=str(num),
+                horse=HorseProfilePicked(horse_name=f"馬{num}", horse_id=f"{race_id}{num:02d}"),
+                sex_age="牡3",
+                impost_weight="57.0",
+                jockey=JockeyInfoPicked(jockey_name="騎手", jockey_id="00000"),
+                time=time,
+                margin=margin,
+                odds="",
+                pop="",
+                horse_weight="",
+            )
+            for num, (rank, time, margin) in enumerate(runners, start=1)
+        ],
+    )
+
+
+def test_times_to_seconds() -> None:
+    seconds = times_to_seconds(np.array(["2:31.9", "59.8", " 1:00.0 ", "", "中止"]))
+    assert seconds[:3].tolist() == [151.9, 59.8, 60.0]
+    assert np.isnan(seconds[3]) and np.isnan(seconds[4])
+
+
+def test_parse_margin() -> None:
+    assert parse_margin("") == 0.0
+    assert parse_margin("ハナ") == 0.05
+    assert parse_margin("クビ") == 0.25
+    assert parse_margin("3/4") == 0.75
+    assert parse_margin("1.1/2") == 1.5
+    assert parse_margin("2") == 2.0
+    assert parse_margin("大") == 10.0
+    assert math.isnan(parse_margin("?"))
+    assert margins_to_lengths(np.array(["クビ", "1/2", "クビ"])).tolist() == [0.25, 0.5, 0.25]
+
+
+def test_beaten_lengths_accumulate_in_finishing_order() -> None:
+    # 着順と馬番の並びが異なり、取消の馬も含む
+    result = make_result(
+        "202505010101",
+        "2025年5月1日",
+        "芝1600m",
+        [("2", "1:34.1", "クビ"), ("取", "", ""), ("1", "1:34.0", ""), ("3", "1:34.4", "2")],
+    )
+    figures = compute_speed_figures([result])
+    assert figures.beaten_lengths[0] == 0.25
+    assert np.isnan(figures.beaten_lengths[1])
+    assert figures.beaten_lengths[2] == 0.0
+    assert figures.beaten_lengths[3] == 2.25
+
+
+def test_speed_figures_use_par_time_and_track_variant() -> None:
+    winners = ["1:34.0", "1:35.0", "1:36.0"]
+    results = [
+        make_result(f"20250501010{i}", f"2025年5月{i}日", "芝1600m", [("1", time, ""), ("2", "1:37.0", "3")])
+        for i, time in enumerate(winners, start=1)
+    ]
+    figures = compute_speed_figures(results)
+    assert np.allclose(figures.par_time, 95.0)
+    # 1日1レースのため馬場差は求めない
+    assert np.allclose(figures.track_variant, 0.0)
+    winner_figures = figures.speed_figure[figures.rank == 1]
+    assert winner_figures[0] > winner_figures[1] == 100.0 > winner_figures[2]
+
+    rows = figures.rows()
+    assert rows[1]["rank"] == 2 and rows[1]["time_seconds"] == 97.0 and rows[1]["beaten_lengths"] == 3.0
+
+    # 同じ日に速い時計が続けば馬場差はマイナス (時計が出やすい馬場) になり、指数はその分割り引かれる
+    fast_day = [make_result(f"20250510010{i}", "2025年5月10日", "芝1600m", [("1", "1:33.0", "")]) for i in range(1, 3)]
+    figures = compute_speed_figures(results + fast_day)
+    assert figures.track_variant[-1] < 0
+    assert figures.speed_figure[-1] < 100 + (95.0 - 93.0) / 95.0 * 1000
+
+
+def test_speed_figures_empty() -> None:
+    assert compute_speed_figures([]).rows() == []
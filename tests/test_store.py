@@ -0,0 +1,57 @@
+from pathlib import Path
+
+from src.parse.parse_horse import parse_horse_profile, parse_horse_profile_update
+from src.store import HorseStore
+
+ASSET = Path(__file__).parent / "assets" / "netkeiba_horse_profile_deepimpact.html"
+
+
+def test_horse_store_roundtrip(tmp_path: Path) -> None:
+    profile = parse_horse_profile(ASSET.read_bytes())
+    store = HorseStore(str(tmp_path))
+
+    assert store.get(profile.horse_id) is None
+    store.put(profile)
+
+    assert profile.horse_id in store
+    assert HorseStore(str(tmp_path)).get(profile.horse_id) == profile
+
+
+def test_parse_horse_profile_update() -> None:
+    html = ASSET.read_bytes()
+    latest = parse_horse_profile(html)
+
+    # 通算成績が変わっていなければ保存済みの馬情報をそのまま返す
+    unchanged, new_race_results = parse_horse_profile_update(html, latest)
+    assert unchanged is latest
+    assert new_race_results == []
+
+    # 直近2走が未取得の状態から更新すると、その2走だけが先頭に追加される
+    stored = latest.model_copy(update={"total_record": "12戦10勝", "race_result": latest.race_result[2:]})
+    updated, new_race_results = parse_horse_profile_update(html, stored)
+    assert new_race_results == latest.race_result[:2]
+    assert updated.race_result == latest.race_result
+
+
+def test_horse_store_compact(tmp_path: Path) -> None:
+    profile = parse_horse_profile(ASSET.read_bytes())
+    store = HorseStore(str(tmp_path / "horses"), snapshot_path=str(tmp_path / "snapshot"))
+    store.put(profile)
+    store.put(profile.model_copy(update={"horse_id": "2010105827", "horse_name": "キズナ"}))
+
+    assert store.compact() == 2
+    # JSONファイルは取り込んだ後に削除され、スナップショットから読める
+    assert list((tmp_path / "horses").glob("*.json")) == []
+    assert store.get(profile.horse_id) == profile
+    assert store.get("2010105827").horse_name == "キズナ"
+
+    # 更新した馬はJSONファイルが優先され、再度まとめるとスナップショットに反映される
+    store.put(profile.model_copy(update={"total_record": "15戦12勝"}))
+    assert store.get(profile.horse_id).total_record == "15戦12勝"
+    assert store.compact() == 2
+    assert (
+        HorseStore(str(tmp_path / "horses"), snapshot_path=str(tmp_path / "snapshot"))
+        .get(profile.horse_id)
+        .total_record
+        == "15戦12勝"
+    )
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from src import warmer
+from src.models import RaceShutuba
+from src.warmer import JST, CacheWarmer, in_hours, parse_hours
+from tests.factories import make_shutuba, make_shutuba_item
+
+
+def make_race(race_id: str, post: str) -> RaceShutuba:
+    return make_shutuba(
+        [make_shutuba_item(num, horse_id=f"h{race_id}{num}", jockey_id=f"j{num}") for num in (1, 2)],
+        race_id=race_id,
+        time=f"{post}発走",
+    )
+
+
+def test_hours() -> None:
+    assert parse_hours("6-11") == (6, 11)
+    assert in_hours(6, (6, 11)) and not in_hours(11, (6, 11))
+    # 日をまたぐ時間帯
+    assert in_hours(23, (22, 6)) and in_hours(5, (22, 6)) and not in_hours(12, (22, 6))
+    with pytest.raises(ValueError):
+        parse_hours("morning")
+
+
+def patch_warmer(
+    monkeypatch: pytest.MonkeyPatch, posts: dict[str, str], fetched: list[str], refreshed: list[list[str]]
+) -> None:
+    """当日 (2025/04/13) のレースが posts、翌日以降はレースがない状態にする"""
+
+    async def get_race_list_html(date: str) -> bytes:
+        fetched.append(f"list:{date}")
+        return date.encode()
+
+    async def get_static(race_id: str) -> bytes:
+        fetched.append(f"shutuba:{race_id}")
+        return race_id.encode()
+
+    async def run_parser(parse: object, html: bytes) -> RaceShutuba:
+        race_id = html.decode()
+        return make_race(race_id, posts[race_id])
+
+    async def get_profile(id: str) -> bytes:
+        fetched.append(f"profile:{id}")
+        return b""
+
+    async def load_shutubas(race_ids: list[str], include_odds: bool = False) -> list[RaceShutuba]:
+        assert include_odds
+        refreshed.append(race_ids)
+        return [make_race(race_id, posts[race_id]) for race_id in race_ids]
+
+    monkeypatch.setattr(warmer, "get_race_list_html", get_race_list_html)
+    monkeypatch.setattr(warmer, "parse_race_list", lambda html: list(posts) if html == b"20250413" else [])
+    monkeypatch.setattr(warmer, "get_race_shutuba_static_html", get_static)
+    monkeypatch.setattr(warmer, "run_parser", run_parser)
+    monkeypatch.setattr(warmer, "get_horse_profile_html", get_profile)
+    monkeypatch.setattr(warmer, "get_jockey_profile_html", get_profile)
+    monkeypatch.setattr(warmer, "load_shutubas", load_shutubas)
+
+
+def test_warmer_schedule(monkeypatch: pytest.MonkeyPatch) -> None:
+    posts = {"202509020611": "15:40", "202509020612": "16:20"}
+    fetched: list[str] = []
+    refreshed: list[list[str]] = []
+    patch_warmer(monkeypatch, posts, fetched, refreshed)
+
+    cache_warmer = CacheWarmer(
+        off_peak_hours=(6, 11), budget=100, rate=0, refresh_window=1800, refresh_interval=60, lookahead_days=1
+    )
+
+    async def scenario() -> None:
+        # オフピーク外に起動した場合も、発走時刻は調べる
+        counts = await cache_warmer.run_once(datetime(2025, 4, 13, 5, 0, tzinfo=JST))
+        assert counts["shutuba"] == 2 and counts["profile"] == 0
+        assert cache_warmer.races["202509020611"].post_at == datetime(2025, 4, 13, 15, 40, tzinfo=JST)
+
+        # 出走馬4頭・騎手2人のページを取得する
+        counts = await cache_warmer.run_once(datetime(2025, 4, 13, 6, 0, tzinfo=JST))
+        assert counts["profile"] == 6
+        assert (await cache_warmer.run_once(datetime(2025, 4, 13, 7, 0, tzinfo=JST)))["profile"] == 0
+
+        # 発走30分前から、間隔を空けて出馬表を取得し直す
+        await cache_warmer.run_once(datetime(2025, 4, 13, 15, 0, tzinfo=JST))
+        await cache_warmer.run_once(datetime(2025, 4, 13, 15, 10, tzinfo=JST))
+        await cache_warmer.run_once(datetime(2025, 4, 13, 15, 10, 30, tzinfo=JST))
+        await cache_warmer.run_once(datetime(2025, 4, 13, 15, 55, tzinfo=JST))
+
+        # 日付が変わると、前日に調べた翌日の一覧は取得し直さず、その次の日を調べる
+        await cache_warmer.run_once(datetime(2025, 4, 14, 0, 0, tzinfo=JST))
+        assert not cache_warmer.races
+
+    asyncio.run(scenario())
+    lists = [page for page in fetched if page.startswith("list:")]
+    # 当日に加えて翌日のレース一覧も調べる
+    assert lists == ["list:20250413", "list:20250414", "list:20250415"]
+    assert fetched[1:3] == ["shutuba:202509020611", "shutuba:202509020612"]
+    assert refreshed == [["202509020611"], ["202509020612"]]
+
+
+def test_warmer_budget_and_render_cap(monkeypatch: pytest.MonkeyPatch) -> None:
+    posts = {"202509020611": "15:40", "202509020612": "15:30", "202509020610": "15:00"}
+    fetched: list[str] = []
+    refreshed: list[list[str]] = []
+    patch_warmer(monkeypatch, posts, fetched, refreshed)
+
+    # 予算はレース一覧1件 + 出馬表3件 + 出走馬・騎手のページ3件
+    cache_warmer = CacheWarmer(
+        off_peak_hours=(6, 11),
+        budget=7,
+        rate=0,
+        refresh_window=3600,
+        refresh_interval=60,
+        max_renders=2,
+        lookahead_days=0,
+    )
+
+    async def scenario() -> None:
+        counts = await cache_warmer.run_once(datetime(2025, 4, 13, 6, 0, tzinfo=JST))
+        # 出走馬6頭・騎手2人のうち、予算の範囲内の3件だけ取得する
+        assert counts["profile"] == 3 and counts["over_budget"] == 5
+        # 出馬表の取得し直し2件分の予算を補う
+        cache_warmer.budget.remaining = 2
+
+        # 3レースとも発走前だが、レンダリングするのは発走が近い2レースまで
+        await cache_warmer.run_once(datetime(2025, 4, 13, 14, 50, tzinfo=JST))
+        # 予算を使い切ると取得し直さない
+        assert (await cache_warmer.run_once(datetime(2025, 4, 13, 14, 52, tzinfo=JST)))["refreshed"] == 0
+
+    asyncio.run(scenario())
+    assert refreshed == [["202509020610", "202509020612"]]
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from pydantic import BaseModel
+from starlette.testclient import TestClient
+
+from src.crawl import run_worker
+from src.workqueue import Job, RemoteWorkQueue, WorkQueue, create_queue_app
+
+
+class Page(BaseModel):
+    id: str
+
+
+def test_lease_is_exclusive_across_processes(tmp_path: Path) -> None:
+    # 同じデータベースを開いた2つのキューは別プロセスのワーカーに相当する
+    first = WorkQueue(tmp_path / "queue.sqlite3")
+    second = WorkQueue(tmp_path / "queue.sqlite3")
+    assert first.enqueue("race", ["1", "2", "3", "2"]) == 3
+    assert second.enqueue("race", ["3", "4"]) == 1
+
+    leased = first.lease(3) + second.lease(3)
+    assert sorted(job.id for job in leased) == ["1", "2", "3", "4"]
+    assert first.lease(1) == []
+
+    for job in leased:
+        assert first.complete(job, Page(id=job.id).model_dump_json())
+    assert second.stats() == {"race": {"done": 4}}
+    assert json.loads(second.result("race", "4") or "") == {"id": "4"}
+
+
+def test_expired_lease_is_retried_and_stale_worker_is_ignored(tmp_path: Path) -> None:
+    queue = WorkQueue(tmp_path / "queue.sqlite3", lease_seconds=0.05, max_attempts=2)
+    queue.enqueue("horse", ["2019105219"])
+    [stale] = queue.lease()
+
+    time.sleep(0.1)
+    [retried] = queue.lease()
+    assert retried.attempts == 2
+    # リースが切れた後の報告は書き込まれない
+    assert not queue.complete(stale, "{}")
+    assert queue.complete(retried, '{"ok": true}')
+    assert queue.result("horse", "2019105219") == '{"ok": true}'
+
+    queue.enqueue("horse", ["2019105220"])
+    queue.lease()
+    time.sleep(0.1)
+    queue.lease()
+    time.sleep(0.1)
+    # 再試行の上限に達したジョブは失敗になる
+    assert queue.lease() == []
+    assert queue.failures() == [{"kind": "horse", "id": "2019105220", "attempts": 2, "error": "lease expired"}]
+
+
+def test_failed_job_backs_off_then_fails(tmp_path: Path) -> None:
+    queue = WorkQueue(tmp_path / "queue.sqlite3", max_attempts=2, retry_delay=0.05)
+    queue.enqueue("jockey", ["01234"])
+    [job] = queue.lease()
+    assert queue.fail(job, "503")
+    assert queue.lease() == []
+
+    time.sleep(0.1)
+    [job] = queue.lease()
+    assert queue.fail(job, "503")
+    assert queue.stats() == {"jockey": {"failed": 1}}
+
+    assert queue.enqueue("jockey", ["01234"]) == 0
+    assert queue.enqueue("jockey", ["01234"], force=True) == 1
+    assert [job.id for job in queue.lease()] == ["01234"]
+
+
+def test_workers_share_queue_without_duplicates(tmp_path: Path) -> None:
+    queue = WorkQueue(tmp_path / "queue.sqlite3")
+    queue.enqueue("race", [str(i) for i in range(20)] + ["bad"])
+    loaded: list[str] = []
+
+    async def load(id: str) -> Page:
+        await asyncio.sleep(0.001)
+        if id == "bad":
+            raise Exception("parse error")
+        loaded.append(id)
+        return Page(id=id)
+
+    async def scenario() -> list[int]:
+        workers = [
+            run_worker(
+                WorkQueue(queue.path, max_attempts=1),
+                concurrency=4,
+                exit_when_idle=True,
+                poll_interval=0.01,
+                loaders={"race": load},
+            )
+            for _ in range(3)
+        ]
+        return [counts["done"] for counts in await asyncio.gather(*workers)]
+
+    done = asyncio.run(scenario())
+    assert sum(done) == 20
+    assert sorted(loaded) == sorted(str(i) for i in range(20))
+    assert queue.stats() == {"race": {"done": 20, "failed": 1}}
+    assert queue.failures()[0]["error"] == "parse error"
+
+
+def test_worker_counts_unreported_jobs_as_lost(tmp_path: Path) -> None:
+    class FlakyQueue(WorkQueue):
+        """最初の報告の時点でコーディネーターに接続できないキュー"""
+
+        reported = False
+
+        def complete(self, job: Job, data: str) -> bool:
+            if not self.reported:
+                self.reported = True
+                raise ConnectionError("coordinator is unreachable")
+            return super().complete(job, data)
+
+    queue = FlakyQueue(tmp_path / "queue.sqlite3", lease_seconds=0.05, max_attempts=3)
+    queue.enqueue("race", ["1"])
+
+    async def load(id: str) -> Page:
+        return Page(id=id)
+
+    counts = asyncio.run(run_worker(queue, exit_when_idle=True, poll_interval=0.01, loaders={"race": load}))
+    # 報告できなかったジョブはワーカーを止めず、リースが切れた後に再び取得される
+    assert counts == {"lost": 1, "done": 1}
+    assert queue.stats() == {"race": {"done": 1}}
+
+
+def test_remote_queue(tmp_path: Path) -> None:
+    remote = RemoteWorkQueue("http://testserver")
+    remote._client = TestClient(create_queue_app(WorkQueue(tmp_path / "queue.sqlite3")))
+
+    assert remote.enqueue("race", ["202506050811"]) == 1
+    [job] = remote.lease(5)
+    assert job.id == "202506050811" and job.attempts == 1
+    assert remote.complete(job, '{"race_id": "202506050811"}')
+    assert not remote.complete(job, "{}")
+    assert remote.stats() == {"race": {"done": 1}}
+    assert remote.result("race", "202506050811") == '{"race_id": "202506050811"}'
+    assert remote.result("race", "000000000000") is None
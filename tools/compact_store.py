@@ -0,0 +1,25 @@
+"""蓄積した馬情報をスナップショットにまとめる
+
+KEIBA_MCP_DATA_DIR/horses の馬ごとのJSONファイルを、KEIBA_MCP_DATA_DIR/snapshots/horses の
+圧縮スナップショットに取り込む。サーバーの稼働中に実行してもよい。
+
+    python -m tools.compact_store
+"""
+
+import argparse
+import time
+
+from src.store import get_horse_store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    started_at = time.perf_counter()
+    count = get_horse_store().compact()
+    print(f"compacted {count} horses in {time.perf_counter() - started_at:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
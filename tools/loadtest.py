@@ -0,0 +1,288 @@
+"""MCPツールの負荷試験ハーネス
+
+実際のMCPサーバーに対し、stdioまたはSSE経由でツール呼び出しを並行実行し、
+スループット・レイテンシ(p50/p95/p99)・エラー率・サーバーのRSS推移を計測する。
+
+ネットワークに依存しないよう、netkeibaのスタンドインサーバーと組み合わせて使う。
+
+    python -m tools.netkeiba_standin --assets tests/assets --latency-ms 50 &
+    python -m tools.loadtest --standin-url http://127.0.0.1:8080 --concurrency 1,8,32 --duration 30
+
+SSEで起動済みのサーバーを対象にする場合は --transport sse --url と --server-pid を指定する。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.stdio import StdioServerParameters, stdio_client
+
+DEFAULT_MIX = "get_shutuba=2,get_race_result=2,bulk_get_horse_profile=1,bulk_get_jockey_profile=1"
+
+
+def _random_digits(length: int) -> str:
+    return "".join(random.choices("0123456789", k=length))
+
+
+def _race_id() -> str:
+    return f"20{_random_digits(2)}{random.randint(1, 10):02d}{_random_digits(4)}{random.randint(1, 12):02d}"
+
+
+def _horse_id() -> str:
+    return f"20{_random_digits(8)}"
+
+
+def _jockey_id() -> str:
+    return _random_digits(5)
+
+
+def build_arguments(tool: str, bulk_size: int, fixed_ids: bool) -> dict[str, Any]:
+    """ツールの引数を生成する。fixed_ids の場合は毎回同じIDを使い、キャッシュが効く状態を計測する"""
+    if fixed_ids:
+        race_id, horse_id, jockey_id = "202509020611", "2002100816", "00666"
+        race_ids, horse_ids, jockey_ids = [race_id] * bulk_size, [horse_id] * bulk_size, [jockey_id] * bulk_size
+    else:
+        race_id = _race_id()
+        race_ids = [_race_id() for _ in range(bulk_size)]
+        horse_ids = [_horse_id() for _ in range(bulk_size)]
+        jockey_ids = [_jockey_id() for _ in range(bulk_size)]
+
+    match tool:
+        case "get_shutuba" | "get_race_result":
+            return {"race_id": race_id}
+        case "bulk_get_race_result":
+            return {"race_ids": race_ids}
+        case "bulk_get_horse_profile":
+            return {"horse_ids": horse_ids}
+        case "bulk_get_jockey_profile":
+            return {"jockey_ids": jockey_ids}
+    raise ValueError(f"Unknown tool: {tool}")
+
+
+def parse_mix(mix: str) -> list[tuple[str, float]]:
+    """「tool=weight,...」形式のツール構成をパースする"""
+    result: list[tuple[str, float]] = []
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        result.append((name.strip(), float(weight) if weight else 1.0))
+    return result
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(q * len(ordered)), len(ordered) - 1)
+    return ordered[index]
+
+
+def read_rss_mb(pid: int) -> float | None:
+    """/proc からプロセスのRSS(MB)を読み取る"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def find_child_pid() -> int | None:
+    """stdioで起動したサーバーのPIDを、このプロセスの子プロセスから探す"""
+    me = os.getpid()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == me:
+            return int(entry)
+    return None
+
+
+@dataclass
+class LevelResult:
+    concurrency: int
+    elapsed: float = 0.0
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+    rss_samples: list[tuple[float, float]] = field(default_factory=list)
+
+    def record(self, tool: str, latency: float, ok: bool) -> None:
+        self.latencies.setdefault(tool, []).append(latency)
+        if not ok:
+            self.errors[tool] = self.errors.get(tool, 0) + 1
+
+    def summary(self) -> dict[str, Any]:
+        all_latencies = [latency for values in self.latencies.values() for latency in values]
+        total = len(all_latencies)
+        errors = sum(self.errors.values())
+        rss = [value for _, value in self.rss_samples]
+        return {
+            "concurrency": self.concurrency,
+            "requests": total,
+            "elapsed": round(self.elapsed, 3),
+            "throughput": round(total / self.elapsed, 3) if self.elapsed else 0.0,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "p50": round(percentile(all_latencies, 0.50), 4),
+            "p95": round(percentile(all_latencies, 0.95), 4),
+            "p99": round(percentile(all_latencies, 0.99), 4),
+            "rss_mb": {
+                "min": round(min(rss), 1) if rss else None,
+                "max": round(max(rss), 1) if rss else None,
+                "last": round(rss[-1], 1) if rss else None,
+                "samples": [(round(t, 2), round(v, 1)) for t, v in self.rss_samples],
+            },
+            "tools": {
+                tool: {
+                    "requests": len(values),
+                    "errors": self.errors.get(tool, 0),
+                    "p50": round(percentile(values, 0.50), 4),
+                    "p95": round(percentile(values, 0.95), 4),
+                    "p99": round(percentile(values, 0.99), 4),
+                }
+                for tool, values in sorted(self.latencies.items())
+            },
+        }
+
+
+@asynccontextmanager
+async def open_sessions(args: argparse.Namespace, count: int) -> AsyncIterator[tuple[list[ClientSession], int | None]]:
+    """負荷をかけるMCPセッションを開く
+
+    stdioの場合は1つのサーバープロセスを起動して全ワーカーでセッションを共有し、
+    SSEの場合はエージェントごとの接続を模してワーカーごとにセッションを開く。
+    """
+    async with AsyncExitStack() as stack:
+        if args.transport == "stdio":
+            env = dict(os.environ)
+            if args.standin_url:
+                env["KEIBA_MCP_DB_BASE_URL"] = args.standin_url
+                env["KEIBA_MCP_RACE_BASE_URL"] = args.standin_url
+            params = StdioServerParameters(command=sys.executable, args=["-m", "src"], env=env)
+            read, write = await stack.enter_async_context(stdio_client(params))
+            session = await stack.enter_async_context(ClientSession(read, write))
+            await session.initialize()
+            yield [session] * count, find_child_pid()
+        else:
+            sessions: list[ClientSession] = []
+            for _ in range(count):
+                read, write = await stack.enter_async_context(sse_client(args.url))
+                session = await stack.enter_async_context(ClientSession(read, write))
+                await session.initialize()
+                sessions.append(session)
+            yield sessions, args.server_pid
+
+
+async def run_level(args: argparse.Namespace, concurrency: int, mix: list[tuple[str, float]]) -> LevelResult:
+    result = LevelResult(concurrency=concurrency)
+    tools = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    async with open_sessions(args, concurrency) as (sessions, server_pid):
+        start = time.perf_counter()
+        deadline = start + args.duration
+        remaining = args.requests
+
+        async def worker(session: ClientSession) -> None:
+            nonlocal remaining
+            while time.perf_counter() < deadline:
+                if args.requests:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                tool = random.choices(tools, weights)[0]
+                arguments = build_arguments(tool, args.bulk_size, args.fixed_ids)
+                request_start = time.perf_counter()
+                try:
+                    response = await session.call_tool(tool, arguments)
+                    ok = not response.isError
+                except Exception:
+                    ok = False
+                result.record(tool, time.perf_counter() - request_start, ok)
+
+        async def sample_rss() -> None:
+            while server_pid is not None:
+                rss = read_rss_mb(server_pid)
+                if rss is not None:
+                    result.rss_samples.append((time.perf_counter() - start, rss))
+                await asyncio.sleep(args.sample_interval)
+
+        sampler = asyncio.create_task(sample_rss())
+        try:
+            await asyncio.gather(*(worker(session) for session in sessions))
+        finally:
+            sampler.cancel()
+        result.elapsed = time.perf_counter() - start
+
+    return result
+
+
+def print_summary(summary: dict[str, Any]) -> None:
+    print(
+        f"concurrency={summary['concurrency']:>4}  requests={summary['requests']:>6}  "
+        f"throughput={summary['throughput']:>8.2f}/s  error_rate={summary['error_rate']:.2%}  "
+        f"p50={summary['p50']:.3f}s  p95={summary['p95']:.3f}s  p99={summary['p99']:.3f}s  "
+        f"rss(max)={summary['rss_mb']['max']}MB"
+    )
+    for tool, stats in summary["tools"].items():
+        print(
+            f"    {tool:<26} requests={stats['requests']:>6}  errors={stats['errors']:>4}  "
+            f"p50={stats['p50']:.3f}s  p95={stats['p95']:.3f}s  p99={stats['p99']:.3f}s"
+        )
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    mix = parse_mix(args.mix)
+    summaries = []
+    for concurrency in (int(value) for value in args.concurrency.split(",")):
+        result = await run_level(args, concurrency, mix)
+        summary = result.summary()
+        print_summary(summary)
+        summaries.append(summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="MCPツールの負荷試験")
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/sse", help="SSEサーバーのURL (sseのみ)")
+    parser.add_argument("--server-pid", type=int, help="RSSを計測するサーバーのPID (sseのみ)")
+    parser.add_argument("--standin-url", help="stdioで起動するサーバーの取得先にするスタンドインサーバーのURL")
+    parser.add_argument("--concurrency", default="1,4,16", help="並行数。カンマ区切りで複数指定すると順に計測する")
+    parser.add_argument("--duration", type=float, default=30, help="並行数ごとの計測時間(秒)")
+    parser.add_argument(
+        "--requests", type=int, default=0, help="並行数ごとのリクエスト数の上限。0は計測時間のみで打ち切る"
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="ツールの構成比 (tool=weight,...)")
+    parser.add_argument("--bulk-size", type=int, default=10, help="bulk系ツールに渡すIDの数")
+    parser.add_argument("--fixed-ids", action="store_true", help="毎回同じIDを使い、キャッシュが効く状態を計測する")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="RSSの計測間隔(秒)")
+    parser.add_argument("--seed", type=int, help="ツール選択・ID生成の乱数シード")
+    parser.add_argument("--output", help="結果をJSONで書き出すファイル")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
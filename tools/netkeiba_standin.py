@@ -0,0 +1,136 @@
+"""netkeibaのローカルスタンドインサーバー
+
+記録したアーカイブ、または tests/assets のページを配信する。
+負荷試験やベンチマークをネットワークに依存せず再現可能に実行するために使う。
+
+    python -m tools.netkeiba_standin --assets tests/assets --latency-ms 50 --error-rate 0.01
+
+サーバーを起動したら、keiba-mcp 側で以下の環境変数を指定する。
+
+    KEIBA_MCP_DB_BASE_URL=http://127.0.0.1:8080
+    KEIBA_MCP_RACE_BASE_URL=http://127.0.0.1:8080
+"""
+
+import argparse
+import asyncio
+import random
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from src.archive import PageArchive
+from src.parse.preprocess import _CHARSET_PATTERN, DEFAULT_ENCODING
+
+# tests/assets のファイルを配信するパスのパターン。IDにかかわらず同じページを返す
+ASSET_ROUTES: list[tuple[re.Pattern[str], str]] = [
+    (re.compile(r"^/race/shutuba\.html"), "netkeiba_shutuba_oukasho_20250413.html"),
+    (re.compile(r"^/race/\d{12}"), "netkeiba_race_result_arima_20061224.html"),
+    (re.compile(r"^/horse/ped/[0-9a-z]{10}"), "netkeiba_horse_ped_deepimpact.html"),
+    (re.compile(r"^/horse/result/[0-9a-z]{10}"), "netkeiba_horse_result_deepimpact.html"),
+    (re.compile(r"^/horse/[0-9a-z]{10}"), "netkeiba_horse_profile_deepimpact.html"),
+    (re.compile(r"^/jockey/\d{5}"), "netkeiba_jockey_take_yutaka.html"),
+]
+
+
+@dataclass
+class StandinConfig:
+    archive: PageArchive | None
+    assets: Path | None
+    latency: float
+    jitter: float
+    error_rate: float
+    error_status: int
+
+
+def find_page(config: StandinConfig, path_and_query: str) -> bytes | None:
+    """リクエストに対応するページを探す。アーカイブを優先し、なければ assets を探す
+
+    アーカイブの "rendered:" キー (ブラウザで描画したページ) はパスを持たないため配信しない。
+    """
+    if config.archive is not None:
+        content = config.archive.find_by_path(path_and_query)
+        if content is not None:
+            return content
+
+    if config.assets is not None:
+        for pattern, filename in ASSET_ROUTES:
+            if pattern.match(path_and_query):
+                return (config.assets / filename).read_bytes()
+
+    return None
+
+
+def detect_charset(content: bytes) -> str:
+    """ページの文字コードを判定する
+
+    tests/assets のページは EUC-JP と宣言したまま UTF-8 で保存されているため、
+    宣言された文字コードでデコードできない場合は UTF-8 を試す。
+    """
+    match = _CHARSET_PATTERN.search(content, 0, 4096)
+    declared = match.group(1).decode("ascii") if match else DEFAULT_ENCODING
+    for candidate in (declared, "utf-8"):
+        try:
+            content.decode(candidate)
+            return candidate
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return DEFAULT_ENCODING
+
+
+def create_app(config: StandinConfig) -> Starlette:
+    async def serve(request: Request) -> Response:
+        delay = config.latency + random.uniform(0, config.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if random.random() < config.error_rate:
+            return Response(status_code=config.error_status)
+
+        path_and_query = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        content = find_page(config, path_and_query)
+        if content is None:
+            return Response(status_code=404)
+        return Response(content, media_type=f"text/html; charset={detect_charset(content)}")
+
+    return Starlette(routes=[Route("/{path:path}", serve)])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="netkeibaのローカルスタンドインサーバー")
+    parser.add_argument(
+        "--archive", help="配信するアーカイブのディレクトリ (KEIBA_MCP_FETCH_MODE=record で記録したもの)"
+    )
+    parser.add_argument("--assets", help="配信するHTMLのディレクトリ (例: tests/assets)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0, help="すべての応答に加える遅延(ミリ秒)")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="遅延に加えるランダムなゆらぎの最大値(ミリ秒)")
+    parser.add_argument("--error-rate", type=float, default=0, help="エラー応答を返す確率 (0-1)")
+    parser.add_argument("--error-status", type=int, default=503, help="エラー応答のステータスコード")
+    parser.add_argument("--seed", type=int, help="遅延・エラー注入の乱数シード")
+    args = parser.parse_args()
+
+    if args.archive is None and args.assets is None:
+        parser.error("--archive か --assets のどちらかを指定してください")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    config = StandinConfig(
+        archive=PageArchive(args.archive) if args.archive else None,
+        assets=Path(args.assets) if args.assets else None,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()